@@ -7,11 +7,13 @@
 
 import sqlite3
 import requests
-import time
 import sys
+import json
 from datetime import datetime
 import os
 
+import http_client
+
 # 출력 버퍼링 비활성화
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -19,6 +21,8 @@ sys.stderr.reconfigure(line_buffering=True)
 # 설정
 DB_PATH = '/Users/choejibin/release-album-link/album_links.db'
 COMPANION_API_URL = 'http://localhost:5001/search'
+COMPANION_BATCH_URL = 'http://localhost:5001/search/batch'
+GLOBAL_BATCH_SIZE = 20  # /search/batch 한 번에 보낼 앨범 수 (1이면 앨범마다 /search 호출)
 START_FROM_ALBUM = None  # None이면 최신부터, 특정 코드 입력하면 그 앨범부터 과거로 수집
 
 # 실패 로그 파일 경로
@@ -61,6 +65,33 @@ def get_db_connection():
     """로컬 SQLite 연결"""
     return sqlite3.connect(DB_PATH)
 
+def load_smart_links():
+    """이전에 찾은 Smart Link URL {album_code: url} (재수집 시 Companion API에 그대로 전달)"""
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS album_smart_links (
+            album_code TEXT PRIMARY KEY,
+            smart_link_url TEXT NOT NULL,
+            updated_at TEXT
+        )
+    ''')
+    rows = conn.execute('SELECT album_code, smart_link_url FROM album_smart_links').fetchall()
+    conn.close()
+    return dict(rows)
+
+def save_smart_link(album, smart_link_url):
+    """Companion API가 돌려준 Smart Link URL 저장"""
+    if not smart_link_url or smart_link_url == album.get('smart_link_url'):
+        return
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO album_smart_links (album_code, smart_link_url, updated_at)
+        VALUES (?, ?, ?)
+    ''', (album['cdma_code'], smart_link_url, datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+    album['smart_link_url'] = smart_link_url
+
 def get_albums_to_collect(start_from_album=None):
     """수집할 앨범 목록 가져오기 (CDMA 역순: 큰 번호→작은 번호)
 
@@ -96,6 +127,7 @@ def get_albums_to_collect(start_from_album=None):
     albums = cursor.fetchall()
     conn.close()
 
+    smart_links = load_smart_links()
     return [
         {
             'cdma_code': row[0],
@@ -103,49 +135,55 @@ def get_albums_to_collect(start_from_album=None):
             'album_ko': row[2],
             'release_date': row[3],
             'global_found': row[4],
-            'kr_found': row[5]
+            'kr_found': row[5],
+            'smart_link_url': smart_links.get(row[0])
         }
         for row in albums
     ]
 
+def handle_api_response(album, data):
+    """Companion API 응답 처리 (실패 유형별 로깅). 플랫폼이 있으면 data 반환"""
+    if data.get('success'):
+        result = data.get('data', {})
+        error = data.get('error', '')
+
+        # 에러 유형별 로깅
+        if error:
+            if 'not found' in error.lower() or '앨범을 찾을 수 없습니다' in error:
+                log_failure('catalog_not_found', album, error)
+            elif 'smart link' in error.lower() and '없습니다' in error:
+                log_failure('smart_link_missing', album, error)
+            elif '500' in error or 'server error' in error.lower():
+                log_failure('smart_link_500_error', album, error)
+            elif 'platform' in error.lower() and '없습니다' in error:
+                log_failure('smart_link_no_platforms', album, error)
+            else:
+                log_failure('other_error', album, error)
+
+        return result if result.get('platforms') else None
+    else:
+        # success=False인 경우
+        error = data.get('error', 'Unknown error')
+        log_failure('api_failed', album, error)
+        return None
+
 def collect_global_links(album):
     """Companion API로 글로벌 링크 수집"""
     try:
-        response = requests.post(
+        response = http_client.post(
             COMPANION_API_URL,
             json={
                 'artist': album['artist_ko'],
                 'album': album['album_ko'],
-                'upc': album['cdma_code']
+                'upc': album['cdma_code'],
+                'smart_link_url': album.get('smart_link_url')
             },
-            timeout=120  # 타임아웃 120초 (companion.global 느림)
+            timeout=120,  # 타임아웃 120초 (companion.global 느림)
+            track_latency=False
         )
 
         if response.status_code == 200:
-            data = response.json()
-            if data.get('success'):
-                result = data.get('data', {})
-                error = data.get('error', '')
-
-                # 에러 유형별 로깅
-                if error:
-                    if 'not found' in error.lower() or '앨범을 찾을 수 없습니다' in error:
-                        log_failure('catalog_not_found', album, error)
-                    elif 'smart link' in error.lower() and '없습니다' in error:
-                        log_failure('smart_link_missing', album, error)
-                    elif '500' in error or 'server error' in error.lower():
-                        log_failure('smart_link_500_error', album, error)
-                    elif 'platform' in error.lower() and '없습니다' in error:
-                        log_failure('smart_link_no_platforms', album, error)
-                    else:
-                        log_failure('other_error', album, error)
-
-                return result if result.get('platforms') else None
-            else:
-                # success=False인 경우
-                error = data.get('error', 'Unknown error')
-                log_failure('api_failed', album, error)
-                return None
+            return handle_api_response(album, response.json())
 
         return None
 
@@ -159,6 +197,81 @@ def collect_global_links(album):
         log_failure('api_exception', album, error_msg)
         return None
 
+def collect_global_links_batch(albums):
+    """여러 앨범을 /search/batch 한 번으로 수집 (앨범 순서대로 결과를 yield)
+
+    서버가 항목마다 한 줄씩 NDJSON으로 보내므로, 끝난 앨범부터 바로 처리할 수 있다.
+    """
+    results = {}
+    next_index = 0
+
+    try:
+        response = http_client.post(
+            COMPANION_BATCH_URL,
+            json={
+                'items': [
+                    {
+                        'artist': album['artist_ko'],
+                        'album': album['album_ko'],
+                        'upc': album['cdma_code'],
+                        'smart_link_url': album.get('smart_link_url')
+                    }
+                    for album in albums
+                ]
+            },
+            stream=True,
+            timeout=(10, 120),  # 항목 하나당 최대 120초
+            track_latency=False
+        )
+
+        if response.status_code != 200:
+            for album in albums:
+                log_failure('api_failed', album, f"Batch HTTP {response.status_code}")
+            results = {}
+        else:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                data = json.loads(line)
+                index = data.get('index')
+                if index is None or not 0 <= index < len(albums):
+                    continue
+                results[index] = handle_api_response(albums[index], data)
+
+                # 앨범 순서대로 전달
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+
+    except requests.exceptions.Timeout:
+        print(f"{Colors.FAIL}  ✗ API 타임아웃 (batch){Colors.ENDC}")
+        for album in albums[next_index:]:
+            log_failure('api_timeout', album, 'Batch request timeout (120s)')
+    except Exception as e:
+        error_msg = str(e)
+        print(f"{Colors.FAIL}  ✗ API 오류 (batch): {error_msg}{Colors.ENDC}")
+        for album in albums[next_index:]:
+            log_failure('api_exception', album, error_msg)
+
+    # 응답을 받지 못한 나머지 앨범
+    while next_index < len(albums):
+        yield results.pop(next_index, None)
+        next_index += 1
+
+def iter_global_links(albums):
+    """앨범 목록을 GLOBAL_BATCH_SIZE씩 묶어 수집 (앨범 순서대로 결과를 yield)"""
+    if GLOBAL_BATCH_SIZE <= 1:
+        for album in albums:
+            yield collect_global_links(album)
+        return
+
+    for start in range(0, len(albums), GLOBAL_BATCH_SIZE):
+        yield from collect_global_links_batch(albums[start:start + GLOBAL_BATCH_SIZE])
+
+def is_fully_collected(album):
+    """Global 1개 이상 + KR 5개 모두 수집된 앨범인지"""
+    return album.get('global_found', 0) > 0 and album.get('kr_found', 0) >= 5
+
 def save_kr_links(album, kr_results, album_cover_url=None):
     """국내 링크를 DB에 저장"""
     if not kr_results:
@@ -278,6 +391,9 @@ def main():
     global_failed = 0
     kr_only_partial = 0
 
+    # 수집이 필요한 앨범만 묶어서 Companion API로 전송
+    global_results = iter_global_links([album for album in albums if not is_fully_collected(album)])
+
     for idx, album in enumerate(albums, 1):
         print(f"{Colors.BOLD}[{idx}/{total}]{Colors.ENDC} {album['artist_ko']} - {album['album_ko']}")
         print(f"  코드: {album['cdma_code']} | 발매일: {album['release_date']}")
@@ -292,8 +408,10 @@ def main():
             print()
             continue
 
-        # Companion API 호출 (글로벌 + 국내 통합)
-        result = collect_global_links(album)
+        # Companion API 결과 (글로벌 + 국내 통합)
+        result = next(global_results)
+        if result:
+            save_smart_link(album, result.get('smart_link_url'))
 
         # 1. KR 플랫폼 저장 (5개 미만인 경우에만)
         kr_platforms = result.get('kr_platforms', {}) if result else {}
@@ -345,9 +463,6 @@ def main():
             print(f"  KR 신규: {kr_success} | Global 신규: {global_success}")
             print(f"  건너뜀: {skipped} | KR 일부: {kr_only_partial} | Global 실패: {global_failed}\n")
 
-        # API 과부하 방지
-        time.sleep(1)
-
     # 최종 결과
     end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"\n{Colors.BOLD}{Colors.OKGREEN}{'='*60}")
@@ -359,6 +474,8 @@ def main():
     print(f"  {Colors.WARNING}⚠ KR 일부만: {kr_only_partial}개{Colors.ENDC}")
     print(f"  {Colors.FAIL}✗ Global 실패: {global_failed}개{Colors.ENDC}")
     print(f"{Colors.BOLD}{'='*60}{Colors.ENDC}")
+    for line in http_client.format_stats():
+        print(f"  {line}")
 
     # 실패 로그 요약
     print(f"\n{Colors.OKCYAN}━━━ 실패 로그 저장 위치: {FAILURE_LOG_DIR} ━━━{Colors.ENDC}")
@@ -11,10 +11,15 @@ import time
 import sys
 import os
 import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from datetime import datetime
 from urllib.parse import quote
 import json
 
+import http_client
+
 # Turso 설정
 try:
     import libsql_experimental as libsql
@@ -26,6 +31,21 @@ except ImportError:
 TURSO_DATABASE_URL = os.environ.get('TURSO_DATABASE_URL', '')
 TURSO_AUTH_TOKEN = os.environ.get('TURSO_AUTH_TOKEN', '')
 
+# /search/batch 한 번에 보낼 앨범 수의 상한 (1이면 앨범마다 /search 호출)
+# 파이프라인에서는 동시에 처리 중인 앨범 수(PIPELINE_ALBUMS)를 넘지 않음
+COMPANION_BATCH_SIZE = int(os.environ.get('COMPANION_BATCH_SIZE', '20'))
+
+# 동시에 처리 중인 앨범 수 (한 앨범의 네트워크 대기 동안 다른 앨범의 검색/저장을 진행)
+PIPELINE_ALBUMS = int(os.environ.get('PIPELINE_ALBUMS', '4'))
+# 파이프라인 단계 사이 큐 크기
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', str(PIPELINE_ALBUMS)))
+
+# 한국 플랫폼 5곳을 동시에 검색: 요청 하나의 제한 시간, 앨범 하나의 전체 제한 시간 (초)
+KR_REQUEST_TIMEOUT = 15
+KR_SEARCH_DEADLINE = float(os.environ.get('KR_SEARCH_DEADLINE', '15'))
+KR_SEARCH_WORKERS = int(os.environ.get('KR_SEARCH_WORKERS', str(5 * PIPELINE_ALBUMS)))
+kr_executor = ThreadPoolExecutor(max_workers=KR_SEARCH_WORKERS, thread_name_prefix='kr-search')
+
 # 색상 출력
 class Colors:
     HEADER = '\033[95m'
@@ -89,7 +109,11 @@ def normalize_text(text):
     return text.lower().replace(' ', '').replace('(', '').replace(')', '').replace('[', '').replace(']', '').replace('-', '').replace('_', '')
 
 def search_korean_platforms(artist, album):
-    """한국 플랫폼 검색 (n8n HTTP Request + Parse HTML 로직)"""
+    """한국 플랫폼 검색 (n8n HTTP Request + Parse HTML 로직)
+
+    5개 플랫폼을 동시에 요청하고 KR_SEARCH_DEADLINE 안에 끝난 결과만 사용한다.
+    결과는 플랫폼 순서대로 반환 (시간 안에 못 받은 플랫폼은 found=False).
+    """
     query = f"{artist} {album}"
     encoded = quote(query)
 
@@ -129,67 +153,58 @@ def search_korean_platforms(artist, album):
         }
     ]
 
-    results = []
-
-    for platform in platforms:
-        platform_id = platform['id']
-        print(f"    [{platform_id}] ", end='', flush=True)
-
-        try:
-            # HTTP Request (n8n과 동일한 헤더)
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0',
-                'Referer': 'https://vibe.naver.com/',
-                'Origin': 'https://vibe.naver.com'
-            }
+    futures = {
+        kr_executor.submit(search_korean_platform, platform, artist, album): platform
+        for platform in platforms
+    }
 
-            response = requests.get(platform['searchUrl'], headers=headers, timeout=15)
-
-            if response.status_code == 200:
-                # Parse HTML/API 응답 (n8n 로직 그대로)
-                result = parse_platform_response(
-                    platform_id=platform_id,
-                    platform_name=platform['name'],
-                    response_data=response.text,
-                    use_api=platform['useApi'],
-                    target_artist=artist,
-                    target_album=album
-                )
-
-                results.append(result)
-
-                if result['found']:
-                    print(f"{Colors.OKGREEN}✓{Colors.ENDC}")
-                else:
-                    print(f"{Colors.FAIL}✗{Colors.ENDC}")
-            else:
-                print(f"{Colors.FAIL}✗ (HTTP {response.status_code}){Colors.ENDC}")
-                results.append({
-                    'platform_id': platform_id,
-                    'platform_name': platform['name'],
-                    'found': False,
-                    'album_url': None,
-                    'album_id': None
-                })
-
-        except Exception as e:
-            print(f"{Colors.FAIL}✗ ({str(e)[:20]}){Colors.ENDC}")
-            results.append({
-                'platform_id': platform_id,
-                'platform_name': platform['name'],
-                'found': False,
-                'album_url': None,
-                'album_id': None
-            })
+    results = {}
+    try:
+        for future in as_completed(futures, timeout=KR_SEARCH_DEADLINE):
+            platform = futures[future]
+            results[platform['id']] = future.result()
+    except FuturesTimeoutError:
+        for future, platform in futures.items():
+            if platform['id'] not in results:
+                future.cancel()
+                results[platform['id']] = not_found_platform(platform, 'timeout')
+
+    return [results[platform['id']] for platform in platforms]
+
+def not_found_platform(platform, error=None):
+    """검색 실패 결과 (HTTP 오류, 예외, 시간 초과)"""
+    result = {
+        'platform_id': platform['id'],
+        'platform_name': platform['name'],
+        'found': False,
+        'album_url': None,
+        'album_id': None
+    }
+    if error:
+        result['error'] = error
+    return result
 
-        time.sleep(0.5)  # Rate limiting
+def search_korean_platform(platform, artist, album):
+    """플랫폼 하나 검색 (kr_executor 스레드에서 실행)"""
+    try:
+        # HTTP Request (호스트별 keep-alive 세션, 헤더는 http_client에서 플랫폼별로 설정)
+        response = http_client.get(platform['searchUrl'], timeout=KR_REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            return not_found_platform(platform, f'HTTP {response.status_code}')
+
+        # Parse HTML/API 응답 (n8n 로직 그대로)
+        return parse_platform_response(
+            platform_id=platform['id'],
+            platform_name=platform['name'],
+            response_data=response.text,
+            use_api=platform['useApi'],
+            target_artist=artist,
+            target_album=album
+        )
 
-    return results
+    except Exception as e:
+        return not_found_platform(platform, str(e)[:20])
 
 def parse_platform_response(platform_id, platform_name, response_data, use_api, target_artist, target_album):
     """n8n Parse HTML 로직 Python 구현"""
@@ -340,13 +355,44 @@ def parse_platform_response(platform_id, platform_name, response_data, use_api,
         'status': 'success' if album_url else 'not_found'
     }
 
+def get_companion_api_url():
+    """Companion API 기본 URL"""
+    companion_api_port = os.environ.get('COMPANION_API_PORT', '5001')
+    return f"http://localhost:{companion_api_port}"
+
+def convert_companion_result(result):
+    """Companion API 응답을 n8n 형식으로 변환"""
+    if not result.get('success'):
+        return {'success': False, 'platforms': {}, 'album_cover_url': None, 'count': 0, 'search_strategy': None}
+
+    platforms = result.get('data', {}).get('platforms', [])
+    album_cover_url = result.get('data', {}).get('album_cover_url')
+    search_strategy = result.get('search_strategy', 'UNKNOWN')
+
+    # n8n 형식으로 변환
+    platforms_dict = {}
+    for platform in platforms:
+        platforms_dict[platform['code']] = {
+            'name': platform['platform'],
+            'url': platform['url'],
+            'upc': platform.get('upc'),
+            'found': True
+        }
+
+    return {
+        'success': True,
+        'platforms': platforms_dict,
+        'album_cover_url': album_cover_url,
+        'count': len(platforms),
+        'search_strategy': search_strategy
+    }
+
 def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_en, cdma_code=None, companion_api_url=None):
     """Companion API 호출 - 3단계 검색 전략"""
     if companion_api_url is None:
-        companion_api_port = os.environ.get('COMPANION_API_PORT', '5001')
-        companion_api_url = f"http://localhost:{companion_api_port}"
+        companion_api_url = get_companion_api_url()
     try:
-        response = requests.post(
+        response = http_client.post(
             f"{companion_api_url}/search",
             json={
                 'artist_ko': artist_ko,
@@ -355,33 +401,12 @@ def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_
                 'album_en': album_en,
                 'cdma_code': cdma_code
             },
-            timeout=90
+            timeout=90,
+            track_latency=False
         )
 
         if response.status_code == 200:
-            result = response.json()
-            if result.get('success'):
-                platforms = result.get('data', {}).get('platforms', [])
-                album_cover_url = result.get('data', {}).get('album_cover_url')
-                search_strategy = result.get('search_strategy', 'UNKNOWN')
-
-                # n8n 형식으로 변환
-                platforms_dict = {}
-                for platform in platforms:
-                    platforms_dict[platform['code']] = {
-                        'name': platform['platform'],
-                        'url': platform['url'],
-                        'upc': platform.get('upc'),
-                        'found': True
-                    }
-
-                return {
-                    'success': True,
-                    'platforms': platforms_dict,
-                    'album_cover_url': album_cover_url,
-                    'count': len(platforms),
-                    'search_strategy': search_strategy
-                }
+            return convert_companion_result(response.json())
 
         return {'success': False, 'platforms': {}, 'album_cover_url': None, 'count': 0, 'search_strategy': None}
 
@@ -391,6 +416,87 @@ def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_
     except Exception as e:
         return {'success': False, 'platforms': {}, 'album_cover_url': None, 'count': 0, 'search_strategy': None}
 
+def search_global_platforms_batch_via_companion(albums, companion_api_url=None):
+    """여러 앨범을 Companion API /search/batch 한 번으로 검색 (앨범 순서대로 결과를 yield)
+
+    배치 요청이 실패해 결과를 받지 못한 앨범은 결과 대신 예외를 yield (파이프라인에서 실패로 처리)
+    """
+    if companion_api_url is None:
+        companion_api_url = get_companion_api_url()
+
+    results = {}
+    next_index = 0
+    error = None
+
+    try:
+        response = http_client.post(
+            f"{companion_api_url}/search/batch",
+            json={
+                'items': [
+                    {
+                        'artist_ko': album['artist_ko'],
+                        'artist_en': album.get('artist_en') or '',
+                        'album_ko': album['album_ko'],
+                        'album_en': album.get('album_en') or '',
+                        'cdma_code': album.get('cdma_code')
+                    }
+                    for album in albums
+                ]
+            },
+            stream=True,
+            timeout=(10, 90),  # 항목 하나당 최대 90초
+            track_latency=False
+        )
+
+        if response.status_code == 200:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                data = json.loads(line)
+                index = data.get('index')
+                if index is None or not 0 <= index < len(albums):
+                    continue
+                results[index] = convert_companion_result(data)
+
+                # 앨범 순서대로 전달
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+        else:
+            error = f"Companion batch HTTP {response.status_code}"
+
+    except requests.exceptions.ConnectionError:
+        error = "Companion API not available"
+    except Exception as e:
+        error = f"Companion batch failed: {e}"
+
+    if next_index < len(albums) and not error:
+        error = "Companion batch ended early"
+    if error:
+        print(f"  {Colors.WARNING}{error} ({len(albums) - next_index} albums without global results){Colors.ENDC}")
+
+    # 응답을 받지 못한 나머지 앨범
+    while next_index < len(albums):
+        yield results.pop(next_index, None) or RuntimeError(error)
+        next_index += 1
+
+def iter_global_results(albums, batch_size=COMPANION_BATCH_SIZE):
+    """앨범 목록을 batch_size씩 /search/batch로 보내고 결과를 앨범 순서대로 yield
+
+    배치가 실패한 앨범은 결과 대신 예외를 yield
+    """
+    if batch_size <= 1:
+        for album in albums:
+            yield search_global_platforms_via_companion(
+                album['artist_ko'], album.get('artist_en') or '',
+                album['album_ko'], album.get('album_en') or '',
+                album.get('cdma_code') or None
+            )
+        return
+
+    for start in range(0, len(albums), batch_size):
+        yield from search_global_platforms_batch_via_companion(albums[start:start + batch_size])
+
 # ============================================================
 # 데이터베이스 저장
 # ============================================================
@@ -502,12 +608,10 @@ def save_to_database(artist_ko, artist_en, album_ko, album_en, kr_platforms, glo
 # 메인 프로세스
 # ============================================================
 
-def process_album(artist_ko, artist_en, album_ko, album_en, cdma_code=None):
-    """개별 앨범 처리 (n8n 워크플로우 전체 로직) - 3단계 검색 전략"""
-    print(f"{Colors.OKCYAN}  → Searching Korean platforms...{Colors.ENDC}")
-
-    # 1. 한국 플랫폼 검색
-    kr_results = search_korean_platforms(artist_ko, album_ko)
+def search_korean_stage(album):
+    """1. 한국 플랫폼 검색 → 플랫폼별 결과, 찾은 수, 벅스 albumId (앨범 커버 Fallback용)"""
+    started = time.time()
+    kr_results = search_korean_platforms(album['artist_ko'], album['album_ko'])
 
     kr_platforms = {}
     kr_found_count = 0
@@ -520,39 +624,150 @@ def process_album(artist_ko, artist_en, album_ko, album_en, cdma_code=None):
         if result['platform_id'] == 'bugs' and result.get('album_id'):
             bugs_album_id = result['album_id']
 
-    # 2. 해외 플랫폼 검색 (3단계 전략)
-    print(f"{Colors.OKCYAN}  → Searching Global platforms...{Colors.ENDC}")
-    if cdma_code:
-        print(f"    CDMA Code: {cdma_code}")
-
-    global_result = search_global_platforms_via_companion(
-        artist_ko, artist_en, album_ko, album_en, cdma_code
-    )
+    return {
+        'results': kr_results,
+        'platforms': kr_platforms,
+        'count': kr_found_count,
+        'bugs_album_id': bugs_album_id,
+        'seconds': time.time() - started
+    }
 
-    global_platforms = global_result['platforms']
-    global_found_count = global_result['count']
+def match_album(kr, global_result):
+    """3. 한국 + 해외 결과 합치기 (앨범 커버 Fallback: n8n 로직)"""
     album_cover_url = global_result['album_cover_url']
-    search_strategy = global_result.get('search_strategy')
+    bugs_album_id = kr['bugs_album_id']
 
-    if global_found_count > 0:
-        strategy_msg = f" (via {search_strategy})" if search_strategy else ""
-        print(f"    Companion API: {Colors.OKGREEN}✓ Found {global_found_count} platforms{strategy_msg}{Colors.ENDC}")
-    else:
-        print(f"    Companion API: {Colors.FAIL}✗ No platforms found{Colors.ENDC}")
-
-    # 3. 앨범 커버 Fallback (n8n 로직)
     if not album_cover_url and bugs_album_id and len(bugs_album_id) >= 6:
         folder = bugs_album_id[:6]
         album_cover_url = f"https://image.bugsm.co.kr/album/images/500/{folder}/{bugs_album_id}.jpg"
 
-    # 4. DB 저장
-    saved_count = save_to_database(
-        artist_ko, artist_en, album_ko, album_en,
-        kr_platforms, global_platforms, album_cover_url
+    return {
+        'kr': kr,
+        'global': global_result,
+        'album_cover_url': album_cover_url,
+        'total_found': kr['count'] + global_result['count']
+    }
+
+def print_album_result(album, matched):
+    """앨범 하나의 검색 결과 출력 (파이프라인에서는 저장 직전에 앨범 순서대로 출력)"""
+    kr = matched['kr']
+    global_result = matched['global']
+
+    print(f"{Colors.OKCYAN}  → Korean platforms{Colors.ENDC}")
+    for result in kr['results']:
+        if result['found']:
+            mark = f"{Colors.OKGREEN}✓{Colors.ENDC}"
+        elif result.get('error'):
+            mark = f"{Colors.FAIL}✗ ({result['error']}){Colors.ENDC}"
+        else:
+            mark = f"{Colors.FAIL}✗{Colors.ENDC}"
+        print(f"    [{result['platform_id']}] {mark}")
+    print(f"    KR search: {kr['seconds']:.1f}s")
+
+    print(f"{Colors.OKCYAN}  → Global platforms{Colors.ENDC}")
+    if album.get('cdma_code'):
+        print(f"    CDMA Code: {album['cdma_code']}")
+
+    search_strategy = global_result.get('search_strategy')
+    if global_result['count'] > 0:
+        strategy_msg = f" (via {search_strategy})" if search_strategy else ""
+        print(f"    Companion API: {Colors.OKGREEN}✓ Found {global_result['count']} platforms{strategy_msg}{Colors.ENDC}")
+    else:
+        print(f"    Companion API: {Colors.FAIL}✗ No platforms found{Colors.ENDC}")
+
+def save_album(album, matched):
+    """4. DB 저장"""
+    return save_to_database(
+        album['artist_ko'], album.get('artist_en') or '',
+        album['album_ko'], album.get('album_en') or '',
+        matched['kr']['platforms'], matched['global']['platforms'], matched['album_cover_url']
     )
 
-    total_found = kr_found_count + global_found_count
-    return kr_found_count, global_found_count, total_found, saved_count
+_DONE = object()
+
+def collect_pipeline(albums, start=1, albums_in_flight=PIPELINE_ALBUMS):
+    """source → KR 검색 → 글로벌 검색 → match 단계를 스레드로 나눠 실행 (저장은 호출한 쪽에서)
+
+    단계 사이는 크기 제한 큐로 연결하고, 동시에 처리 중인 앨범은 albums_in_flight개까지.
+    KR 검색과 글로벌 검색은 같은 앨범에 대해 동시에 진행된다.
+    (idx, album, matched, error)를 앨범 순서대로 yield (진행 상황 파일이 항상 이어서 재개 가능하도록)
+    """
+    in_flight = threading.BoundedSemaphore(albums_in_flight)
+    kr_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    global_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    match_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    sink_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    kr_workers = max(1, albums_in_flight)
+
+    def source():
+        for idx, album in enumerate(albums, start):
+            in_flight.acquire()
+            if not album['artist_ko'] or not album['album_ko']:
+                sink_queue.put((idx, album, None, 'Missing data'))
+                continue
+            kr_queue.put((idx, album))
+            global_queue.put((idx, album))
+        for _ in range(kr_workers):
+            kr_queue.put(_DONE)
+        global_queue.put(_DONE)
+
+    def kr_stage():
+        while True:
+            item = kr_queue.get()
+            if item is _DONE:
+                return
+            idx, album = item
+            try:
+                match_queue.put((idx, album, 'kr', search_korean_stage(album)))
+            except Exception as e:
+                match_queue.put((idx, album, 'kr', e))
+
+    def global_stage():
+        # 글로벌 검색은 동시에 처리 중인 앨범 수만큼(COMPANION_BATCH_SIZE 이하) 묶어 /search/batch로 전송
+        # (배치가 이보다 크면 뒤쪽 결과는 앞 앨범들이 저장될 때까지 스트림에 묶여 기다림)
+        global_results = iter_global_results(
+            [album for album in albums if album['artist_ko'] and album['album_ko']],
+            batch_size=min(COMPANION_BATCH_SIZE, albums_in_flight)
+        )
+        while True:
+            item = global_queue.get()
+            if item is _DONE:
+                return
+            idx, album = item
+            try:
+                # 배치 실패로 예외가 yield되면 그대로 match 단계의 실패 경로로 전달
+                match_queue.put((idx, album, 'global', next(global_results)))
+            except Exception as e:
+                match_queue.put((idx, album, 'global', e))
+
+    def match_stage():
+        pending = {}
+        while True:
+            idx, album, stage, value = match_queue.get()
+            parts = pending.setdefault(idx, {})
+            parts[stage] = value
+            if len(parts) < 2:
+                continue
+            del pending[idx]
+
+            error = next((str(v) for v in parts.values() if isinstance(v, Exception)), None)
+            if error:
+                sink_queue.put((idx, album, None, error))
+            else:
+                sink_queue.put((idx, album, match_album(parts['kr'], parts['global']), None))
+
+    stages = [source, global_stage, match_stage] + [kr_stage] * kr_workers
+    for stage in stages:
+        threading.Thread(target=stage, name=f"pipeline-{stage.__name__}", daemon=True).start()
+
+    # 앨범 순서대로 전달 (먼저 끝난 앨범은 순서가 올 때까지 보관)
+    done = {}
+    for idx in range(start, start + len(albums)):
+        while idx not in done:
+            item = sink_queue.get()
+            done[item[0]] = item
+        yield done.pop(idx)
+        in_flight.release()
 
 def save_progress(current, total, success, fail):
     """진행 상황 저장"""
@@ -609,34 +824,34 @@ def main():
     total_found = 0
     start_time = datetime.now()
 
-    for idx, album in enumerate(albums, start_idx + 1):
-        artist_ko = album['artist_ko']
-        artist_en = album.get('artist_en') or ''
-        album_ko = album['album_ko']
-        album_en = album.get('album_en') or ''
-        cdma_code = album.get('cdma_code') or None
+    print(f"Albums in flight: {PIPELINE_ALBUMS}\n")
 
-        if not artist_ko or not album_ko:
+    # sink: 파이프라인 결과를 앨범 순서대로 받아 DB 저장
+    for idx, album, matched, error in collect_pipeline(albums, start_idx + 1):
+        if not album['artist_ko'] or not album['album_ko']:
             print(f"{Colors.WARNING}[{idx}/{total}] Skipping: Missing data{Colors.ENDC}\n")
             fail_count += 1
             continue
 
-        header = f"{artist_ko} - {album_ko}"
-        if cdma_code:
-            header += f" [{cdma_code}]"
+        header = f"{album['artist_ko']} - {album['album_ko']}"
+        if album.get('cdma_code'):
+            header += f" [{album['cdma_code']}]"
         print(f"{Colors.BOLD}[{idx}/{total}] {header}{Colors.ENDC}")
 
-        try:
-            kr_found, global_found, total_plat_found, saved_count = process_album(
-                artist_ko, artist_en, album_ko, album_en, cdma_code
-            )
-
-            print(f"{Colors.OKGREEN}  ✓ Success: KR {kr_found}/5, Global {global_found}, Total {saved_count} records saved{Colors.ENDC}\n")
-            success_count += 1
-            total_found += total_plat_found
-        except Exception as e:
-            print(f"{Colors.FAIL}  ✗ Failed: {str(e)}{Colors.ENDC}\n")
+        if error:
+            print(f"{Colors.FAIL}  ✗ Failed: {error}{Colors.ENDC}\n")
             fail_count += 1
+        else:
+            try:
+                print_album_result(album, matched)
+                saved_count = save_album(album, matched)
+
+                print(f"{Colors.OKGREEN}  ✓ Success: KR {matched['kr']['count']}/5, Global {matched['global']['count']}, Total {saved_count} records saved{Colors.ENDC}\n")
+                success_count += 1
+                total_found += matched['total_found']
+            except Exception as e:
+                print(f"{Colors.FAIL}  ✗ Failed: {str(e)}{Colors.ENDC}\n")
+                fail_count += 1
 
         # 진행 상황 저장
         save_progress(idx, total, success_count, fail_count)
@@ -652,10 +867,6 @@ def main():
             print(f"Rate: {rate*60:.1f} albums/min")
             print(f"ETA: {remaining/3600:.1f} hours{Colors.ENDC}\n")
 
-        # 다음 요청 전 대기
-        if idx < total:
-            time.sleep(2)
-
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
 
@@ -669,6 +880,11 @@ def main():
     print(f"Duration: {duration/3600:.1f} hours")
     print(f"Average: {duration/total:.1f}s per album\n")
 
+    print(f"{Colors.OKCYAN}HTTP connections:{Colors.ENDC}")
+    for line in http_client.format_stats():
+        print(f"  {line}")
+    print()
+
     # 진행 상황 파일 삭제
     if os.path.exists('.collection_progress.txt'):
         os.remove('.collection_progress.txt')
@@ -15,6 +15,8 @@ from datetime import datetime
 from urllib.parse import quote
 import json
 
+import http_client
+
 # 로컬 SQLite 사용
 DB_PATH = 'album_links.db'
 
@@ -121,18 +123,8 @@ def search_korean_platforms(artist, album):
         print(f"    [{platform_id}] ", end='', flush=True)
 
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8',
-            }
-
-            # VIBE API용 추가 헤더
-            if platform_id == 'vibe':
-                headers['Referer'] = 'https://vibe.naver.com/'
-                headers['Origin'] = 'https://vibe.naver.com'
-
-            response = requests.get(platform['searchUrl'], headers=headers, timeout=15)
+            # 호스트별 keep-alive 세션 (VIBE Referer/Origin 등 헤더는 http_client에서 설정)
+            response = http_client.get(platform['searchUrl'], timeout=15)
 
             if response.status_code == 200:
                 album_url = None
@@ -284,8 +276,6 @@ def search_korean_platforms(artist, album):
                 'album_id': None
             })
 
-        time.sleep(0.5)
-
     return results
 
 def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_en, cdma_code=None):
@@ -296,7 +286,7 @@ def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_
     print(f"    Calling Companion API at {companion_api_url}...")
 
     try:
-        response = requests.post(
+        response = http_client.post(
             f"{companion_api_url}/search",
             json={
                 'artist_ko': artist_ko,
@@ -305,7 +295,8 @@ def search_global_platforms_via_companion(artist_ko, artist_en, album_ko, album_
                 'album_en': album_en,
                 'cdma_code': cdma_code
             },
-            timeout=90
+            timeout=90,
+            track_latency=False
         )
 
         if response.status_code == 200:
@@ -417,7 +408,10 @@ def main():
 
     print("\n" + "=" * 60)
     print("  Test Complete")
-    print("=" * 60 + "\n")
+    print("=" * 60)
+    for line in http_client.format_stats():
+        print(f"  {line}")
+    print()
 
 if __name__ == "__main__":
     try:
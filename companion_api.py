@@ -4,17 +4,35 @@ Companion.global Selenium 자동화 API + KR 플랫폼 수집
 Flask 서버로 앨범 검색 요청을 받아 Selenium으로 처리
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import atexit
+import base64
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sqlite3
+import sys
+import uuid
+import threading
 import time
 import os
 import re
-from urllib.parse import quote
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from html.parser import HTMLParser
+from urllib.parse import quote, quote_plus, urljoin, urlparse
+import requests
 
 app = Flask(__name__)
 
@@ -25,8 +43,192 @@ SELENIUM_HUB = os.environ.get('SELENIUM_HUB', 'http://localhost:4444')
 COMPANION_USERNAME = os.environ.get('COMPANION_USERNAME', 'candidmusic')
 COMPANION_PASSWORD = os.environ.get('COMPANION_PASSWORD', 'dkfvfk2-%!#')
 
-def get_driver():
-    """Selenium WebDriver 생성"""
+# 여러 계정 사용 시 COMPANION_ACCOUNTS="아이디:비밀번호,아이디:비밀번호" (없으면 위 계정 하나)
+# 계정별 동시 세션 수, 분당 검색 수(0이면 제한 없음)와 순간 허용량, 연속 로그인 실패 시 제외 기준
+ACCOUNT_MAX_SESSIONS = int(os.environ.get('COMPANION_ACCOUNT_MAX_SESSIONS', os.environ.get('SE_NODE_MAX_SESSIONS', '3')))
+ACCOUNT_RATE_PER_MINUTE = float(os.environ.get('COMPANION_ACCOUNT_RATE', '0'))
+ACCOUNT_RATE_BURST = int(os.environ.get('COMPANION_ACCOUNT_BURST', '5'))
+ACCOUNT_MAX_LOGIN_FAILURES = int(os.environ.get('COMPANION_ACCOUNT_MAX_LOGIN_FAILURES', '3'))
+ACCOUNT_EJECT_SECONDS = int(os.environ.get('COMPANION_ACCOUNT_EJECT_SECONDS', '1800'))
+
+# 드라이버 풀 설정 (Selenium Grid 노드의 SE_NODE_MAX_SESSIONS에 맞춤)
+DRIVER_POOL_SIZE = int(os.environ.get('SE_NODE_MAX_SESSIONS', '3'))
+DRIVER_MAX_SEARCHES = int(os.environ.get('DRIVER_MAX_SEARCHES', '50'))  # N회 검색 후 브라우저 재시작
+DRIVER_MAX_HEAP_MB = int(os.environ.get('DRIVER_MAX_HEAP_MB', '512'))  # JS 힙이 이보다 크면 재시작
+DRIVER_ACQUIRE_TIMEOUT = int(os.environ.get('DRIVER_ACQUIRE_TIMEOUT', '60'))
+
+# 일괄 검색 (/search/batch) 최대 항목 수
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '50'))
+
+# companion_api 상태 저장용 SQLite (작업 큐 등)
+COMPANION_DB_PATH = os.environ.get('COMPANION_DB_PATH', 'companion_api.db')
+
+# 비동기 작업 (/jobs) 설정
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', str(DRIVER_POOL_SIZE)))  # 그리드가 쉬지 않도록 풀 크기만큼
+JOB_MAX_WAIT = 60  # GET /jobs/<id>?wait= 최대 대기 시간 (초)
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', '24'))  # 완료된 작업 보관 기간
+# 실행 중 서버가 재시작된 작업을 다시 시도하는 최대 횟수 (넘으면 failed: 매번 서버를 죽이는 작업이 무한히 돌지 않도록)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+
+# 대기 설정 (고정 sleep 대신 DOM 조건이 충족되는 즉시 진행)
+ALBUM_DEADLINE = float(os.environ.get('ALBUM_DEADLINE', '90'))  # 앨범 한 건 전체 제한 시간 (초)
+WAIT_POLL_INTERVAL = 0.2
+CATALOG_READY_TIMEOUT = 15
+SEARCH_RESULTS_TIMEOUT = 20
+SMART_LINK_TIMEOUT = 10
+KR_SEARCH_TIMEOUT = 10  # KR 플랫폼 동시 검색 전체 제한 시간
+KR_HTTP_POOL_SIZE = int(os.environ.get('KR_HTTP_POOL_SIZE', str(DRIVER_POOL_SIZE * 5)))
+
+# HTTP 전용 모드: 브라우저는 로그인 갱신에만 쓰고 검색/Smart Link 조회는 requests로 처리
+COMPANION_HTTP_MODE = os.environ.get('COMPANION_HTTP_MODE', '0') == '1'
+HTTP_TIMEOUT = 15
+
+# 검색 결과 읽기 방식: network (performance 로그의 XHR 응답 우선, 실패 시 DOM) / dom
+CATALOG_CAPTURE = os.environ.get('CATALOG_CAPTURE', 'network')
+
+# CDMA 검색과 앨범명 검색을 같은 세션의 두 탭에서 동시에 실행
+SPECULATIVE_SEARCH = os.environ.get('SPECULATIVE_SEARCH', '1') == '1'
+
+# 브라우저 하나에서 동시에 검색할 앨범 수 (탭 수), 1이면 브라우저당 한 건씩
+# 탭 모드는 검색 방식을 순서대로 시도하고 네트워크 캡처를 쓰지 않으므로 (SPECULATIVE_SEARCH, CATALOG_CAPTURE 미적용) 기본은 1
+BROWSER_TABS = int(os.environ.get('BROWSER_TABS', '1'))
+
+# performance 로그는 NetworkCapture가 읽는 드라이버에만 켠다
+# (탭 모드는 읽지 않으므로 켜 두면 chromedriver에 모든 페이지의 Network 이벤트가 계속 쌓인다)
+NETWORK_LOG = CATALOG_CAPTURE == 'network' and BROWSER_TABS <= 1
+
+COMPANION_BASE_URL = 'http://companion.global'
+CATALOG_URL = 'http://companion.global/catalog?init=Y&t={}'
+
+# 로컬 카탈로그 인덱스 (CDMA/UPC → Smart Link) 갱신 주기, 0이면 자동 갱신 안 함
+CATALOG_INDEX_REFRESH_HOURS = float(os.environ.get('CATALOG_INDEX_REFRESH_HOURS', '6'))
+CATALOG_CRAWL_MAX_PAGES = int(os.environ.get('CATALOG_CRAWL_MAX_PAGES', '1000'))
+CATALOG_CRAWL_DEADLINE = 4 * 3600
+# 자동(증분) 갱신이 읽는 최대 페이지 수: 전체 크롤링은 서버 밖에서 `python3 companion_api.py crawl --full`로만
+CATALOG_INCREMENTAL_MAX_PAGES = int(os.environ.get('CATALOG_INCREMENTAL_MAX_PAGES', '20'))
+
+# 검색 결과 캐시: 찾은 결과/못 찾은 결과 TTL(초), 최대 항목 수
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL_HOURS', '168')) * 3600
+RESULT_CACHE_NEGATIVE_TTL = float(os.environ.get('RESULT_CACHE_NEGATIVE_TTL_HOURS', '6')) * 3600
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '50000'))
+
+# 디버그용 페이지 저장 (page_source를 WebDriver로 받아오므로 기본은 끔)
+# off / failures (못 찾음·오류일 때만) / sample (DEBUG_CAPTURE_SAMPLE건 중 1건의 모든 단계) / all
+DEBUG_CAPTURE = os.environ.get('DEBUG_CAPTURE', 'off')
+DEBUG_CAPTURE_SAMPLE = int(os.environ.get('DEBUG_CAPTURE_SAMPLE', '20'))
+DEBUG_CAPTURE_DIR = os.environ.get('DEBUG_CAPTURE_DIR', '/tmp/companion_debug')
+DEBUG_CAPTURE_MAX_MB = float(os.environ.get('DEBUG_CAPTURE_MAX_MB', '50'))  # 넘으면 오래된 파일부터 삭제
+DEBUG_CAPTURE_MAX_PAGE_KB = int(os.environ.get('DEBUG_CAPTURE_MAX_PAGE_KB', '2048'))  # 페이지 하나 최대 크기
+
+# 브라우저 검색 요청 수용 한도: 동시 실행 수(기본: 드라이버 수 × 탭 수), 대기열 길이, 대기열 최대 대기 시간(초)
+# 대기열이 가득 차면 429 + Retry-After로 바로 거절
+ADMISSION_CONCURRENCY = int(os.environ.get('ADMISSION_CONCURRENCY', str(DRIVER_POOL_SIZE * max(BROWSER_TABS, 1))))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', str(ADMISSION_CONCURRENCY * 2)))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '30'))
+# 진행 중인 같은 검색에 합류한 요청의 최대 대기 (초): 직접 대기열에 섰을 때의 최대 시간 (대기 + 검색 제한 시간)
+# 넘으면 429 (앞선 검색이 /jobs 워커처럼 제한 없이 슬롯을 기다리는 경우)
+SINGLE_FLIGHT_WAIT = ADMISSION_QUEUE_TIMEOUT + ALBUM_DEADLINE
+
+# 브라우저 프로필: light (이미지/미디어/폰트/분석 스크립트 요청 차단 + eager 로딩) / full (모두 로딩)
+BROWSER_PROFILE = os.environ.get('BROWSER_PROFILE', 'light')
+BROWSER_BLOCK = [c.strip() for c in os.environ.get('BROWSER_BLOCK', 'image,media,font,analytics').split(',') if c.strip()]
+# 차단하지 않을 도메인 (쉼표 구분, 하위 도메인 포함): 이 도메인의 페이지에서는 차단을 끄고, 이 도메인의 분석 스크립트는 허용
+BROWSER_BLOCK_ALLOW = [d.strip().lower() for d in os.environ.get('BROWSER_BLOCK_ALLOW', '').split(',') if d.strip()]
+
+# 로그: 레벨 (행/플랫폼마다 찍는 줄은 DEBUG), 형식 text / json, 출력 대기열 길이 (가득 차면 버림)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+# 현재 스레드가 처리 중인 요청 id (로그 줄과 디버그 캡처에 붙음)
+log_context = threading.local()
+
+class RequestLogFilter(logging.Filter):
+    """레코드에 request_id를 붙이고 요청별·레벨별 로그 줄 수를 센다"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.per_request = {}  # request_id -> 줄 수 (검색이 끝나면 pop_count로 꺼냄)
+        self.per_level = {}
+
+    def filter(self, record):
+        request_id = getattr(log_context, 'request_id', None)
+        record.request_id = request_id or '-'
+        with self._lock:
+            self.per_level[record.levelname] = self.per_level.get(record.levelname, 0) + 1
+            if request_id:
+                if len(self.per_request) > 10000:
+                    self.per_request.clear()  # 끝나지 않은 요청이 쌓이지 않도록
+                self.per_request[request_id] = self.per_request.get(request_id, 0) + 1
+        return True
+
+    def pop_count(self, request_id):
+        with self._lock:
+            return self.per_request.pop(request_id, 0)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """출력 대기열에 넣기만 하고 바로 반환 (가득 차면 버리고 센다)"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'request_id': record.request_id,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }, ensure_ascii=False)
+
+def setup_logging():
+    """검색 스레드는 대기열에 넣기만 하고, 백그라운드 스레드가 stdout에 쓴다"""
+    logger = logging.getLogger('companion_api')
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream.setFormatter(JsonLogFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(message)s'))
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(log_filter)
+    logger.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    return logger, handler
+
+log_filter = RequestLogFilter()
+log, log_handler = setup_logging()
+
+def log_stats():
+    return {
+        'level': LOG_LEVEL,
+        'format': LOG_FORMAT,
+        'queued': log_handler.queue.qsize(),
+        'dropped': log_handler.dropped,
+        'records': dict(log_filter.per_level)
+    }
+
+def get_driver(profile=None, network_log=NETWORK_LOG):
+    """Selenium WebDriver 생성 (profile: light / full, 기본은 BROWSER_PROFILE)
+
+    network_log면 Network 이벤트를 performance 로그로 수집 (읽는 쪽이 drain_performance_log 등으로 비워야 함)
+    """
+    profile = profile or BROWSER_PROFILE
     chrome_options = Options()
     chrome_options.add_argument('--headless')
     chrome_options.add_argument('--no-sandbox')
@@ -34,725 +236,3715 @@ def get_driver():
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--window-size=1920,1080')
 
+    # DOMContentLoaded에서 driver.get 반환 (이후 단계는 DOM 조건으로 대기하므로 load 이벤트를 기다릴 필요 없음)
+    if profile == 'light':
+        chrome_options.page_load_strategy = 'eager'
+
+    # 검색 XHR 응답을 직접 읽기 위해 Network 이벤트를 performance 로그로 수집
+    if network_log:
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
     # Remote WebDriver 사용 (Selenium Hub)
     driver = webdriver.Remote(
         command_executor=SELENIUM_HUB,
         options=chrome_options
     )
 
-    return driver
+    if profile == 'light':
+        resource_blocker.enable(driver)
+    return driver
+
+# 페이지 전송량 (performance 로그를 못 읽을 때): Resource Timing의 transferSize 합계
+# (Timing-Allow-Origin이 없는 다른 출처 리소스는 0으로 잡힘)
+TRANSFER_SIZE_JS = """
+return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+       .reduce(function (sum, entry) { return sum + (entry.transferSize || 0); }, 0);
+"""
+
+def drain_performance_log(driver):
+    """쌓인 performance 로그 비우기 (로그가 꺼져 있으면 무시)"""
+    try:
+        driver.get_log('performance')
+    except Exception:
+        pass
+
+def measure_page(driver, url, ready_js):
+    """url을 열어 ready_js가 참이 될 때까지 걸린 시간과, 로딩이 끝날 때까지의 전송량·요청 수 측정"""
+    drain_performance_log(driver)  # 이전 페이지 로그 비우기
+
+    started = time.time()
+    resource_blocker.prepare(driver, url)
+    driver.get(url)
+    WebDriverWait(driver, 30, poll_frequency=WAIT_POLL_INTERVAL).until(js_condition(ready_js))
+    ready = time.time() - started
+    try:
+        WebDriverWait(driver, 15, poll_frequency=WAIT_POLL_INTERVAL).until(
+            js_condition("return document.readyState === 'complete';"))
+    except TimeoutException:
+        pass
+
+    transferred = requests_count = 0
+    try:
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            if message.get('method') == 'Network.loadingFinished':
+                transferred += message['params'].get('encodedDataLength', 0)
+                requests_count += 1
+    except Exception:
+        transferred = driver.execute_script(TRANSFER_SIZE_JS) or 0
+    return ready, transferred, requests_count
+
+def benchmark_browser_profile(runs=3, smart_link_url=None):
+    """full / light 프로필로 Catalog 페이지(와 Smart Link 페이지)의 준비 시간, 전송량 비교"""
+    pages = [('catalog', lambda: CATALOG_URL.format(int(time.time() * 1000)), CATALOG_READY_JS)]
+    if smart_link_url:
+        pages.append(('smart_link', lambda: smart_link_url, SMART_LINK_READY_JS))
+
+    results = {}
+    for profile in ('full', 'light'):
+        driver = get_driver(profile, network_log=True)
+        try:
+            driver_accounts[driver] = account_pool.accounts[0]
+            if not login_to_companion(driver):
+                log.error(f"[Benchmark] Login failed ({profile})")
+                return None
+            for name, url, ready_js in pages:
+                samples = [measure_page(driver, url(), ready_js) for _ in range(runs)]
+                results[(profile, name)] = {
+                    'ready': round(sum(sample[0] for sample in samples) / runs, 3),
+                    'kb': round(sum(sample[1] for sample in samples) / runs / 1024, 1),
+                    'requests': round(sum(sample[2] for sample in samples) / runs, 1)
+                }
+                log.info(f"[Benchmark] {profile:5} {name:10} {results[(profile, name)]}")
+        finally:
+            driver.quit()
+
+    for name, _, _ in pages:
+        full, light = results[('full', name)], results[('light', name)]
+        log.info(f"[Benchmark] {name}: ready {full['ready']}s → {light['ready']}s, "
+                 f"{full['kb']}KB → {light['kb']}KB, {full['requests']} → {light['requests']} requests")
+    return results
+
+# light 프로필에서 차단할 요청 (Network.setBlockedURLs 와일드카드 패턴)
+BLOCK_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.bmp*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m4a*', '*.ogg*', '*.wav*', '*.m3u8*'],
+    'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'analytics': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                  '*connect.facebook.net*', '*hotjar.com*', '*wcs.naver.net*', '*analytics.js*']
+}
+
+def domain_allowed(host):
+    """BROWSER_BLOCK_ALLOW에 있는 도메인(또는 하위 도메인)인지"""
+    host = (host or '').lower()
+    return any(host == domain or host.endswith('.' + domain) for domain in BROWSER_BLOCK_ALLOW)
+
+def blocked_url_patterns(categories=None):
+    """차단할 URL 패턴 목록 (허용 도메인의 분석 스크립트 패턴 제외)"""
+    patterns = []
+    for category in categories or BROWSER_BLOCK:
+        for pattern in BLOCK_PATTERNS.get(category, []):
+            if category == 'analytics' and domain_allowed(pattern.strip('*')):
+                continue
+            patterns.append(pattern)
+    return patterns
+
+class ResourceBlocker:
+    """light 프로필: 탭마다 CDP Network.setBlockedURLs로 이미지/미디어/폰트/분석 스크립트 요청 차단
+
+    CDP 설정은 탭(target)별이므로 새 탭을 열 때마다 enable을 다시 호출해야 한다.
+    BROWSER_BLOCK_ALLOW가 있으면 이동할 때마다 prepare로 그 탭의 차단을 켜고 끈다.
+    """
+
+    def __init__(self):
+        self._tabs = weakref.WeakKeyDictionary()  # driver -> {window handle: 차단 여부}
+        self.enabled = 0
+        self.failures = 0
+
+    def _set(self, driver, block):
+        tabs = self._tabs.setdefault(driver, {})
+        handle = driver.current_window_handle
+        if tabs.get(handle) == block:
+            return
+        try:
+            driver.execute('executeCdpCommand', {'cmd': 'Network.enable', 'params': {}})
+            driver.execute('executeCdpCommand', {
+                'cmd': 'Network.setBlockedURLs',
+                'params': {'urls': blocked_url_patterns() if block else []}
+            })
+        except Exception as e:
+            # 차단이 안 되어도 검색은 되므로 경고만
+            self.failures += 1
+            log.warning(f"[Browser Profile] Could not set blocked URLs: {str(e)}")
+            return
+        tabs[handle] = block
+        if block:
+            self.enabled += 1
+
+    def enable(self, driver):
+        """light 프로필 드라이버로 등록하고 현재 탭에서 차단 시작 (드라이버 생성 직후)"""
+        self._set(driver, True)
+
+    def enable_new_tab(self, driver):
+        """새로 연 탭에도 차단 적용 (light 프로필 드라이버만)"""
+        if driver in self._tabs:
+            self._set(driver, True)
+
+    def prepare(self, driver, url):
+        """url로 이동하기 전 호출. 허용 도메인 페이지면 그 탭의 차단을 끔 (허용 목록이 없으면 아무것도 안 함)"""
+        if BROWSER_BLOCK_ALLOW and driver in self._tabs:
+            self._set(driver, not domain_allowed(urlparse(url).hostname))
+
+    def stats(self):
+        return {
+            'profile': BROWSER_PROFILE,
+            'blocked': BROWSER_BLOCK if BROWSER_PROFILE == 'light' else [],
+            'allow': BROWSER_BLOCK_ALLOW,
+            'tabs_enabled': self.enabled,
+            'failures': self.failures
+        }
+
+resource_blocker = ResourceBlocker()
+
+def new_tab(driver):
+    """새 탭을 열고 전환 (light 프로필이면 그 탭에도 차단 적용)"""
+    driver.switch_to.new_window('tab')
+    resource_blocker.enable_new_tab(driver)
+    return driver.current_window_handle
+
+class DeadlineExceeded(Exception):
+    """앨범 한 건의 전체 제한 시간(ALBUM_DEADLINE) 초과"""
+
+class SearchBudget:
+    """앨범 한 건의 대기 예산
+
+    단계별 제한 시간과 전체 마감 시간을 함께 적용하고, 단계별로 실제 대기한 시간(waits)과
+    단계별 소요 시간(timings: driver_acquire, login, catalog_load, search, row_match,
+    smart_link_load, platform_parse, kr_<플랫폼>)을 기록한다.
+    """
+
+    def __init__(self, total=ALBUM_DEADLINE):
+        self.started = time.time()
+        self.deadline = self.started + total
+        self.waits = {}
+        self.timings = {}
+        # HTTP 요청 안이면 그 요청의 id, 아니면 새 id
+        self.request_id = getattr(log_context, 'request_id', None) or uuid.uuid4().hex[:12]
+        self.sampled = (DEBUG_CAPTURE == 'all'
+                        or (DEBUG_CAPTURE == 'sample' and random.randrange(max(DEBUG_CAPTURE_SAMPLE, 1)) == 0))
+
+    def remaining(self):
+        return self.deadline - time.time()
+
+    def add(self, phase, seconds):
+        """phase 소요 시간에 seconds를 더함"""
+        self.timings[phase] = round(self.timings.get(phase, 0) + max(seconds, 0), 3)
+
+    def record(self, phase, started):
+        """started부터 지금까지 걸린 시간을 phase 소요 시간에 더함"""
+        self.add(phase, time.time() - started)
+
+    def wait_until(self, driver, step, condition, timeout):
+        """condition이 참이 될 때까지 대기. 단계 제한 시간 초과 시 None, 전체 마감 초과 시 DeadlineExceeded"""
+        limit = min(timeout, self.remaining())
+        if limit <= 0:
+            raise DeadlineExceeded(f'Album deadline ({ALBUM_DEADLINE:.0f}s) exceeded before step: {step}')
+
+        started = time.time()
+        try:
+            return WebDriverWait(driver, limit, poll_frequency=WAIT_POLL_INTERVAL).until(condition)
+        except TimeoutException:
+            if self.remaining() <= 0:
+                raise DeadlineExceeded(f'Album deadline ({ALBUM_DEADLINE:.0f}s) exceeded during step: {step}')
+            log.warning(f"[Wait] {step}: condition not met within {limit:.1f}s")
+            return None
+        finally:
+            self.waits[step] = round(self.waits.get(step, 0) + time.time() - started, 3)
+
+def js_condition(script, *args):
+    """JavaScript 식의 결과가 참이 될 때까지 기다리는 WebDriverWait 조건"""
+    return lambda driver: driver.execute_script(script, *args)
+
+# Catalog 페이지 준비 완료 (또는 세션 만료로 로그인 폼이 뜬 경우)
+CATALOG_READY_JS = """
+if (document.getElementById('username')) { return true; }
+var input = document.getElementById('search_text');
+return !!input && !input.disabled && typeof catalog !== 'undefined' && typeof catalog.search === 'function';
+"""
+
+# 검색 실행 직전에 결과 테이블 변경 감시 시작
+WATCH_RESULTS_JS = """
+window.__catalogRendered = false;
+if (window.__catalogObserver) { window.__catalogObserver.disconnect(); }
+window.__catalogObserver = new MutationObserver(function () { window.__catalogRendered = true; });
+window.__catalogObserver.observe(document.querySelector('table') || document.body,
+                                 {childList: true, subtree: true, characterData: true});
+"""
+
+# 결과 테이블이 다시 그려졌고 로딩창과 XHR이 모두 끝났는지
+RESULTS_RENDERED_JS = """
+var loading = document.querySelector('div.loading');
+var loadingVisible = !!loading && loading.getClientRects().length > 0
+                     && getComputedStyle(loading).visibility !== 'hidden';
+var ajaxIdle = !window.jQuery || window.jQuery.active === 0;
+return window.__catalogRendered === true && !loadingVisible && ajaxIdle;
+"""
+
+# Smart Link 페이지의 플랫폼 목록 로딩 완료
+SMART_LINK_READY_JS = """
+return document.readyState === 'complete'
+       && (document.querySelectorAll('#platList li').length > 0 || !!document.getElementById('platList'));
+"""
+
+def element_present(css_selector):
+    """CSS 선택자에 맞는 요소가 생길 때까지 기다리는 조건"""
+    return js_condition("return document.querySelector(arguments[0]) !== null;", css_selector)
+
+class DebugCapture:
+    """디버그용 페이지 저장 (요청 id별 gzip 파일, 디스크 한도를 넘으면 오래된 것부터 삭제)
+
+    DEBUG_CAPTURE가 off면 page_source를 받아오지 않는다.
+    """
+
+    def __init__(self, mode=DEBUG_CAPTURE, directory=DEBUG_CAPTURE_DIR, max_mb=DEBUG_CAPTURE_MAX_MB,
+                 max_page_kb=DEBUG_CAPTURE_MAX_PAGE_KB):
+        self.mode = mode
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_page_bytes = max_page_kb * 1024
+        self._lock = threading.Lock()
+        self._files = None  # deque of (path, size), 오래된 순
+        self.total_bytes = 0
+        self.saved = 0
+        self.deleted = 0
+
+    def _load(self):
+        """이전에 저장된 파일 목록 (처음 저장할 때 한 번)"""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.html.gz') and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        self._files = deque((path, size) for _, path, size in files)
+        self.total_bytes = sum(size for _, size in self._files)
+
+    def wanted(self, budget, failed):
+        if self.mode == 'off':
+            return False
+        if failed and self.mode in ('failures', 'sample'):
+            return True
+        return bool(budget and budget.sampled) or self.mode == 'all'
+
+    def snapshot(self, driver, budget, name, failed=False):
+        """현재 페이지 저장 (저장 대상이 아니면 아무것도 하지 않음). 저장한 경로 반환"""
+        if not self.wanted(budget, failed):
+            return None
+        try:
+            html = driver.page_source
+            url = driver.current_url
+        except Exception as e:
+            log.warning(f"[Debug Capture] Failed to read page ({name}): {str(e)}")
+            return None
+
+        data = html.encode('utf-8', 'replace')
+        truncated = len(data) > self.max_page_bytes
+        header = f'<!-- {url} | {time.strftime("%Y-%m-%d %H:%M:%S")}{" | truncated" if truncated else ""} -->\n'
+        payload = gzip.compress(header.encode('utf-8') + data[:self.max_page_bytes])
+
+        request_id = (budget.request_id if budget else getattr(log_context, 'request_id', None)) or 'none'
+
+        with self._lock:
+            # 일괄 검색은 항목들이 같은 요청 id를 쓰므로 전체 일련번호로 구분
+            path = os.path.join(self.directory, f'{request_id}-{self.saved + 1:06d}-{name}.html.gz')
+            try:
+                if self._files is None:
+                    self._load()
+                with open(path, 'wb') as f:
+                    f.write(payload)
+            except OSError as e:
+                log.warning(f"[Debug Capture] Failed to save {path}: {str(e)}")
+                return None
+            self._files.append((path, len(payload)))
+            self.total_bytes += len(payload)
+            self.saved += 1
+            # 디스크 한도를 넘으면 오래된 파일부터 삭제
+            while self.total_bytes > self.max_bytes and len(self._files) > 1:
+                old_path, old_size = self._files.popleft()
+                self.total_bytes -= old_size
+                self.deleted += 1
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+        log.info(f"[Debug Capture] Saved {name} page to {path}")
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'sample': DEBUG_CAPTURE_SAMPLE if self.mode == 'sample' else None,
+                'directory': self.directory if self.mode != 'off' else None,
+                'files': len(self._files) if self._files is not None else 0,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'saved': self.saved,
+                'deleted': self.deleted
+            }
+
+debug_capture = DebugCapture()
+
+def parse_companion_accounts(value):
+    """COMPANION_ACCOUNTS("아이디:비밀번호,아이디:비밀번호") 파싱. 비어 있으면 기본 계정 하나"""
+    accounts = []
+    for entry in re.split(r'[,\n]', value or ''):
+        username, sep, password = entry.strip().partition(':')
+        if username and sep:
+            accounts.append((username, password))
+    return accounts or [(COMPANION_USERNAME, COMPANION_PASSWORD)]
+
+class CompanionAccount:
+    """Companion 계정 하나의 동시 세션 수, 검색 속도(토큰 버킷), 로그인 실패 상태"""
+
+    def __init__(self, username, password, max_sessions, rate_per_minute, burst):
+        self.username = username
+        self.password = password
+        self.max_sessions = max_sessions
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.time()
+        self.in_use = 0
+        self.searches = 0
+        self.login_failures = 0
+        self.ejected_until = 0
+
+    def refill(self, now):
+        if self.rate_per_second <= 0:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_per_second)
+        self.refilled_at = now
+        return self.tokens
+
+    def token_wait(self):
+        """토큰 하나가 찰 때까지 남은 시간 (초)"""
+        if self.rate_per_second <= 0 or self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate_per_second
+
+    def stats(self, now):
+        return {
+            'username': self.username,
+            'in_use': self.in_use,
+            'max_sessions': self.max_sessions,
+            'tokens': round(self.tokens, 2),
+            'searches': self.searches,
+            'login_failures': self.login_failures,
+            'ejected_for': max(0, round(self.ejected_until - now)) or None
+        }
+
+class AccountPool:
+    """여러 Companion 계정 중 가장 한가한 정상 계정을 골라준다
+
+    로그인에 연속으로 실패한 계정은 ACCOUNT_EJECT_SECONDS 동안 배정에서 뺀다.
+    """
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline):
+        """세션 한 개와 검색 토큰 한 개를 잡은 계정 반환. 모든 계정이 빠져 있으면 None"""
+        with self._cond:
+            while True:
+                now = time.time()
+                healthy = [account for account in self.accounts if now >= account.ejected_until]
+                if not healthy:
+                    return None
+                free = [account for account in healthy if account.in_use < account.max_sessions]
+                ready = [account for account in free if account.refill(now) >= 1]
+                if ready:
+                    account = min(ready, key=lambda a: (a.in_use / a.max_sessions, -a.tokens))
+                    account.in_use += 1
+                    account.tokens -= 1
+                    account.searches += 1
+                    return account
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError('No Companion account available (session or rate limit)')
+                # 세션이 비면 release가 깨우고, 토큰만 부족하면 찰 때까지 대기
+                wait = min([account.token_wait() for account in free] or [remaining])
+                self._cond.wait(min(max(wait, WAIT_POLL_INTERVAL), remaining))
+
+    def take_token(self, account, timeout):
+        """이미 세션을 잡은 계정에서 검색 토큰 하나 더 사용 (timeout 안에 못 얻으면 False)"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while account.refill(time.time()) < 1:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(max(account.token_wait(), WAIT_POLL_INTERVAL), remaining))
+            account.tokens -= 1
+            account.searches += 1
+            return True
+
+    def release(self, account):
+        with self._cond:
+            account.in_use -= 1
+            self._cond.notify_all()
+
+    def login_result(self, account, success):
+        """로그인 결과 기록. 연속 실패가 쌓이면 배정에서 제외"""
+        with self._cond:
+            if success:
+                account.login_failures = 0
+                account.ejected_until = 0
+                return
+            account.login_failures += 1
+            if account.login_failures >= ACCOUNT_MAX_LOGIN_FAILURES:
+                account.ejected_until = time.time() + ACCOUNT_EJECT_SECONDS
+                log.warning(f"[Accounts] {account.username}: {account.login_failures} login failures, "
+                            f"out of rotation for {ACCOUNT_EJECT_SECONDS}s")
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return [account.stats(now) for account in self.accounts]
+
+account_pool = AccountPool([
+    CompanionAccount(username, password, ACCOUNT_MAX_SESSIONS, ACCOUNT_RATE_PER_MINUTE, ACCOUNT_RATE_BURST)
+    for username, password in parse_companion_accounts(os.environ.get('COMPANION_ACCOUNTS', ''))
+])
+
+# 드라이버별 로그인 계정 (세션 만료 후 다시 로그인할 때 같은 계정 사용)
+driver_accounts = weakref.WeakKeyDictionary()
+
+def login_to_companion(driver):
+    """Companion.global (FLUXUS)에 드라이버의 계정으로 로그인 (결과는 계정 상태에 기록)"""
+    account = driver_accounts.get(driver) or account_pool.accounts[0]
+    success = _login_to_companion(driver, account)
+    account_pool.login_result(account, success)
+    return success
+
+def _login_to_companion(driver, account):
+    try:
+        log.info("[Companion API] Starting login process...")
+
+        # 로그인 페이지 접속
+        resource_blocker.prepare(driver, COMPANION_BASE_URL)
+        driver.get(COMPANION_BASE_URL)
+        log.debug(f"[Companion API] Loaded login page: {driver.current_url}")
+
+        # Username 입력
+        username_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.ID, 'username'))
+        )
+        username_input.clear()
+        username_input.send_keys(account.username)
+        log.debug(f"[Companion API] Entered username: {account.username}")
+
+        # Password 입력
+        password_input = driver.find_element(By.ID, 'password')
+        password_input.clear()
+        password_input.send_keys(account.password)
+        log.debug("[Companion API] Entered password")
+
+        # 로그인 버튼 클릭
+        login_url = driver.current_url
+        login_button = driver.find_element(By.CSS_SELECTOR, 'button[type="submit"], .btn_login')
+        login_button.click()
+        log.debug("[Companion API] Clicked login button")
+
+        # 로그인 완료 대기 (dashboard 등 다른 페이지로 리다이렉트될 때까지)
+        try:
+            WebDriverWait(driver, 15, poll_frequency=WAIT_POLL_INTERVAL).until(EC.url_changes(login_url))
+        except TimeoutException:
+            log.warning("[Companion API] Timeout waiting for redirect after login")
+        log.debug(f"[Companion API] After login, URL: {driver.current_url}")
+        log.debug(f"[Companion API] Page title: {driver.title}")
+
+        # 로그인 실패 체크 (error=true가 있거나 여전히 login 페이지면)
+        if 'error=true' in driver.current_url or '/login' in driver.current_url:
+            log.warning("[Companion API] Login failed - still on login page or error detected")
+            debug_capture.snapshot(driver, None, 'login_error', failed=True)
+            return False
+
+        # Dashboard 페이지 확인
+        if '/dashboard' in driver.current_url:
+            log.debug("[Companion API] Successfully reached dashboard")
+        else:
+            log.warning(f"[Companion API] Unexpected page after login: {driver.current_url}")
+
+        log.info("[Companion API] Login successful")
+        return True
+
+    except Exception as e:
+        log.exception(f"[Companion API] Login failed: {str(e)}")
+        return False
+
+def is_login_page(driver):
+    """로그인 세션이 만료되어 로그인 페이지로 돌아왔는지 확인"""
+    current_url = driver.current_url
+    return '/login' in current_url or 'error=true' in current_url
+
+def get_js_heap_mb(driver):
+    """브라우저 JS 힙 사용량 (MB). 응답이 없으면 None"""
+    try:
+        used = driver.execute_script(
+            "return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : 0;"
+        )
+        return (used or 0) / (1024 * 1024)
+    except Exception:
+        return None
+
+# 드라이버별 Catalog 탭 핸들 (동시 검색용 두 번째 탭을 재사용)
+catalog_tabs = weakref.WeakKeyDictionary()
+
+class PooledDriver:
+    """풀에서 관리되는 로그인된 WebDriver"""
+
+    def __init__(self, driver, account):
+        self.driver = driver
+        self.account = account
+        self.searches = 0
+        self.created_at = time.time()
+        self.prepaid = False  # acquire에서 이미 검색 토큰 하나를 사용했는지
+        self.login_seconds = 0  # 새로 로그인한 시간 (처음 빌려간 검색의 timings.login으로 보고)
+
+class DriverPool:
+    """로그인된 WebDriver 풀
+
+    요청마다 브라우저 생성 + 로그인을 반복하지 않도록 세션을 재사용한다.
+    N회 검색 후 또는 JS 힙이 커지면 브라우저를 재시작한다.
+    계정이 여러 개면 account_pool이 고른 계정으로 로그인된 드라이버를 내준다.
+    """
+
+    def __init__(self, size, max_searches, max_heap_mb):
+        self.size = size
+        self.max_searches = max_searches
+        self.max_heap_mb = max_heap_mb
+        self._idle = []
+        self._total = 0  # 사용 중 + 대기 중인 드라이버 수
+        self._cond = threading.Condition()
+        self.created = 0
+        self.recycled = 0
+
+    def _create(self, account):
+        """새 드라이버 생성 후 account로 로그인. 로그인 실패 시 None"""
+        driver = get_driver()
+        driver_accounts[driver] = account
+        started = time.time()
+        if not login_to_companion(driver):
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return None
+        with self._cond:
+            self.created += 1
+        pooled = PooledDriver(driver, account)
+        pooled.login_seconds = time.time() - started
+        return pooled
+
+    def _free_slot(self):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def acquire(self, timeout=DRIVER_ACQUIRE_TIMEOUT):
+        """계정을 고른 뒤 그 계정의 대기 중인 드라이버를 꺼내거나 새로 생성. 로그인 실패 시 None"""
+        deadline = time.time() + timeout
+        account = account_pool.acquire(deadline)
+        if not account:
+            log.warning("[Driver Pool] All Companion accounts are out of rotation")
+            return None
+
+        try:
+            pooled = self._acquire_for(account, deadline, timeout)
+        except Exception:
+            account_pool.release(account)
+            raise
+        if not pooled:
+            account_pool.release(account)
+            return None
+        pooled.prepaid = True
+        return pooled
+
+    def _acquire_for(self, account, deadline, timeout):
+        victim = None
+        with self._cond:
+            while True:
+                pooled = next((p for p in reversed(self._idle) if p.account is account), None)
+                if pooled or self._total < self.size:
+                    break
+                # 풀이 가득 찼으면 다른 계정의 대기 중인 드라이버를 정리하고 그 자리를 사용
+                victim = self._idle[-1] if self._idle else None
+                if victim:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f'No WebDriver available within {timeout}s (pool size {self.size})')
+                self._cond.wait(remaining)
+            if pooled:
+                self._idle.remove(pooled)
+            elif victim:
+                self._idle.remove(victim)
+            else:
+                self._total += 1
+
+        if victim:
+            log.info(f"[Driver Pool] Replacing idle session of {victim.account.username} for {account.username}")
+            self._quit(victim)
+
+        # 대기 중이던 세션이 죽었으면 새로 생성
+        if pooled and get_js_heap_mb(pooled.driver) is None:
+            log.warning("[Driver Pool] Idle session is dead, replacing")
+            self._quit(pooled)
+            pooled = None
+
+        if pooled:
+            return pooled
+
+        try:
+            pooled = self._create(account)
+        except Exception:
+            self._free_slot()
+            raise
+        if not pooled:
+            self._free_slot()
+        return pooled
+
+    def charge(self, pooled, timeout=0):
+        """빌린 드라이버로 검색 한 건을 더 할 때 계정의 검색 토큰 사용 (acquire 직후 첫 건은 무료)"""
+        if pooled.prepaid:
+            pooled.prepaid = False
+            return True
+        return account_pool.take_token(pooled.account, timeout)
+
+    def _quit(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self.recycled += 1
+
+    def recycle_reason(self, pooled):
+        """재시작해야 하면 그 이유 (검색 횟수 / JS 힙 / 응답 없음), 아니면 None"""
+        if pooled.searches >= self.max_searches:
+            return f'{pooled.searches} searches'
+        heap_mb = get_js_heap_mb(pooled.driver)
+        if heap_mb is None:
+            return 'unresponsive'
+        if heap_mb > self.max_heap_mb:
+            return f'JS heap {heap_mb:.0f}MB'
+        return None
+
+    def release(self, pooled, discard=False, searches=1):
+        """드라이버 반환. 오류가 났거나 재시작 조건에 해당하면 종료
+
+        searches: 이번에 빌려서 한 검색 수 (탭 모드는 앨범마다 직접 세므로 0)
+        """
+        account_pool.release(pooled.account)
+        pooled.searches += searches
+        reason = 'error during search' if discard else self.recycle_reason(pooled)
+
+        if reason:
+            log.info(f"[Driver Pool] Recycling browser ({reason})")
+            self._quit(pooled)
+            self._free_slot()
+            return
+
+        # NetworkCapture를 거치지 않은 페이지(Smart Link 등)의 이벤트가 다음 검색까지 쌓이지 않도록
+        if NETWORK_LOG:
+            drain_performance_log(pooled.driver)
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def close_all(self):
+        """대기 중인 드라이버 모두 종료"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for pooled in idle:
+            self._quit(pooled)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'in_use': self._total - len(self._idle),
+                'idle': len(self._idle),
+                'created': self.created,
+                'recycled': self.recycled
+            }
+
+driver_pool = DriverPool(DRIVER_POOL_SIZE, DRIVER_MAX_SEARCHES, DRIVER_MAX_HEAP_MB)
+atexit.register(driver_pool.close_all)
+
+def record_acquire(budget, pooled, started):
+    """드라이버를 받기까지 걸린 시간 기록 (그 사이 새로 로그인했으면 로그인 시간은 login으로 분리)"""
+    login = 0
+    if pooled:
+        login, pooled.login_seconds = pooled.login_seconds, 0
+    if login:
+        budget.add('login', login)
+    budget.add('driver_acquire', time.time() - started - login)
+
+def open_catalog(driver, budget=None):
+    """Catalog 페이지로 이동. 세션이 만료되었으면 다시 로그인"""
+    budget = budget or SearchBudget()
+    for attempt in range(2):
+        # 타임스탬프 추가로 캐시 방지
+        cache_buster = int(time.time() * 1000) + random.randint(0, 9999)
+        started = time.time()
+        resource_blocker.prepare(driver, CATALOG_URL)
+        driver.get(CATALOG_URL.format(cache_buster))
+        budget.wait_until(driver, 'catalog_load', js_condition(CATALOG_READY_JS), CATALOG_READY_TIMEOUT)
+        budget.record('catalog_load', started)
+        if not is_login_page(driver):
+            return True
+        if attempt == 0:
+            log.warning("[Companion API] Session expired, logging in again...")
+            started = time.time()
+            logged_in = login_to_companion(driver)
+            budget.record('login', started)
+            if not logged_in:
+                return False
+    return False
+
+# ============================================================
+# KR 플랫폼 검색 (HTTP)
+# ============================================================
+
+KR_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8'
+}
+
+def parse_melon(text):
+    match = re.search(r"goAlbumDetail\(['\"](\d+)['\"]\)", text) or re.search(r'albumId=(\d+)', text)
+    return match.group(1) if match else None
+
+def parse_bugs(text):
+    match = re.search(r'/album/(\d+)', text)
+    return match.group(1) if match else None
+
+def parse_genie(text):
+    match = re.search(r"fnViewAlbumLayer\(['\"]?(\d+)['\"]?\)", text)
+    return match.group(1) if match else None
+
+def parse_vibe(text):
+    result = json.loads(text).get('response', {}).get('result', {})
+    albums = (result.get('albumResult') or {}).get('albums') or []
+    if albums:
+        return str(albums[0].get('albumId') or '') or None
+    tracks = (result.get('trackResult') or {}).get('tracks') or []
+    if tracks:
+        return str((tracks[0].get('album') or {}).get('albumId') or '') or None
+    return None
+
+def parse_flo(text):
+    sections = (json.loads(text).get('data') or {}).get('list') or []
+    for section in sections:
+        if section.get('type') == 'ALBUM' and section.get('list'):
+            return str(section['list'][0].get('id') or '') or None
+    return None
+
+# 플랫폼별 검색 URL, 앨범 ID 추출 함수, 앨범 URL 형식, 추가 헤더
+KR_PLATFORMS = {
+    'melon': {
+        'search_url': 'https://www.melon.com/search/album/index.htm?q={query}&section=&searchGnbYn=Y&kkoSpl=Y&kkoDpType=',
+        'parse': parse_melon,
+        'album_url': 'https://www.melon.com/album/detail.htm?albumId={id}',
+        'headers': {'Referer': 'https://www.melon.com/'}
+    },
+    'bugs': {
+        'search_url': 'https://music.bugs.co.kr/search/integrated?q={query}',
+        'parse': parse_bugs,
+        'album_url': 'https://music.bugs.co.kr/album/{id}',
+        'headers': {'Referer': 'https://music.bugs.co.kr/'}
+    },
+    'vibe': {
+        'search_url': 'https://apis.naver.com/vibeWeb/musicapiweb/v4/searchall?query={query}&sort=RELEVANCE&alDisplay=21',
+        'parse': parse_vibe,
+        'album_url': 'https://vibe.naver.com/album/{id}',
+        'headers': {'Accept': 'application/json', 'Referer': 'https://vibe.naver.com/', 'Origin': 'https://vibe.naver.com'}
+    },
+    'flo': {
+        'search_url': 'https://www.music-flo.com/api/search/v2/search?keyword={query}&searchType=ALBUM&sortType=ACCURACY&size=20&page=1',
+        'parse': parse_flo,
+        'album_url': 'https://www.music-flo.com/detail/album/{id}',
+        'headers': {'Accept': 'application/json', 'Referer': 'https://www.music-flo.com/'}
+    },
+    'genie': {
+        'search_url': 'https://www.genie.co.kr/search/searchAlbum?query={query}',
+        'parse': parse_genie,
+        'album_url': 'https://www.genie.co.kr/detail/albumInfo?axnm={id}',
+        'headers': {'Referer': 'https://www.genie.co.kr/'}
+    }
+}
+
+def bugs_cover_url(album_id):
+    """벅스 앨범 ID로 500px 커버 이미지 URL 생성 (앨범 페이지를 따로 열지 않음)"""
+    if not album_id or len(album_id) < 6:
+        return None
+    return f"https://image.bugsm.co.kr/album/images/500/{album_id[:6]}/{album_id}.jpg"
+
+class KrSearchClient:
+    """KR 플랫폼 검색을 HTTP로 동시에 실행 (플랫폼마다 연결을 재사용하는 Session 하나)"""
+
+    def __init__(self, pool_size):
+        self.sessions = {}
+        for platform_id, platform in KR_PLATFORMS.items():
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(KR_HEADERS)
+            session.headers.update(platform['headers'])
+            self.sessions[platform_id] = session
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='kr-search')
+
+    def search_platform(self, platform_id, query, timeout, request_id=None):
+        """플랫폼 하나 검색. 앨범 ID (없으면 None)"""
+        log_context.request_id = request_id
+        platform = KR_PLATFORMS[platform_id]
+        response = self.sessions[platform_id].get(platform['search_url'].format(query=quote(query)), timeout=timeout)
+        if response.status_code != 200:
+            log.warning(f"[KR Search] ✗ {platform_id}: HTTP {response.status_code}")
+            return None
+        return platform['parse'](response.text)
+
+    def start(self, artist, album):
+        """5개 플랫폼 검색을 백그라운드에서 시작 (collect로 결과 수집)"""
+        query = f"{artist} {album}"
+        log.debug(f"[KR Search] Starting KR platform search: {query}")
+        return {
+            'started': time.time(),
+            'futures': {
+                self.executor.submit(self.search_platform, platform_id, query, KR_SEARCH_TIMEOUT,
+                                     getattr(log_context, 'request_id', None)): platform_id
+                for platform_id in KR_PLATFORMS
+            }
+        }
+
+    def cancel(self, pending):
+        """아직 시작하지 않은 플랫폼 검색 취소 (글로벌 검색이 실패한 경우)"""
+        for future in pending['futures']:
+            future.cancel()
+
+    def collect(self, pending, budget=None):
+        """start로 시작한 검색 결과 수집. ({platform: album_url}, 벅스 앨범 커버 URL) 반환"""
+        futures = pending['futures']
+        timeout = max(KR_SEARCH_TIMEOUT - (time.time() - pending['started']), 0)
+        started = time.time()
+
+        results = {}
+        album_ids = {}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                platform_id = futures[future]
+                if budget:
+                    budget.record(f'kr_{platform_id}', pending['started'])
+                try:
+                    album_id = future.result()
+                except Exception as e:
+                    log.warning(f"[KR Search] ✗ {platform_id} error: {str(e)}")
+                    continue
+                if album_id:
+                    album_ids[platform_id] = album_id
+                    results[platform_id] = KR_PLATFORMS[platform_id]['album_url'].format(id=album_id)
+                    log.debug(f"[KR Search] ✓ {platform_id}: {results[platform_id]}")
+                else:
+                    log.debug(f"[KR Search] ✗ {platform_id}: Not found")
+        except FuturesTimeoutError:
+            pending_ids = [futures[future] for future in futures if not future.done()]
+            log.warning(f"[KR Search] Timed out after {timeout:.1f}s: {', '.join(pending_ids)}")
+            if budget:
+                for platform_id in pending_ids:
+                    budget.record(f'kr_{platform_id}', pending['started'])
+
+        if budget:
+            budget.waits['kr_search'] = round(time.time() - started, 3)
+        log.info(f"[KR Search] Completed: {len(results)} platforms found")
+        results = {platform_id: results[platform_id] for platform_id in KR_PLATFORMS if platform_id in results}
+        return results, bugs_cover_url(album_ids.get('bugs'))
+
+    def search(self, artist, album, budget=None):
+        """5개 플랫폼 동시 검색 (시작 후 바로 수집)"""
+        return self.collect(self.start(artist, album), budget)
+
+kr_search = KrSearchClient(KR_HTTP_POOL_SIZE)
+
+def normalize_text(text):
+    """텍스트 정규화 (공백, 특수문자 제거, 소문자 변환)"""
+    if not text:
+        return ""
+    return re.sub(r'[\s\-_,.()\[\]{}]+', '', text.lower())
+
+# 검색 결과 테이블 전체를 한 번의 execute_script로 읽는 스크립트
+# (행/셀마다 find_element를 호출하면 WebDriver 왕복이 수백 번 발생)
+READ_CATALOG_ROWS_JS = """
+return Array.from(document.querySelectorAll('table tbody tr')).map(function (tr, i) {
+    var tds = tr.querySelectorAll('td');
+    var albumCell = tds.length > 2 ? tds[2] : null;
+    var albumP = albumCell ? albumCell.querySelector('p') : null;
+    var artistSpan = albumCell ? albumCell.querySelector('.catalog_album_title span') : null;
+    var smartLink = tr.querySelector('a[href*="/catalog/platform/"]');
+    return {
+        index: i,
+        cell_count: tds.length,
+        upc: tds.length > 3 ? tds[3].innerText.trim() : '',
+        album: albumP ? albumP.innerText.trim() : '',
+        artist: artistSpan ? artistSpan.innerText.trim() : '',
+        smart_link: smartLink ? smartLink.href : null
+    };
+});
+"""
+
+# Smart Link 페이지의 앨범 커버와 #platList 항목을 한 번에 읽는 스크립트
+READ_SMART_LINK_PAGE_JS = """
+var cover = document.querySelector('img.album-cover, img.cover-image, .album-art img, img[alt*="album"], img[alt*="cover"]');
+return {
+    album_cover_url: cover ? cover.src : null,
+    onclicks: Array.from(document.querySelectorAll('#platList li')).map(function (li) {
+        var link = li.querySelector('a');
+        return link ? link.getAttribute('onclick') : null;
+    })
+};
+"""
+
+def read_catalog_rows(driver):
+    """검색 결과 테이블을 JSON(행 dict 리스트)으로 읽기"""
+    try:
+        return driver.execute_script(READ_CATALOG_ROWS_JS) or []
+    except Exception as e:
+        log.warning(f"[Companion API] Failed to read result rows: {str(e)}")
+        return []
+
+def match_catalog_row(rows, artist, album, upc='', fuzzy=True):
+    """검색 결과 행 중 CDMA 정확 매칭 → 아티스트+앨범명 매칭 순으로 찾기
+
+    fuzzy=False면 CDMA 정확 매칭만 (CDMA 검색이 끝나기 전에 다른 앨범이 먼저 잡히지 않도록)
+    """
+    # 1차: CDMA/UPC 코드로 검색한 경우 정확히 매칭되는 것 찾기
+    if upc:
+        log.debug(f"[Companion API] Searching for exact CDMA match: {upc}")
+        for row in rows:
+            if row['cell_count'] <= 3:
+                continue
+            # UPC/Catalog No 컬럼 (index 3)
+            upc_text = row['upc']
+
+            log.debug("[Companion API] Checking UPC: %s", upc_text)
+
+            # 정확한 CDMA 매칭: 전체가 일치하거나 "/ CDMA코드" 형태
+            if upc == upc_text or upc_text.endswith(f" / {upc}") or upc_text.endswith(f"/ {upc}"):
+                log.info(f"[Companion API] Exact match found: {upc_text}")
+                return row
+
+    # 2차: 앨범명으로 검색하거나 CDMA 매칭 실패시 앨범명+아티스트명으로 매칭
+    if album and fuzzy:
+        normalized_artist = normalize_text(artist)
+        normalized_album = normalize_text(album)
+        for row in rows:
+            if row['cell_count'] <= 2:
+                continue
+            normalized_row_artist = normalize_text(row['artist'])
+            normalized_row_album = normalize_text(row['album'])
+
+            log.debug("[Companion API] Checking: %s / %s", row['album'], row['artist'])
+
+            # 아티스트와 앨범명 모두 매칭
+            artist_match = (normalized_artist and normalized_row_artist and
+                           (normalized_artist in normalized_row_artist or normalized_row_artist in normalized_artist))
+            album_match = (normalized_album and normalized_row_album and
+                          (normalized_album in normalized_row_album or normalized_row_album in normalized_album))
+
+            if artist_match and album_match:
+                log.info(f"[Companion API] Matched! Artist: {row['artist']}, Album: {row['album']}")
+                return row
+
+    return None
+
+def match_album_title(rows, album):
+    """아티스트명 검색 결과에서 앨범명만으로 매칭"""
+    normalized_album = normalize_text(album)
+    if not normalized_album:
+        return None
+
+    for row in rows:
+        if row['cell_count'] <= 2:
+            continue
+        normalized_row_album = normalize_text(row['album'])
+
+        log.debug("[Companion API] Checking: %s vs %s", row['album'], album)
+
+        if not normalized_row_album:
+            continue
+
+        if normalized_album in normalized_row_album or normalized_row_album in normalized_album:
+            log.info(f"[Companion API] Matched album: {row['album']}")
+            return row
+
+    return None
+
+class NetworkCapture:
+    """Chrome performance 로그(CDP Network 이벤트)에서 catalog.search() 응답 본문을 읽는다
+
+    생성 시점까지 쌓인 로그는 비우고, 이후 발생한 XHR/Fetch 요청만 추적한다.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.requests = {}  # requestId -> {'url', 'post_data', 'finished'}
+        self.available = self._drain() is not None
+
+    def _drain(self):
+        try:
+            return self.driver.get_log('performance')
+        except Exception:
+            return None
+
+    def _collect(self):
+        for entry in self._drain() or []:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent' and params.get('type') in ('XHR', 'Fetch'):
+                request_info = params.get('request', {})
+                self.requests[params['requestId']] = {
+                    'url': request_info.get('url', ''),
+                    'post_data': request_info.get('postData') or '',
+                    'finished': False
+                }
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self.requests:
+                self.requests[params['requestId']]['finished'] = True
+
+    def finished_request(self, query):
+        """검색어가 들어간 요청 중 응답 수신이 끝난 가장 최근 요청의 id (없으면 None)"""
+        if not self.available:
+            return None
+        self._collect()
+        tokens = {query, quote(query), quote_plus(query), json.dumps(query)[1:-1]}
+        matches = [request_id for request_id, info in self.requests.items()
+                   if any(token in info['url'] or token in info['post_data'] for token in tokens)]
+        if matches and self.requests[matches[-1]]['finished']:
+            return matches[-1]
+        return None
+
+    def read_rows(self, request_id):
+        """응답 본문을 카탈로그 행 dict 리스트로 변환 (실패 시 빈 리스트)"""
+        try:
+            body = self.driver.execute('executeCdpCommand', {
+                'cmd': 'Network.getResponseBody',
+                'params': {'requestId': request_id}
+            })['value']
+        except Exception as e:
+            log.warning(f"[Companion API] Failed to read response body: {str(e)}")
+            return []
+        text = body.get('body') or ''
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8', 'replace')
+        return parse_catalog_payload(text)
+
+def results_ready(driver, capture, query):
+    """검색 결과 도착 여부. ('network', requestId) / ('dom', None) / None"""
+    if capture:
+        request_id = capture.finished_request(query)
+        if request_id:
+            return ('network', request_id)
+    if driver.execute_script(RESULTS_RENDERED_JS):
+        return ('dom', None)
+    return None
+
+def read_results(driver, budget, step, outcome, capture):
+    """results_ready 결과에 따라 행 읽기. 네트워크 본문을 해석하지 못하면 렌더링된 테이블에서 읽는다
+
+    반환: (rows, source) — source는 'network' 또는 'dom'
+    """
+    if outcome and outcome[0] == 'network':
+        rows = capture.read_rows(outcome[1])
+        if rows:
+            return rows, 'network'
+        budget.wait_until(driver, f'{step}_render', js_condition(RESULTS_RENDERED_JS), SEARCH_RESULTS_TIMEOUT)
+
+    return read_catalog_rows(driver), 'dom'
+
+def wait_for_results(driver, budget, step, query, capture):
+    """검색 결과 대기. 네트워크 응답이 먼저 도착하면 렌더링을 기다리지 않고 본문에서 행을 읽는다
+
+    반환: (rows, source) — source는 'network' 또는 'dom'
+    """
+    outcome = budget.wait_until(driver, step, lambda driver: results_ready(driver, capture, query),
+                                SEARCH_RESULTS_TIMEOUT)
+    if not outcome:
+        log.warning("[Companion API] Timeout waiting for search results")
+    return read_results(driver, budget, step, outcome, capture)
+
+def match_results(driver, budget, step, rows, source, matcher):
+    """matcher(rows)로 매칭되는 행을 찾는다
+
+    네트워크 응답만으로 Smart Link가 있는 행을 찾지 못하면 렌더링된 테이블로 다시 확인한다.
+    반환: (rows, target_row)
+    """
+    log.info(f"[Companion API] Found {len(rows)} album rows (from {source})")
+    started = time.time()
+    target_row = matcher(rows)
+    budget.record('row_match', started)
+
+    if source == 'network' and not (target_row and target_row.get('smart_link')):
+        budget.wait_until(driver, f'{step}_render', js_condition(RESULTS_RENDERED_JS), SEARCH_RESULTS_TIMEOUT)
+        rows = read_catalog_rows(driver)
+        log.debug(f"[Companion API] Re-checked {len(rows)} rendered rows")
+        started = time.time()
+        target_row = matcher(rows)
+        budget.record('row_match', started)
+
+    # 검색하면서 본 행은 로컬 카탈로그 인덱스에도 저장
+    if catalog_index and rows:
+        catalog_index.upsert_rows(rows)
+
+    return rows, target_row
+
+def run_catalog_search(driver, budget, step, query, matcher):
+    """현재 탭에서 query로 검색하고 matcher(rows)로 매칭되는 행을 찾는다. 반환: (rows, target_row)"""
+    capture = NetworkCapture(driver) if CATALOG_CAPTURE == 'network' else None
+    launch_catalog_search(driver, query)
+    rows, source = wait_for_results(driver, budget, step, query, capture)
+    return match_results(driver, budget, step, rows, source, matcher)
+
+# 검색어 입력 + 결과 테이블 변경 감시 시작 + catalog.search() 실행
+LAUNCH_SEARCH_JS = WATCH_RESULTS_JS + """
+var searchInput = document.getElementById('search_text');
+searchInput.value = arguments[0];
+// input 이벤트 트리거 (JavaScript가 input 변화를 감지하도록)
+searchInput.dispatchEvent(new Event('input', { bubbles: true }));
+catalog.search();
+"""
+
+# 검색을 바로 실행할 수 있는 Catalog 페이지인지 (로그인 폼 제외)
+CATALOG_IDLE_JS = """
+var input = document.getElementById('search_text');
+return !document.getElementById('username') && !!input && !input.disabled
+       && typeof catalog !== 'undefined' && typeof catalog.search === 'function';
+"""
+
+def launch_catalog_search(driver, query):
+    """현재 탭에서 검색 실행 (결과는 기다리지 않음)"""
+    log.debug(f"[Companion API] Executing catalog.search() for: {query}")
+    driver.execute_script(LAUNCH_SEARCH_JS, query)
+
+def search_strategies(artist, album, upc):
+    """(이름, 검색어, 매칭 함수, 나중 매칭 함수) 목록. 앞의 두 가지는 동시에 실행한다
+
+    - CDMA가 있으면: CDMA 검색 + 앨범명 검색
+    - 없으면: 앨범명 검색 + 아티스트명 검색 (앨범명으로만 매칭)
+
+    나중 매칭 함수는 앞선 검색이 모두 매칭 없이 끝난 뒤에만 같은 결과 행에 적용한다.
+    """
+    strategies = []
+    if upc:
+        strategies.append(('cdma', upc, lambda rows: match_catalog_row(rows, artist, album, upc), None))
+    if album and upc:
+        # CDMA가 있으면 앨범명 검색 결과에서는 CDMA 정확 매칭만 바로 받고,
+        # 앨범명+아티스트명 매칭은 CDMA 검색이 매칭 없이 끝난 뒤에만 쓴다
+        strategies.append((
+            'album', album,
+            lambda rows: match_catalog_row(rows, artist, album, upc, fuzzy=False),
+            lambda rows: match_catalog_row(rows, artist, album)
+        ))
+    elif album:
+        strategies.append(('album', album, lambda rows: match_catalog_row(rows, artist, album), None))
+    if artist and not upc:
+        strategies.append(('artist', artist, lambda rows: match_album_title(rows, album), None))
+    return strategies
+
+def match_fallback(budget, rows, fallback):
+    """나중 매칭 함수를 이미 읽은 결과 행에 적용"""
+    if not (fallback and rows):
+        return None
+    started = time.time()
+    target_row = fallback(rows)
+    budget.record('row_match', started)
+    return target_row
+
+def open_spare_catalog_tab(driver, budget):
+    """같은 세션에서 현재 탭이 아닌 Catalog 탭으로 전환 (없으면 새 탭에서 Catalog 열기)"""
+    current = driver.current_window_handle
+    handles = driver.window_handles
+    tabs = [handle for handle in catalog_tabs.get(driver, []) if handle in handles]
+    if current not in tabs:
+        tabs.append(current)
+    catalog_tabs[driver] = tabs
+
+    spare = next((handle for handle in tabs if handle != current), None)
+    if spare:
+        driver.switch_to.window(spare)
+        if driver.execute_script(CATALOG_IDLE_JS):
+            return spare
+    else:
+        spare = new_tab(driver)
+        tabs.append(spare)
+
+    if not open_catalog(driver, budget):
+        return None
+    budget.wait_until(driver, 'spare_catalog', js_condition(CATALOG_IDLE_JS), CATALOG_READY_TIMEOUT)
+    return spare
+
+def run_parallel_searches(driver, budget, strategies):
+    """두 검색을 같은 세션의 두 Catalog 탭에서 동시에 실행하고, 먼저 매칭되는 행을 반환
+
+    매칭된 행이 있는 탭으로 전환된 상태로 돌아온다 (행 클릭이 그 탭에서 일어나야 하므로).
+    """
+    capture = NetworkCapture(driver) if CATALOG_CAPTURE == 'network' else None
+    main_tab = driver.current_window_handle
+    (first_name, first_query, first_matcher, first_fallback), \
+        (second_name, second_query, second_matcher, second_fallback) = strategies
+
+    launch_catalog_search(driver, first_query)
+    lanes = [{'tab': main_tab, 'name': first_name, 'query': first_query,
+              'matcher': first_matcher, 'fallback': first_fallback}]
+    # 매칭 없이 끝난 검색 (나중 매칭 함수가 있으면 모든 검색이 끝난 뒤 다시 확인)
+    finished = []
+
+    spare_tab = open_spare_catalog_tab(driver, budget)
+    if spare_tab:
+        launch_catalog_search(driver, second_query)
+        lanes.append({'tab': spare_tab, 'name': second_name, 'query': second_query,
+                      'matcher': second_matcher, 'fallback': second_fallback})
+    else:
+        log.warning(f"[Companion API] Spare catalog tab unavailable, running {second_name} search afterwards")
+        driver.switch_to.window(main_tab)
+
+    def first_ready(driver):
+        for lane in lanes:
+            driver.switch_to.window(lane['tab'])
+            outcome = results_ready(driver, capture, lane['query'])
+            if outcome:
+                return lane, outcome
+        return None
+
+    while lanes:
+        ready = budget.wait_until(driver, 'parallel_results', first_ready, SEARCH_RESULTS_TIMEOUT)
+        if not ready:
+            log.warning(f"[Companion API] Timeout waiting for search results ({', '.join(lane['name'] for lane in lanes)})")
+            break
+
+        lane, outcome = ready
+        lanes.remove(lane)
+        driver.switch_to.window(lane['tab'])
+        step = f"{lane['name']}_results"
+        rows, source = read_results(driver, budget, step, outcome, capture)
+        rows, target_row = match_results(driver, budget, step, rows, source, lane['matcher'])
+        if target_row:
+            log.info(f"[Companion API] Matched by {lane['name']} search")
+            return target_row
+        finished.append((lane, rows))
+
+    if not spare_tab:
+        driver.switch_to.window(main_tab)
+        rows, target_row = run_catalog_search(driver, budget, f'{second_name}_results', second_query, second_matcher)
+        if target_row:
+            return target_row
+        finished.append(({'tab': main_tab, 'name': second_name, 'fallback': second_fallback}, rows))
+
+    for lane, rows in finished:
+        target_row = match_fallback(budget, rows, lane['fallback'])
+        if target_row:
+            log.info(f"[Companion API] Matched by {lane['name']} search (after all searches)")
+            driver.switch_to.window(lane['tab'])
+            return target_row
+
+    driver.switch_to.window(main_tab)
+    return None
+
+def find_album_row(driver, artist, album, upc='', budget=None):
+    """로딩된 Catalog 페이지에서 앨범을 검색하고 매칭되는 행(dict) 반환 (없으면 None)
+
+    CDMA 검색과 앨범명 검색(CDMA가 없으면 앨범명과 아티스트명 검색)을 두 탭에서 동시에 실행한다.
+    """
+    budget = budget or SearchBudget()
+    started = time.time()
+    row_match_before = budget.timings.get('row_match', 0)
+
+    # 검색창이 입력 가능한 상태가 될 때까지 대기
+    search_input = budget.wait_until(
+        driver, 'search_input', EC.element_to_be_clickable((By.ID, 'search_text')), CATALOG_READY_TIMEOUT
+    )
+    if not search_input:
+        raise TimeoutException('Search input (#search_text) not available')
+    log.debug("[Companion API] Found search input")
+
+    strategies = search_strategies(artist, album, upc)
+    target_row = None
+
+    if SPECULATIVE_SEARCH and len(strategies) >= 2:
+        target_row = run_parallel_searches(driver, budget, strategies[:2])
+        strategies = strategies[2:]
+
+    # 순서대로 실행하므로 앞선 검색은 이미 매칭 없이 끝났다 → 나중 매칭 함수도 바로 적용
+    for name, query, matcher, fallback in strategies:
+        if target_row:
+            break
+        log.debug(f"[Companion API] Searching by: {query} ({name})")
+        rows, target_row = run_catalog_search(driver, budget, f'{name}_results', query, matcher)
+        target_row = target_row or match_fallback(budget, rows, fallback)
+
+    if not target_row:
+        log.info("[Companion API] No matching album found")
+
+    # 행 매칭 시간은 row_match로 따로 기록되므로 search에서는 뺀다
+    budget.add('search', time.time() - started - (budget.timings.get('row_match', 0) - row_match_before))
+
+    debug_capture.snapshot(driver, budget, 'search_results', failed=not target_row)
+    return target_row
+
+def get_smart_link_url(target_row):
+    """검색 결과 행의 Smart Link (/catalog/platform/) URL (없으면 None)"""
+    smart_link_url = target_row.get('smart_link')
+    if smart_link_url:
+        log.debug(f"[Companion API] Found platform link: {smart_link_url}")
+
+    # 상대 경로를 절대 경로로 변환
+    if smart_link_url and smart_link_url.startswith('/'):
+        smart_link_url = f"http://companion.global{smart_link_url}"
+
+    return smart_link_url
+
+def open_smart_link(driver, target_row, smart_link_url, budget=None):
+    """Smart Link 페이지로 이동 (링크가 없으면 행 클릭)"""
+    budget = budget or SearchBudget()
+    started = time.time()
+    if not smart_link_url:
+        log.info("[Companion API] Smart Link not found, trying to click row...")
+        # Smart Link를 못 찾으면 행 자체를 클릭
+        driver.execute_script(
+            "document.querySelectorAll('table tbody tr')[arguments[0]].click();",
+            target_row['index']
+        )
+        budget.wait_until(driver, 'smart_link_load', element_present('#platList'), SMART_LINK_TIMEOUT)
+    else:
+        log.debug(f"[Companion API] Found Smart Link: {smart_link_url}")
+        # Smart Link 페이지로 이동
+        log.debug(f"[Companion API] Navigating to: {smart_link_url}")
+        resource_blocker.prepare(driver, smart_link_url)
+        driver.get(smart_link_url)
+        budget.wait_until(driver, 'smart_link_load', js_condition(SMART_LINK_READY_JS), SMART_LINK_TIMEOUT)
+    budget.record('smart_link_load', started)
+    debug_capture.snapshot(driver, budget, 'smart_link_page')
+
+# 플랫폼 코드 → 이름 매핑
+PLATFORM_NAMES = {
+    'spo': 'Spotify',
+    'itm': 'Apple Music',
+    'yat': 'YouTube Music',
+    'ama': 'Amazon Music',
+    'dee': 'Deezer',
+    'asp': 'Tidal',
+    'pdx': 'Pandora',
+    'soc': 'SoundCloud',
+    'awm': 'AWA',
+    'kkb': 'KKBOX',
+    'ang': 'Anghami',
+    'lmj': 'LINE MUSIC',
+    'mov': 'MOOV',
+    'tct': 'QQ Music'
+}
+
+def parse_platform_onclicks(onclicks):
+    """#platList 항목의 onclick 속성 리스트에서 플랫폼 링크 추출"""
+    platforms = []
+
+    # 중복 제거를 위한 set
+    seen_urls = set()
+
+    for onclick_attr in onclicks:
+        if not onclick_attr:
+            continue
+
+        # onclick="javascript:click_platform("http://music.apple.com/...", "itm", "...")"
+        # 정규식으로 URL과 platform code 추출
+        match = re.search(r'click_platform\(["\']([^"\']+)["\'],\s*["\']([^"\']+)["\']', onclick_attr)
+        if not match:
+            continue
+
+        url = match.group(1).replace('\\/', '/')  # 이스케이프된 슬래시 복원
+        platform_code = match.group(2)
+
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+
+        # 플랫폼 이름 매핑
+        platform_name = PLATFORM_NAMES.get(platform_code, platform_code.upper())
+
+        platforms.append({
+            'platform': platform_name,
+            'code': platform_code,
+            'url': url,
+            'upc': None  # UPC는 페이지에서 추출 가능하면 추가
+        })
+        log.debug("[Companion API] Added platform: %s (%s) - %s", platform_name, platform_code, url)
+
+    return platforms
+
+def extract_platforms(driver, budget=None):
+    """Smart Link 페이지에서 앨범 커버와 플랫폼 링크 추출 (WebDriver 왕복 1회)"""
+    started = time.time()
+    try:
+        page = driver.execute_script(READ_SMART_LINK_PAGE_JS) or {}
+    except Exception as e:
+        log.warning(f"[Companion API] Failed to read smart link page: {str(e)}")
+        page = {}
+
+    # 앨범 커버
+    album_cover_url = page.get('album_cover_url')
+    if album_cover_url:
+        log.debug(f"[Companion API] Found album cover: {album_cover_url}")
+    else:
+        log.debug("[Companion API] Album cover not found")
+
+    # 플랫폼 링크 - onclick 속성에서 파싱
+    onclicks = page.get('onclicks') or []
+    log.debug(f"[Companion API] Found {len(onclicks)} platform items in #platList")
+
+    platforms = parse_platform_onclicks(onclicks)
+
+    log.info(f"[Companion API] Total platforms extracted: {len(platforms)}")
+
+    if budget:
+        budget.record('platform_parse', started)
+    return album_cover_url, platforms
+
+def global_album_result(artist, album, album_cover_url, platforms, smart_link_url=None):
+    """Smart Link 페이지 결과를 /search 응답 형식으로 변환 (KR 플랫폼 제외)"""
+    return {
+        'success': True,
+        'data': {
+            'album_cover_url': album_cover_url,
+            'platform_count': len(platforms),
+            'platforms': platforms,
+            'smart_link_url': smart_link_url
+        },
+        'request': {
+            'artist': artist,
+            'album': album
+        }
+    }
+
+def kr_album_result(artist, album, kr_platforms, kr_cover):
+    """KR 플랫폼 검색 결과를 /search/kr 응답 형식으로 변환"""
+    return {
+        'success': True,
+        'data': {
+            'album_cover_url': kr_cover,
+            'kr_platforms': kr_platforms
+        },
+        'request': {
+            'artist': artist,
+            'album': album
+        }
+    }
+
+def finish_album_result(result, kr_pending, budget=None):
+    """글로벌 결과에 백그라운드 KR 검색 결과를 합침 (글로벌 검색이 실패했으면 KR 검색 취소)"""
+    if not result.get('success'):
+        kr_search.cancel(kr_pending)
+        return result
+
+    try:
+        kr_platforms, kr_cover = kr_search.collect(kr_pending, budget)
+    except Exception as e:
+        log.warning(f"[Companion API] KR search error: {str(e)}")
+        kr_platforms, kr_cover = {}, None
+
+    result['data']['kr_platforms'] = kr_platforms
+    # 벅스에서 앨범 커버를 찾았으면 우선 사용
+    if kr_cover:
+        result['data']['album_cover_url'] = kr_cover
+    return result
+
+def not_found_result(artist, album):
+    error_msg = f'Album "{album}" by "{artist}" not found in search results'
+    log.info(f"[Companion API] {error_msg}")
+    return {
+        'success': False,
+        'error': error_msg,
+        'data': None,
+        'not_found': True
+    }
+
+class Metrics:
+    """Prometheus 텍스트 형식 지표 (단계별 소요 시간 히스토그램, 검색 결과 카운터)"""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120)
+    LOG_LINE_BUCKETS = (10, 25, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (이름, 라벨) -> {'bounds', 'buckets': [...], 'sum', 'count'}
+        self.outcomes = {}  # (kind, outcome) -> 건수
+
+    def observe(self, name, label, value, bounds=BUCKETS):
+        with self._lock:
+            histogram = self.histograms.setdefault((name, label), {
+                'bounds': bounds, 'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0
+            })
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def observe_result(self, kind, result):
+        """검색 한 건의 결과(success/not_found/error)와 단계별 소요 시간 반영"""
+        if result.get('success'):
+            outcome = 'success'
+        elif result.get('not_found'):
+            outcome = 'not_found'
+        else:
+            outcome = 'error'
+        with self._lock:
+            self.outcomes[(kind, outcome)] = self.outcomes.get((kind, outcome), 0) + 1
+
+        timings = dict(result.get('timings') or {})
+        total = timings.pop('total', None)
+        for phase, seconds in timings.items():
+            self.observe('companion_phase_seconds', ('phase', phase), seconds)
+        if total is not None:
+            self.observe('companion_search_seconds', ('kind', kind), total)
+
+    def render(self):
+        """/metrics 응답 본문"""
+        lines = []
+        with self._lock:
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.histograms.items()}
+            outcomes = dict(self.outcomes)
+
+        helps = {
+            'companion_phase_seconds': 'Time spent per search phase',
+            'companion_search_seconds': 'Total time per search',
+            'companion_log_lines_per_search': 'Log records written per search'
+        }
+        for name, help_text in helps.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (hist_name, (label, value)), histogram in sorted(histograms.items()):
+                if hist_name != name:
+                    continue
+                for bound, count in zip(histogram['bounds'], histogram['buckets']):
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {round(histogram["sum"], 3)}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {histogram["count"]}')
+
+        lines.append('# HELP companion_searches_total Searches by kind and outcome')
+        lines.append('# TYPE companion_searches_total counter')
+        for (kind, outcome), count in sorted(outcomes.items()):
+            lines.append(f'companion_searches_total{{kind="{kind}",outcome="{outcome}"}} {count}')
+
+        def gauge(name, help_text, value, kind='gauge'):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        pool = driver_pool.stats()
+        gauge('companion_driver_pool_size', 'WebDriver pool size', pool['size'])
+        gauge('companion_driver_pool_in_use', 'WebDrivers lent out', pool['in_use'])
+        gauge('companion_driver_pool_idle', 'Logged-in WebDrivers waiting in the pool', pool['idle'])
+        gauge('companion_driver_pool_utilization', 'Share of the pool in use', round(pool['in_use'] / pool['size'], 3) if pool['size'] else 0)
+        gauge('companion_driver_pool_recycled_total', 'Browsers recycled', pool['recycled'], 'counter')
+
+        queue = admission.stats()
+        gauge('companion_admission_running', 'Browser searches running', queue['running'])
+        gauge('companion_admission_queued', 'Browser searches waiting for a slot', queue['queued'])
+        gauge('companion_admission_background_waiting', 'Job searches waiting for a slot', queue['background_waiting'])
+        gauge('companion_admission_rejected_total', 'Searches rejected with 429 (queue full)', queue['rejected'], 'counter')
+        gauge('companion_admission_queue_timeouts_total', 'Searches rejected with 429 (queue wait timeout)', queue['queue_timeouts'], 'counter')
+
+        if BROWSER_TABS > 1:
+            tabs = tab_scheduler.stats()['browsers']
+            gauge('companion_tabs_running', 'Albums being searched in browser tabs', sum(browser['running'] for browser in tabs))
+            gauge('companion_tabs_queued', 'Albums waiting for a browser tab', sum(browser['queued'] for browser in tabs))
+
+        lines.append('# HELP companion_log_records_total Log records written by level')
+        lines.append('# TYPE companion_log_records_total counter')
+        for level, count in sorted(log_stats()['records'].items()):
+            lines.append(f'companion_log_records_total{{level="{level}"}} {count}')
+        gauge('companion_log_dropped_total', 'Log records dropped because the log queue was full',
+              log_handler.dropped, 'counter')
+        gauge('companion_single_flight_coalesced_total', 'Requests that joined an in-flight search',
+              single_flight.stats()['coalesced'], 'counter')
+        if result_cache:
+            cache = result_cache.stats()
+            gauge('companion_result_cache_hits_total', 'Result cache hits', cache['hits'], 'counter')
+            gauge('companion_result_cache_misses_total', 'Result cache misses', cache['misses'], 'counter')
+
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def finish_timings(result, budget, kind):
+    """결과에 단계별 대기 시간(waits)과 소요 시간(timings)을 붙이고 /metrics에 반영"""
+    result['waits'] = budget.waits
+    result['timings'] = dict(budget.timings, total=round(time.time() - budget.started, 3))
+    result['request_id'] = budget.request_id
+    metrics.observe_result(kind, result)
+    metrics.observe('companion_log_lines_per_search', ('kind', kind), log_filter.pop_count(budget.request_id),
+                    Metrics.LOG_LINE_BUCKETS)
+
+def lookup_smart_link(artist, album, upc=''):
+    """이전에 찾은 Smart Link URL 조회 (앨범별 저장값 → 카탈로그 인덱스 순)"""
+    if not catalog_index:
+        return None
+    smart_link_url = catalog_index.lookup_album(artist, album, upc)
+    if smart_link_url:
+        log.info(f"[Companion API] Known Smart Link: {upc or f'{artist} - {album}'} → {smart_link_url}")
+    return smart_link_url
+
+def remember_smart_link(artist, album, upc, result):
+    """검색에 성공한 앨범의 Smart Link URL 저장"""
+    data = result.get('data') if result.get('success') else None
+    if catalog_index and data and data.get('smart_link_url') and data.get('platforms'):
+        catalog_index.remember_album(artist, album, upc, data['smart_link_url'])
+
+def search_global(artist, album, upc, smart_link_url, budget):
+    """글로벌 플랫폼(Smart Link 페이지)만 검색
+
+    smart_link_url(이전 응답의 data.smart_link_url)을 주거나 이미 찾은 적 있는 앨범이면
+    Catalog 검색 없이 Smart Link 페이지만 다시 읽는다.
+    """
+    result = None
+    smart_link_url = smart_link_url or lookup_smart_link(artist, album, upc)
+
+    # HTTP 전용 모드: 글로벌 검색은 requests로, 요청이 실패했을 때만 브라우저 경로로 대체
+    if COMPANION_HTTP_MODE:
+        found = companion_http.search_album(artist, album, upc, smart_link_url)
+        if found is HTTP_NOT_FOUND:
+            result = not_found_result(artist, album)
+            result['mode'] = 'http'
+        elif found:
+            album_cover_url, platforms, found_url = found
+            result = global_album_result(artist, album, album_cover_url, platforms, found_url)
+            result['mode'] = 'http'
+
+    if result is None:
+        if BROWSER_TABS > 1:
+            result = tab_scheduler.search(artist, album, upc, smart_link_url, budget)
+        else:
+            result = run_album_search(artist, album, upc, budget, smart_link_url)
+    remember_smart_link(artist, album, upc, result)
+    return result
+
+def search_album(artist, album, upc='', smart_link_url=None, include_kr=True):
+    """Companion.global에서 앨범 검색 (응답에 단계별 대기 시간 포함)
+
+    KR 플랫폼 검색은 글로벌 검색과 동시에 백그라운드에서 진행한다.
+    """
+    budget = SearchBudget()
+    kr_pending = kr_search.start(artist, album) if include_kr else None
+    result = search_global(artist, album, upc, smart_link_url, budget)
+    if kr_pending:
+        result = finish_album_result(result, kr_pending, budget)
+    finish_timings(result, budget, 'album' if include_kr else 'global')
+    log.info(f"[Wait] {artist} - {album}: {budget.waits}")
+    log.info(f"[Timings] {artist} - {album}: {budget.timings}")
+    return result
+
+def deadline_result(error):
+    log.warning(f"[Companion API] {error}")
+    return {
+        'success': False,
+        'error': str(error),
+        'data': None
+    }
+
+def current_smart_link_url(driver):
+    """행 클릭으로 이동한 경우 현재 주소가 Smart Link 페이지면 그 URL"""
+    current_url = driver.current_url
+    return current_url if '/catalog/platform/' in current_url else None
+
+def open_known_smart_link(driver, smart_link_url, budget):
+    """이미 알고 있는 Smart Link 페이지로 바로 이동해 플랫폼 추출 (세션 만료 시 재로그인)"""
+    open_smart_link(driver, None, smart_link_url, budget)
+    if is_login_page(driver):
+        log.warning("[Companion API] Session expired, logging in again...")
+        started = time.time()
+        logged_in = login_to_companion(driver)
+        budget.record('login', started)
+        if not logged_in:
+            return None, []
+        open_smart_link(driver, None, smart_link_url, budget)
+    return extract_platforms(driver, budget)
+
+def run_album_search(artist, album, upc, budget, smart_link_url=None):
+    """풀에서 드라이버를 빌려 앨범 한 건 검색 (budget 안에서)
+
+    smart_link_url이 주어지면 Catalog 검색 없이 Smart Link 페이지부터 연다.
+    """
+    pooled = None
+    discard = False
+
+    try:
+        # 풀에서 로그인된 드라이버 가져오기
+        started = time.time()
+        pooled = driver_pool.acquire()
+        record_acquire(budget, pooled, started)
+        if not pooled:
+            return {
+                'success': False,
+                'error': 'Login failed',
+                'data': None
+            }
+        driver = pooled.driver
+
+        if smart_link_url:
+            album_cover_url, platforms = open_known_smart_link(driver, smart_link_url, budget)
+            if platforms:
+                return global_album_result(artist, album, album_cover_url, platforms, smart_link_url)
+            # 링크가 더 이상 유효하지 않으면 Catalog 검색으로 진행
+            log.warning("[Companion API] Known Smart Link has no platforms, searching catalog instead")
+
+        # Catalog 페이지로 이동 (세션 만료 시 재로그인)
+        log.debug("[Companion API] Navigating to catalog page...")
+        if not open_catalog(driver, budget):
+            discard = True
+            return {
+                'success': False,
+                'error': 'Login failed',
+                'data': None
+            }
+        log.debug(f"[Companion API] Current URL: {driver.current_url}")
+        debug_capture.snapshot(driver, budget, 'catalog_page')
+
+        target_row = find_album_row(driver, artist, album, upc, budget)
+
+        # 결과 확인
+        if not target_row:
+            return not_found_result(artist, album)
+
+        # Smart Link 컬럼에서 링크 찾기 (/catalog/platform/ URL)
+        smart_link_url = get_smart_link_url(target_row)
+        open_smart_link(driver, target_row, smart_link_url, budget)
+        smart_link_url = smart_link_url or current_smart_link_url(driver)
+
+        album_cover_url, platforms = extract_platforms(driver, budget)
+        if not platforms:
+            debug_capture.snapshot(driver, budget, 'no_platforms', failed=True)
+
+        return global_album_result(artist, album, album_cover_url, platforms, smart_link_url)
+
+    except DeadlineExceeded as e:
+        # 브라우저는 정상이므로 풀에 그대로 반환
+        debug_capture.snapshot(pooled.driver, budget, 'deadline', failed=True)
+        return deadline_result(e)
+
+    except Exception as e:
+        import traceback
+        error_msg = f"{str(e)}\n{traceback.format_exc()}"
+        log.error(f"[Companion API] Error: {error_msg}")
+        if pooled:
+            debug_capture.snapshot(pooled.driver, budget, 'error', failed=True)
+        discard = True
+        return {
+            'success': False,
+            'error': error_msg,
+            'data': None
+        }
+
+    finally:
+        if pooled:
+            driver_pool.release(pooled, discard=discard)
+
+def search_album_batch(items, claim=None):
+    """한 세션에서 Catalog 페이지를 한 번만 로딩해 여러 앨범을 검색 (항목별 결과를 순서대로 yield)
+
+    Catalog 페이지는 첫 번째 탭에 그대로 두고, Smart Link 페이지는 두 번째 탭에서 연다.
+    claim(item)이 False인 항목은 검색하지 않고 건너뛴다 (다른 요청이 같은 앨범을 검색 중인 경우).
+    """
+    pooled = None
+    discard = False
+    catalog_tab = detail_tab = None
+
+    def failure(error):
+        return {'success': False, 'error': error, 'data': None}
+
+    if not items:
+        return
+
+    try:
+        pooled = driver_pool.acquire()
+        if not pooled:
+            for item in items:
+                yield item, failure('Login failed')
+            return
+        driver = pooled.driver
+
+        log.info(f"[Companion API] Batch: navigating to catalog page ({len(items)} items)...")
+        if not open_catalog(driver):
+            discard = True
+            for item in items:
+                yield item, failure('Login failed')
+            return
+
+        catalog_tab = driver.current_window_handle
+        detail_tab = new_tab(driver)
+        driver.switch_to.window(catalog_tab)
+
+        for item in items:
+            if claim and not claim(item):
+                continue
+            artist, album, upc = item['artist'], item['album'], item['upc']
+            budget = SearchBudget()
+            if not driver_pool.charge(pooled, timeout=budget.remaining()):
+                yield item, failure('Rate limited: no search budget left for this account')
+                continue
+            kr_pending = kr_search.start(artist, album)
+            try:
+                # 이미 아는 Smart Link면 Catalog 검색 생략
+                known_url = item.get('smart_link_url') or lookup_smart_link(artist, album, upc)
+                if known_url:
+                    driver.switch_to.window(detail_tab)
+                    album_cover_url, platforms = open_known_smart_link(driver, known_url, budget)
+                    if platforms:
+                        result = global_album_result(artist, album, album_cover_url, platforms, known_url)
+                        result = finish_album_result(result, kr_pending, budget)
+                        remember_smart_link(artist, album, upc, result)
+                        finish_timings(result, budget, 'batch')
+                        yield item, result
+                        continue
+
+                driver.switch_to.window(catalog_tab)
+                if is_login_page(driver) and not open_catalog(driver, budget):
+                    discard = True
+                    kr_search.cancel(kr_pending)
+                    yield item, failure('Login failed')
+                    continue
+
+                target_row = find_album_row(driver, artist, album, upc, budget)
+                if not target_row:
+                    kr_search.cancel(kr_pending)
+                    result = not_found_result(artist, album)
+                    finish_timings(result, budget, 'batch')
+                    yield item, result
+                    continue
+
+                smart_link_url = get_smart_link_url(target_row)
+                if smart_link_url:
+                    driver.switch_to.window(detail_tab)
+                    open_smart_link(driver, target_row, smart_link_url, budget)
+                else:
+                    # 행 클릭은 Catalog 탭에서 이동하므로 끝나면 Catalog 페이지를 다시 연다
+                    open_smart_link(driver, target_row, None, budget)
+
+                album_cover_url, platforms = extract_platforms(driver, budget)
+                if not smart_link_url:
+                    smart_link_url = current_smart_link_url(driver)
+                    open_catalog(driver)
+                    driver.switch_to.window(detail_tab)
+
+                result = global_album_result(artist, album, album_cover_url, platforms, smart_link_url)
+                result = finish_album_result(result, kr_pending, budget)
+                remember_smart_link(artist, album, upc, result)
+                finish_timings(result, budget, 'batch')
+                yield item, result
+
+            except DeadlineExceeded as e:
+                kr_search.cancel(kr_pending)
+                result = deadline_result(e)
+                finish_timings(result, budget, 'batch')
+                yield item, result
+                try:
+                    driver.switch_to.window(catalog_tab)
+                    open_catalog(driver)
+                except Exception:
+                    discard = True
+                    break
+
+            except Exception as e:
+                import traceback
+                error_msg = f"{str(e)}\n{traceback.format_exc()}"
+                log.error(f"[Companion API] Batch item error: {error_msg}")
+                discard = True
+                kr_search.cancel(kr_pending)
+                result = failure(error_msg)
+                finish_timings(result, budget, 'batch')
+                yield item, result
+                # 세션 상태를 알 수 없으므로 Catalog 페이지부터 다시 시작
+                try:
+                    driver.switch_to.window(catalog_tab)
+                    open_catalog(driver)
+                except Exception:
+                    break
+
+    except Exception as e:
+        import traceback
+        log.error(f"[Companion API] Batch error: {str(e)}\n{traceback.format_exc()}")
+        discard = True
+
+    finally:
+        if pooled:
+            # 두 번째 탭을 닫고 Catalog 탭으로 돌려놓은 뒤 반환
+            if detail_tab and not discard:
+                try:
+                    pooled.driver.switch_to.window(detail_tab)
+                    pooled.driver.close()
+                    pooled.driver.switch_to.window(catalog_tab)
+                except Exception:
+                    discard = True
+            driver_pool.release(pooled, discard=discard)
+
+
+# ============================================================
+# 브라우저 하나에서 여러 앨범을 탭별로 동시에 검색
+# ============================================================
+
+# 상태 머신이 이 값을 yield하면 스케줄러가 그 탭에서 다시 로그인하고 성공 여부를 돌려준다
+RELOGIN = 'relogin'
+
+# 페이지 로딩을 기다리지 않고 이동 (이전 페이지에 표시를 남겨 새 페이지가 뜰 때까지 조건을 막는다)
+NAVIGATE_JS = "window.__tabNavigating = true; window.location.href = arguments[0];"
+
+class TabWait:
+    """탭 상태 머신이 기다리는 조건 (스케줄러가 그 탭으로 전환해 폴링)"""
+
+    def __init__(self, step, condition, timeout):
+        self.step = step
+        self.condition = condition
+        self.timeout = timeout
+        self.started = time.time()
+
+def after_navigation(script):
+    """NAVIGATE_JS로 이동한 뒤 새 페이지에서 script가 참이 될 때까지 기다리는 조건"""
+    return js_condition("if (window.__tabNavigating === true) { return false; }\n"
+                        "return (function () {" + script + "})();")
+
+def tab_open_catalog(driver, budget):
+    """Catalog 페이지로 이동 (세션이 만료되었으면 RELOGIN 요청 후 한 번 더)"""
+    for attempt in range(2):
+        started = time.time()
+        resource_blocker.prepare(driver, CATALOG_URL)
+        driver.execute_script(NAVIGATE_JS, CATALOG_URL.format(int(time.time() * 1000)))
+        yield TabWait('catalog_load', after_navigation(CATALOG_READY_JS), CATALOG_READY_TIMEOUT)
+        budget.record('catalog_load', started)
+        if not is_login_page(driver) and driver.execute_script(CATALOG_IDLE_JS):
+            return True
+        if attempt == 0:
+            log.warning("[Tabs] Session expired, logging in again...")
+            if not (yield RELOGIN):
+                return False
+    return False
+
+def tab_open_smart_link(driver, smart_link_url, budget):
+    """Smart Link 페이지로 이동해 (앨범 커버, 플랫폼 리스트) 반환"""
+    for attempt in range(2):
+        started = time.time()
+        resource_blocker.prepare(driver, smart_link_url)
+        driver.execute_script(NAVIGATE_JS, smart_link_url)
+        yield TabWait('smart_link_load', after_navigation(SMART_LINK_READY_JS), SMART_LINK_TIMEOUT)
+        budget.record('smart_link_load', started)
+        if not is_login_page(driver):
+            return extract_platforms(driver, budget)
+        if attempt == 0 and not (yield RELOGIN):
+            break
+    return None, []
+
+def tab_album_flow(driver, artist, album, upc, smart_link_url, budget):
+    """탭 하나에서 앨범 한 건의 글로벌 검색을 진행하는 상태 머신
+
+    기다려야 할 때마다 TabWait를 yield하고, 끝나면 /search/global 응답 형식의 dict를 반환한다.
+    스케줄러가 실행할 때마다 해당 탭으로 전환되어 있다.
+    """
+    if smart_link_url:
+        album_cover_url, platforms = yield from tab_open_smart_link(driver, smart_link_url, budget)
+        if platforms:
+            return global_album_result(artist, album, album_cover_url, platforms, smart_link_url)
+        log.warning("[Tabs] Known Smart Link has no platforms, searching catalog instead")
+
+    if not (yield from tab_open_catalog(driver, budget)):
+        return {
+            'success': False,
+            'error': 'Login failed',
+            'data': None
+        }
+
+    # 탭마다 이미 동시에 진행되므로 검색 방식은 순서대로 시도
+    target_row = None
+    for name, query, matcher, fallback in search_strategies(artist, album, upc):
+        started = time.time()
+        launch_catalog_search(driver, query)
+        yield TabWait(f'{name}_results', js_condition(RESULTS_RENDERED_JS), SEARCH_RESULTS_TIMEOUT)
+        rows = read_catalog_rows(driver)
+        budget.record('search', started)
+        log.debug(f"[Tabs] Found {len(rows)} album rows ({name}: {query})")
+        if catalog_index and rows:
+            catalog_index.upsert_rows(rows)
+        started = time.time()
+        target_row = matcher(rows)
+        budget.record('row_match', started)
+        target_row = target_row or match_fallback(budget, rows, fallback)
+        if target_row:
+            break
+
+    if not target_row:
+        debug_capture.snapshot(driver, budget, 'search_results', failed=True)
+        return not_found_result(artist, album)
+
+    smart_link_url = get_smart_link_url(target_row)
+    if smart_link_url:
+        album_cover_url, platforms = yield from tab_open_smart_link(driver, smart_link_url, budget)
+    else:
+        # Smart Link를 못 찾으면 행 자체를 클릭
+        started = time.time()
+        driver.execute_script("document.querySelectorAll('table tbody tr')[arguments[0]].click();", target_row['index'])
+        yield TabWait('smart_link_load', element_present('#platList'), SMART_LINK_TIMEOUT)
+        budget.record('smart_link_load', started)
+        smart_link_url = current_smart_link_url(driver)
+        album_cover_url, platforms = extract_platforms(driver, budget)
+
+    return global_album_result(artist, album, album_cover_url, platforms, smart_link_url)
+
+class TabTask:
+    """탭 스케줄러에 넘기는 앨범 한 건"""
+
+    def __init__(self, artist, album, upc, smart_link_url, budget):
+        self.artist = artist
+        self.album = album
+        self.upc = upc
+        self.smart_link_url = smart_link_url
+        self.budget = budget
+        self.submitted = time.time()
+        self.result = None
+        self.done = threading.Event()
+        self.abandoned = False  # 요청 쪽이 기다리기를 포기함 (실행하지 않거나 중단)
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+class BrowserTabs:
+    """풀에서 브라우저 하나를 빌려 여러 앨범을 탭마다 하나씩 동시에 검색
+
+    탭마다 tab_album_flow 상태 머신을 두고, 한 스레드가 탭을 돌아가며 조건을 확인해 준비된 탭만 진행시킨다
+    (협력적 스케줄링). 할 일이 없으면 브라우저를 풀에 반환한다.
+    """
+
+    def __init__(self, name, max_tabs):
+        self.name = name
+        self.max_tabs = max_tabs
+        self.queue = deque()
+        self.running = 0
+        self.completed = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def load(self):
+        with self._cond:
+            return len(self.queue) + self.running
+
+    def queued(self):
+        with self._cond:
+            return len(self.queue)
+
+    def submit(self, task):
+        with self._cond:
+            self.queue.append(task)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, task):
+        """요청이 기다리기를 포기한 앨범: 대기열에 있으면 빼고, 실행 중이면 다음 확인 때 중단"""
+        with self._cond:
+            task.abandoned = True
+            try:
+                self.queue.remove(task)
+            except ValueError:
+                pass
+
+    def _take(self, limit):
+        with self._cond:
+            tasks = []
+            while self.queue and len(tasks) < limit:
+                tasks.append(self.queue.popleft())
+            self.running += len(tasks)
+            return tasks
+
+    def _finish(self, task, result):
+        with self._cond:
+            self.running -= 1
+            self.completed += 1
+        task.finish(result)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # 예상하지 못한 오류로 스레드가 끝나면 다음 submit()이 새 스레드를 시작하도록
+            log.error(f"[Tabs] {self.name} worker stopped")
+            with self._cond:
+                self._thread = None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self.queue:
+                    self._cond.wait()
+
+            # 그리드가 잠시 내려가 WebDriverException 등이 나도 스레드는 계속 돌아야 한다
+            try:
+                pooled = driver_pool.acquire()
+            except Exception as e:
+                if not isinstance(e, TimeoutError):
+                    log.error(f"[Tabs] {self.name} could not get a browser: {str(e)}")
+                pooled = None
+                error = str(e)
+            else:
+                error = 'Login failed'
+
+            if not pooled:
+                for task in self._take(float('inf')):
+                    self._finish(task, {'success': False, 'error': error, 'data': None})
+                continue
+
+            discard = False
+            try:
+                discard = self._run_tabs(pooled)
+            except Exception as e:
+                log.error(f"[Tabs] {self.name} browser error: {str(e)}")
+                discard = True
+            finally:
+                log_context.request_id = None
+                driver_pool.release(pooled, discard=discard, searches=0)
+
+    def _run_tabs(self, pooled):
+        """대기열이 빌 때까지 (또는 브라우저를 재시작해야 할 때까지) 탭을 돌아가며 진행. 브라우저를 버려야 하면 True
+
+        검색 횟수는 앨범이 끝날 때마다 pooled.searches에 더하고, 그때마다 재시작 조건을 확인한다.
+        재시작해야 하면 새 앨범은 받지 않고 진행 중인 탭만 마친 뒤 반환한다 (남은 대기열은 새 브라우저에서).
+        """
+        driver = pooled.driver
+        handles = [driver.current_window_handle]
+        states = {}  # handle -> {'task', 'flow', 'wait'}
+        base = pooled.searches
+        assigned = 0
+        retiring = None
+
+        try:
+            while True:
+                # 끝난 앨범 수만큼 검색 횟수 반영 후 재시작 조건 확인
+                finished = base + assigned - len(states)
+                if pooled.searches != finished:
+                    pooled.searches = finished
+                    retiring = retiring or driver_pool.recycle_reason(pooled)
+                    if retiring:
+                        log.info(f"[Tabs] {self.name}: not taking new albums ({retiring})")
+
+                # 빈 탭에 새 앨범 배정 (계정의 검색 토큰이 남아 있는 만큼)
+                tasks = []
+                while (not retiring
+                       and base + assigned + len(tasks) < driver_pool.max_searches
+                       and len(states) + len(tasks) < self.max_tabs and self.queued()):
+                    if not driver_pool.charge(pooled):
+                        break
+                    tasks.extend(self._take(1))
+                assigned += len(tasks)
+                for task in tasks:
+                    handle = next((h for h in handles if h not in states), None)
+                    if handle:
+                        driver.switch_to.window(handle)
+                    else:
+                        handle = new_tab(driver)
+                        handles.append(handle)
+                    log_context.request_id = task.budget.request_id
+                    record_acquire(task.budget, pooled, task.submitted)
+                    states[handle] = {
+                        'task': task,
+                        'flow': tab_album_flow(driver, task.artist, task.album, task.upc, task.smart_link_url,
+                                               task.budget),
+                        'wait': None
+                    }
+                    log.debug(f"[Tabs] {self.name}: {task.upc or task.artist + ' - ' + task.album} → tab {handles.index(handle)}")
+                    self._advance(driver, handle, states, None)
+
+                if not states:
+                    return False
+
+                progressed = False
+                for handle in list(states):
+                    state = states[handle]
+                    task, wait = state['task'], state['wait']
+                    log_context.request_id = task.budget.request_id
+
+                    if task.abandoned:
+                        state['flow'].close()
+                        del states[handle]
+                        self._finish(task, deadline_result(DeadlineExceeded('Abandoned by caller')))
+                        continue
+
+                    if task.budget.remaining() <= 0:
+                        state['flow'].close()
+                        del states[handle]
+                        self._finish(task, deadline_result(
+                            DeadlineExceeded(f'Album deadline ({ALBUM_DEADLINE:.0f}s) exceeded during step: {wait.step}')))
+                        continue
+
+                    driver.switch_to.window(handle)
+                    try:
+                        value = wait.condition(driver)
+                    except Exception:
+                        value = None  # 페이지 이동 중
+                    elapsed = time.time() - wait.started
+                    if value or elapsed >= wait.timeout:
+                        task.budget.waits[wait.step] = round(task.budget.waits.get(wait.step, 0) + elapsed, 3)
+                        if not value:
+                            log.warning(f"[Wait] {wait.step}: condition not met within {wait.timeout:.1f}s")
+                        self._advance(driver, handle, states, value)
+                        progressed = True
+
+                if not progressed:
+                    time.sleep(WAIT_POLL_INTERVAL)
+        except Exception as e:
+            # 브라우저 상태를 알 수 없으므로 진행 중인 앨범은 모두 실패 처리
+            log.error(f"[Tabs] {self.name} error: {str(e)}")
+            for state in states.values():
+                self._finish(state['task'], {'success': False, 'error': str(e), 'data': None})
+            return True
+
+        finally:
+            # 첫 번째 탭만 남기고 풀에 반환
+            for handle in handles[1:]:
+                try:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                except Exception:
+                    pass
+            try:
+                driver.switch_to.window(handles[0])
+            except Exception:
+                pass
+
+    def _advance(self, driver, handle, states, value):
+        """상태 머신을 다음 대기 지점까지 실행 (끝나면 결과 전달)"""
+        state = states[handle]
+        try:
+            step = state['flow'].send(value)
+            while step == RELOGIN:
+                started = time.time()
+                logged_in = login_to_companion(driver)
+                state['task'].budget.record('login', started)
+                step = state['flow'].send(logged_in)
+            step.started = time.time()
+            state['wait'] = step
+        except StopIteration as e:
+            del states[handle]
+            self._finish(state['task'], e.value)
+        except DeadlineExceeded as e:
+            del states[handle]
+            self._finish(state['task'], deadline_result(e))
+        except Exception as e:
+            del states[handle]
+            log.error(f"[Tabs] {self.name} tab error: {str(e)}")
+            self._finish(state['task'], {'success': False, 'error': str(e), 'data': None})
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': len(self.queue),
+                'running': self.running,
+                'completed': self.completed
+            }
+
+class TabScheduler:
+    """앨범 검색을 가장 한가한 브라우저의 탭에 배정"""
+
+    def __init__(self, browsers, tabs_per_browser):
+        self.tabs_per_browser = tabs_per_browser
+        self.browsers = [BrowserTabs(f'browser-tabs-{i}', tabs_per_browser) for i in range(browsers)]
+
+    def search(self, artist, album, upc, smart_link_url, budget):
+        """탭에서 글로벌 검색 후 결과 반환 (앨범 제한 시간 + 드라이버 대기 시간까지 대기)"""
+        task = TabTask(artist, album, upc, smart_link_url, budget)
+        browser = min(self.browsers, key=lambda browser: browser.load())
+        browser.submit(task)
+        if not task.done.wait(budget.remaining() + DRIVER_ACQUIRE_TIMEOUT):
+            browser.cancel(task)
+            return deadline_result(DeadlineExceeded(f'Album deadline ({ALBUM_DEADLINE:.0f}s) exceeded while queued'))
+        return task.result
+
+    def stats(self):
+        return {
+            'tabs_per_browser': self.tabs_per_browser,
+            'browsers': [browser.stats() for browser in self.browsers]
+        }
+
+tab_scheduler = TabScheduler(DRIVER_POOL_SIZE, BROWSER_TABS)
+
+# ============================================================
+# HTTP 전용 Companion 클라이언트 (브라우저는 로그인 갱신에만 사용)
+# ============================================================
+
+# catalog.search()가 보내는 XHR을 가로채 기록하는 스크립트
+CAPTURE_XHR_JS = """
+window.__capturedXhr = [];
+if (!XMLHttpRequest.prototype.__captureInstalled) {
+    var proto = XMLHttpRequest.prototype;
+    var origOpen = proto.open, origSend = proto.send, origSetHeader = proto.setRequestHeader;
+    proto.open = function (method, url) {
+        this.__capture = {method: method, url: new URL(url, location.href).href, headers: {}};
+        return origOpen.apply(this, arguments);
+    };
+    proto.setRequestHeader = function (name, value) {
+        if (this.__capture) { this.__capture.headers[name] = value; }
+        return origSetHeader.apply(this, arguments);
+    };
+    proto.send = function (body) {
+        var capture = this.__capture;
+        if (capture) {
+            capture.body = body == null ? null : String(body);
+            this.addEventListener('load', function () {
+                capture.status = this.status;
+                capture.content_type = this.getResponseHeader('Content-Type');
+                capture.response = this.responseText;
+                window.__capturedXhr.push(capture);
+            });
+        }
+        return origSend.apply(this, arguments);
+    };
+    proto.__captureInstalled = true;
+}
+"""
+
+# 닫는 태그가 없는 HTML 요소 (중첩 깊이 계산에서 제외)
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+class CatalogRowsParser(HTMLParser):
+    """검색 결과 HTML의 <tr> 행을 READ_CATALOG_ROWS_JS와 같은 형식의 dict 리스트로 변환"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._row = None
+        self._cells = None
+        self._album = None
+        self._artist = None
+        self._capture = None  # (필드, 태그, 중첩 깊이)
+        self._title_depth = 0  # .catalog_album_title 안쪽 깊이
+        self._smart_link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'tr':
+            self._row = True
+            self._cells = []
+            self._album = self._artist = self._smart_link = None
+            return
+        if not self._row:
+            return
+
+        if tag == 'td':
+            self._cells.append('')
+        elif tag == 'a' and not self._smart_link and '/catalog/platform/' in (attrs.get('href') or ''):
+            self._smart_link = urljoin(COMPANION_BASE_URL, attrs['href'])
+
+        in_album_cell = len(self._cells) == 3
+        if tag in VOID_TAGS:
+            return
+        if self._capture:
+            field, capture_tag, depth = self._capture
+            if tag == capture_tag:
+                self._capture = (field, capture_tag, depth + 1)
+        elif in_album_cell and tag == 'p' and self._album is None:
+            self._album = ''
+            self._capture = ('album', 'p', 1)
+        elif in_album_cell and tag == 'span' and self._title_depth and self._artist is None:
+            self._artist = ''
+            self._capture = ('artist', 'span', 1)
+
+        if in_album_cell:
+            if self._title_depth:
+                self._title_depth += 1
+            elif 'catalog_album_title' in (attrs.get('class') or '').split():
+                self._title_depth = 1
+
+    def handle_endtag(self, tag):
+        if not self._row or tag in VOID_TAGS:
+            return
+        if tag == 'tr':
+            self._finish_row()
+            return
+        if self._capture:
+            field, capture_tag, depth = self._capture
+            if tag == capture_tag:
+                self._capture = (field, capture_tag, depth - 1) if depth > 1 else None
+        if self._title_depth:
+            self._title_depth -= 1
+
+    def handle_data(self, data):
+        if not self._row or not self._cells:
+            return
+        self._cells[-1] += data
+        if self._capture:
+            if self._capture[0] == 'album':
+                self._album += data
+            else:
+                self._artist += data
+
+    def _finish_row(self):
+        cells = [' '.join(cell.split()) for cell in self._cells]
+        if cells:
+            self.rows.append({
+                'index': len(self.rows),
+                'cell_count': len(cells),
+                'upc': cells[3] if len(cells) > 3 else '',
+                'album': ' '.join((self._album or '').split()),
+                'artist': ' '.join((self._artist or '').split()),
+                'smart_link': self._smart_link
+            })
+        self._row = None
+        self._capture = None
+        self._title_depth = 0
+
+    def close(self):
+        super().close()
+        if self._row:
+            self._finish_row()
+
+def find_json_rows(payload):
+    """JSON 응답에서 첫 번째 dict 리스트(검색 결과 목록) 찾기"""
+    if isinstance(payload, list) and payload and all(isinstance(item, dict) for item in payload):
+        return payload
+    children = payload.values() if isinstance(payload, dict) else payload if isinstance(payload, list) else []
+    for child in children:
+        rows = find_json_rows(child)
+        if rows:
+            return rows
+    return None
+
+def json_row_to_catalog_row(index, item):
+    """JSON 결과 항목을 카탈로그 행 dict로 변환 (키 이름으로 필드 추정)"""
+    def pick(pattern):
+        for key, value in item.items():
+            if re.search(pattern, key, re.IGNORECASE) and isinstance(value, (str, int)) and str(value).strip():
+                return str(value).strip()
+        return ''
+
+    # 테이블의 UPC 컬럼은 "UPC / Catalog No" 형태
+    upc_text = ' / '.join(part for part in (pick(r'upc|barcode'), pick(r'cat(alog)?_?(no|num)')) if part)
+    smart_link = next((value for value in item.values()
+                       if isinstance(value, str) and '/catalog/platform/' in value), None)
+    return {
+        'index': index,
+        'cell_count': 5,
+        'upc': upc_text,
+        'album': pick(r'album.*(title|name)|^title$|^name$'),
+        'artist': pick(r'artist'),
+        'smart_link': urljoin(COMPANION_BASE_URL, smart_link) if smart_link else None
+    }
+
+def parse_catalog_payload(text):
+    """catalog.search() 응답(HTML 조각 또는 JSON)을 카탈로그 행 dict 리스트로 변환"""
+    if not text:
+        return []
+
+    stripped = text.lstrip()
+    if stripped[:1] in ('{', '['):
+        try:
+            payload = json.loads(stripped)
+        except ValueError:
+            payload = None
+        if payload is not None:
+            # JSON 안에 렌더링된 HTML 조각이 들어 있는 경우
+            html = next((value for value in (payload.values() if isinstance(payload, dict) else [])
+                         if isinstance(value, str) and '<tr' in value), None)
+            if html:
+                return parse_catalog_payload(html)
+            items = find_json_rows(payload) or []
+            return [json_row_to_catalog_row(index, item) for index, item in enumerate(items)]
+
+    parser = CatalogRowsParser()
+    parser.feed(text)
+    parser.close()
+    return parser.rows
+
+class SmartLinkPageParser(HTMLParser):
+    """Smart Link 페이지 HTML에서 앨범 커버와 #platList 항목의 onclick 추출"""
+
+    def __init__(self):
+        super().__init__()
+        self.has_plat_list = False
+        self.onclicks = []
+        self.album_cover_url = None
+        self._plat_list = None  # (태그, 중첩 깊이)
+        self._album_art_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+
+        if self._plat_list:
+            plat_tag, depth = self._plat_list
+            if tag == plat_tag:
+                self._plat_list = (plat_tag, depth + 1)
+            if tag == 'a':
+                self.onclicks.append(attrs.get('onclick'))
+        elif attrs.get('id') == 'platList':
+            self.has_plat_list = True
+            self._plat_list = (tag, 1)
+
+        if tag == 'img' and not self.album_cover_url and attrs.get('src'):
+            alt = attrs.get('alt') or ''
+            if ('album-cover' in classes or 'cover-image' in classes or self._album_art_depth
+                    or 'album' in alt or 'cover' in alt):
+                self.album_cover_url = attrs['src']
+
+        if tag in VOID_TAGS:
+            return
+        if self._album_art_depth:
+            self._album_art_depth += 1
+        elif 'album-art' in classes:
+            self._album_art_depth = 1
+
+    def handle_endtag(self, tag):
+        if self._plat_list:
+            plat_tag, depth = self._plat_list
+            if tag == plat_tag:
+                self._plat_list = (plat_tag, depth - 1) if depth > 1 else None
+        if self._album_art_depth:
+            self._album_art_depth -= 1
+
+# CompanionHttpClient.search_album: 카탈로그 검색은 성공했지만 매칭되는 앨범이 없음
+HTTP_NOT_FOUND = 'not_found'
+
+class CompanionHttpClient:
+    """브라우저 로그인 쿠키를 재사용하는 HTTP 전용 Companion 클라이언트
+
+    브라우저로 한 번 로그인해 쿠키와 catalog.search()의 XHR 형식을 알아낸 뒤,
+    카탈로그 검색과 Smart Link 페이지 조회는 requests.Session으로 직접 처리한다.
+    세션이 만료되면 브라우저로 다시 로그인한다.
+    """
+
+    def __init__(self, pool_size):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.search_template = None
+        self.logged_in_at = None
+        self._lock = threading.Lock()
+        self.logins = 0
+
+    def refresh_login(self, force=False):
+        """풀의 브라우저로 로그인 상태를 확인하고 쿠키(+ 검색 XHR 형식)를 복사"""
+        with self._lock:
+            if self.logged_in_at and not force:
+                return True
+
+            pooled = driver_pool.acquire()
+            if not pooled:
+                return False
+            discard = False
+            try:
+                driver = pooled.driver
+                budget = SearchBudget()
+                if not open_catalog(driver, budget):
+                    discard = True
+                    return False
+
+                if not self.search_template:
+                    self.search_template = self._discover_search_request(driver, budget)
+
+                self.session.cookies.clear()
+                for cookie in driver.get_cookies():
+                    self.session.cookies.set(cookie['name'], cookie['value'],
+                                             domain=cookie.get('domain'), path=cookie.get('path', '/'))
+                self.session.headers['User-Agent'] = driver.execute_script('return navigator.userAgent;')
+                self.logged_in_at = time.time()
+                self.logins += 1
+                log.info(f"[Companion HTTP] Copied {len(self.session.cookies)} cookies from browser session")
+                return True
+            except Exception as e:
+                log.warning(f"[Companion HTTP] Login refresh failed: {str(e)}")
+                discard = True
+                return False
+            finally:
+                driver_pool.release(pooled, discard=discard)
+
+    def _discover_search_request(self, driver, budget):
+        """catalog.search()를 한 번 실행해 XHR 요청 형식을 기록 (검색어 자리는 probe 토큰)"""
+        probe = f"zzprobe{uuid.uuid4().hex[:8]}"
+        driver.execute_script(CAPTURE_XHR_JS + """
+            document.getElementById('search_text').value = arguments[0];
+            catalog.search();
+        """, probe)
+        captured = budget.wait_until(
+            driver, 'http_discover',
+            js_condition("""
+                var probe = arguments[0];
+                var hits = (window.__capturedXhr || []).filter(function (c) {
+                    return c.url.indexOf(probe) >= 0 || (c.body || '').indexOf(probe) >= 0;
+                });
+                return hits.length ? hits[0] : null;
+            """, probe),
+            SEARCH_RESULTS_TIMEOUT
+        )
+        if not captured:
+            log.warning("[Companion HTTP] Could not capture catalog.search() request")
+            return None
+
+        log.info(f"[Companion HTTP] Catalog search endpoint: {captured['method']} {captured['url'].replace(probe, '{query}')}")
+        return {
+            'method': captured['method'].upper(),
+            'url': captured['url'],
+            'body': captured.get('body'),
+            'headers': captured.get('headers') or {},
+            'probe': probe
+        }
+
+    def _request(self, method, url, **kwargs):
+        """세션 만료(로그인 페이지로 리다이렉트) 시 한 번 재로그인 후 재시도"""
+        for attempt in range(2):
+            response = self.session.request(method, url, timeout=HTTP_TIMEOUT, **kwargs)
+            expired = response.status_code in (401, 403) or '/login' in response.url
+            if not expired:
+                return response
+            if attempt == 0:
+                log.warning("[Companion HTTP] Session expired, refreshing login...")
+                self.logged_in_at = None
+                if not self.refresh_login(force=True):
+                    break
+        return None
+
+    def search_catalog(self, query):
+        """카탈로그 검색을 HTTP로 실행하고 결과 행 dict 리스트 반환 (실패 시 None)"""
+        template = self.search_template
+        if not template:
+            return None
+
+        probe = template['probe']
+        url = template['url'].replace(probe, quote(query))
+        body = template['body']
+        if body:
+            content_type = next((value for key, value in template['headers'].items()
+                                 if key.lower() == 'content-type'), '')
+            if 'json' in content_type:
+                body = body.replace(probe, json.dumps(query)[1:-1])
+            else:
+                body = body.replace(probe, quote_plus(query))
+
+        response = self._request(template['method'], url, data=body.encode('utf-8') if body else None,
+                                 headers=template['headers'])
+        if response is None or response.status_code != 200:
+            return None
+        return parse_catalog_payload(response.text)
+
+    def fetch_smart_link(self, smart_link_url):
+        """Smart Link 페이지를 HTTP로 가져와 (앨범 커버, 플랫폼 리스트) 반환. #platList가 없으면 None"""
+        response = self._request('GET', smart_link_url)
+        if response is None or response.status_code != 200:
+            return None
+
+        parser = SmartLinkPageParser()
+        parser.feed(response.text)
+        parser.close()
+        if not parser.has_plat_list:
+            return None
+
+        album_cover_url = urljoin(response.url, parser.album_cover_url) if parser.album_cover_url else None
+        return album_cover_url, parse_platform_onclicks(parser.onclicks)
+
+    def find_smart_link(self, artist, album, upc=''):
+        """search_strategies 순서(CDMA → 앨범명, CDMA가 없으면 앨범명 → 아티스트명)로 HTTP 검색
+
+        반환: Smart Link URL, 모든 검색이 매칭 없이 끝나면 HTTP_NOT_FOUND, 검색 요청이 실패하면 None
+        """
+        target_row = None
+        for name, query, matcher, fallback in search_strategies(artist, album, upc):
+            rows = self.search_catalog(query)
+            if rows is None:
+                return None
+            log.info(f"[Companion HTTP] Found {len(rows)} album rows ({name}: {query})")
+            target_row = matcher(rows) or (fallback(rows) if fallback and rows else None)
+            if target_row:
+                break
+
+        if not target_row:
+            return HTTP_NOT_FOUND
+        # Smart Link가 없는 행이면 브라우저 경로에서 다시 확인
+        return get_smart_link_url(target_row)
+
+    def search_album(self, artist, album, upc='', smart_link_url=None):
+        """글로벌 플랫폼 검색 (HTTP 전용). (앨범 커버, 플랫폼 리스트, Smart Link URL) 반환
+
+        카탈로그에 없으면 HTTP_NOT_FOUND, 요청이 실패하면 None (브라우저 경로로 대체)
+        """
+        try:
+            if not self.refresh_login():
+                return None
+
+            # 이미 아는 Smart Link는 페이지만 다시 읽고, 플랫폼이 없으면 검색부터 다시
+            page = self.fetch_smart_link(smart_link_url) if smart_link_url else None
+            if not (page and page[1]):
+                smart_link_url = self.find_smart_link(artist, album, upc)
+                if smart_link_url is HTTP_NOT_FOUND:
+                    return HTTP_NOT_FOUND
+                if not smart_link_url:
+                    return None
+                page = self.fetch_smart_link(smart_link_url)
+
+            if page is None:
+                return None
+            album_cover_url, platforms = page
+            log.info(f"[Companion HTTP] {len(platforms)} platforms from {smart_link_url}")
+            return album_cover_url, platforms, smart_link_url
+        except requests.RequestException as e:
+            log.warning(f"[Companion HTTP] Request failed: {str(e)}")
+            return None
+
+    def stats(self):
+        return {
+            'enabled': COMPANION_HTTP_MODE,
+            'logged_in': bool(self.logged_in_at),
+            'logins': self.logins,
+            'search_endpoint': (self.search_template['url'].replace(self.search_template['probe'], '{query}')
+                                if self.search_template else None)
+        }
+
+companion_http = CompanionHttpClient(DRIVER_POOL_SIZE * 4)
+
+def get_companion_db():
+    """companion_api 상태 DB 연결"""
+    conn = sqlite3.connect(COMPANION_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+class JobStore:
+    """SQLite 기반 검색 작업 큐
+
+    작업 상태: queued → running → done / failed
+    서버가 재시작되면 running 상태였던 작업을 다시 queued로 돌린다.
+    꺼낼 때마다 attempts를 올리고, JOB_MAX_ATTEMPTS번 실행하고도 끝나지 않은 작업은 failed로 둔다.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        conn = get_companion_db()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                artist TEXT,
+                album TEXT,
+                upc TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)')
+        abandoned = conn.execute('''
+            UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+            WHERE status = 'running' AND attempts >= ?
+        ''', (f'Interrupted {JOB_MAX_ATTEMPTS} times (server restarted while running)',
+              time.time(), JOB_MAX_ATTEMPTS)).rowcount
+        requeued = conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+        conn.commit()
+        conn.close()
+        if abandoned:
+            log.warning(f"[Jobs] Failed {abandoned} jobs interrupted {JOB_MAX_ATTEMPTS} times")
+        if requeued:
+            log.info(f"[Jobs] Requeued {requeued} interrupted jobs")
+
+    def enqueue(self, artist, album, upc):
+        """작업 등록 후 id 반환"""
+        job_id = uuid.uuid4().hex
+        conn = get_companion_db()
+        conn.execute('''
+            INSERT INTO jobs (id, status, artist, album, upc, created_at)
+            VALUES (?, 'queued', ?, ?, ?, ?)
+        ''', (job_id, artist, album, upc, time.time()))
+        conn.commit()
+        conn.close()
+        with self._cond:
+            self._cond.notify_all()
+        return job_id
+
+    def claim(self):
+        """가장 오래된 queued 작업을 running으로 바꾸고 반환 (없으면 None)"""
+        conn = get_companion_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT * FROM jobs WHERE status = 'queued'
+                ORDER BY created_at LIMIT 1
+            ''').fetchone()
+            if row:
+                conn.execute('''
+                    UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1
+                    WHERE id = ?
+                ''', (time.time(), row['id']))
+            conn.commit()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def finish(self, job_id, result=None, error=None):
+        """작업 완료 기록 (error가 있으면 failed)"""
+        conn = get_companion_db()
+        conn.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?
+            WHERE id = ?
+        ''', ('failed' if error else 'done',
+              json.dumps(result, ensure_ascii=False) if result is not None else None,
+              error, time.time(), job_id))
+        conn.commit()
+        conn.close()
+        with self._cond:
+            self._cond.notify_all()
+
+    def get(self, job_id):
+        conn = get_companion_db()
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def wait_for(self, job_id, timeout):
+        """작업이 끝나거나 timeout이 지날 때까지 대기 (long-poll)"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.time()
+            if not job or job['status'] in ('done', 'failed') or remaining <= 0:
+                return job
+            with self._cond:
+                self._cond.wait(min(remaining, 5))
+
+    def wait_for_work(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def purge(self, max_age_hours):
+        """보관 기간이 지난 완료 작업 삭제"""
+        conn = get_companion_db()
+        conn.execute('''
+            DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?
+        ''', (time.time() - max_age_hours * 3600,))
+        conn.commit()
+        conn.close()
+
+    def counts(self):
+        conn = get_companion_db()
+        rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        conn.close()
+        return {row[0]: row[1] for row in rows}
+
+job_store = None
+
+def job_worker():
+    """queued 작업을 하나씩 꺼내 검색"""
+    last_purge = 0
+    while True:
+        try:
+            job = job_store.claim()
+            if not job:
+                if time.time() - last_purge > 3600:
+                    job_store.purge(JOB_RETENTION_HOURS)
+                    last_purge = time.time()
+                job_store.wait_for_work(5)
+                continue
+
+            log_context.request_id = job['id'][:12]
+            log.info(f"[Jobs] Running {job['id']}: {job['upc'] or job['artist'] + ' - ' + job['album']}")
+            try:
+                # /search와 같은 슬롯을 쓰되 거절되지 않고 빈 슬롯을 기다림
+                result = cached_search_album(job['artist'], job['album'], job['upc'], admit=True, background=True)
+                job_store.finish(job['id'], result=result)
+            except Exception as e:
+                job_store.finish(job['id'], error=str(e))
+            finally:
+                log_context.request_id = None
+        except Exception as e:
+            log.error(f"[Jobs] Worker error: {str(e)}")
+            time.sleep(5)
+
+def start_job_workers():
+    """작업 저장소를 열고 백그라운드 워커 시작"""
+    global job_store
+    job_store = JobStore()
+    for i in range(JOB_WORKERS):
+        threading.Thread(target=job_worker, name=f'job-worker-{i}', daemon=True).start()
+    log.info(f"[Jobs] Started {JOB_WORKERS} workers (db: {COMPANION_DB_PATH})")
 
-def login_to_companion(driver):
-    """Companion.global (FLUXUS)에 로그인"""
-    import sys
+# ============================================================
+# 로컬 카탈로그 인덱스 (CDMA/UPC → Smart Link)
+# ============================================================
 
-    def safe_flush():
-        try:
-            sys.stdout.flush()
-        except (BrokenPipeError, OSError):
-            pass
+# 결과 목록의 페이지 이동: 번호 링크가 있으면 클릭, 없으면 '다음' 링크 클릭
+GO_TO_PAGE_JS = """
+var page = String(arguments[0]);
+var pagers = document.querySelectorAll('.paging, .pagination, [class*="paging"], [class*="pagination"]');
+for (var i = 0; i < pagers.length; i++) {
+    var links = pagers[i].querySelectorAll('a, button');
+    for (var j = 0; j < links.length; j++) {
+        if (links[j].innerText.trim() === page) { links[j].click(); return 'page'; }
+    }
+}
+for (var i = 0; i < pagers.length; i++) {
+    var next = pagers[i].querySelector('[class*="next"]:not([class*="disabled"])');
+    if (next) { next.click(); return 'next'; }
+}
+return null;
+"""
 
-    try:
-        print("[Companion API] Starting login process...")
-        safe_flush()
+def split_upc_text(upc_text):
+    """UPC 컬럼 텍스트("UPC / Catalog No")를 (upc, catalog_no)로 분리"""
+    parts = [part.strip() for part in (upc_text or '').split('/') if part.strip()]
+    if len(parts) >= 2:
+        return parts[0], parts[-1]
+    if len(parts) == 1:
+        return (parts[0], None) if parts[0].isdigit() else (None, parts[0])
+    return None, None
 
-        # 로그인 페이지 접속
-        driver.get('http://companion.global')
-        print(f"[Companion API] Loaded login page: {driver.current_url}")
-        safe_flush()
+def album_key(artist, album, upc=''):
+    """앨범 식별 키 (CDMA/UPC 우선, 없으면 정규화한 아티스트+앨범명)"""
+    if upc and upc.strip():
+        return upc.strip().upper()
+    return f"{normalize_text(artist)}|{normalize_text(album)}"
 
-        # Username 입력
-        username_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, 'username'))
-        )
-        username_input.clear()
-        username_input.send_keys(COMPANION_USERNAME)
-        print(f"[Companion API] Entered username: {COMPANION_USERNAME}")
-        safe_flush()
+class CatalogIndex:
+    """Companion 카탈로그의 로컬 사본 (catalog_index 테이블)
 
-        # Password 입력
-        password_input = driver.find_element(By.ID, 'password')
-        password_input.clear()
-        password_input.send_keys(COMPANION_PASSWORD)
-        print("[Companion API] Entered password")
-        safe_flush()
+    크롤러가 전체 목록을 한 번 훑어 채우고, 이후에는 최신 페이지부터 지난 크롤링의 최신 행
+    (high-water mark)이 나올 때까지만 갱신한다. 일반 검색에서 본 행도 함께 저장한다.
+    """
 
-        # 로그인 버튼 클릭
-        login_button = driver.find_element(By.CSS_SELECTOR, 'button[type="submit"], .btn_login')
-        login_button.click()
-        print("[Companion API] Clicked login button")
-        safe_flush()
+    def __init__(self):
+        conn = get_companion_db()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_index (
+                smart_link TEXT PRIMARY KEY,
+                catalog_no TEXT,
+                upc TEXT,
+                title TEXT,
+                artist TEXT,
+                first_seen_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_catalog_index_catalog_no ON catalog_index(catalog_no)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_catalog_index_upc ON catalog_index(upc)')
+        # 크롤링 상태 (high_water: 지난 크롤링 첫 페이지의 Smart Link 목록, JSON)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_crawl_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS album_smart_links (
+                album_key TEXT PRIMARY KEY,
+                upc TEXT,
+                artist TEXT,
+                album TEXT,
+                smart_link TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        self.last_crawl = None
 
-        # 로그인 완료 대기 (dashboard 페이지로 리다이렉트 확인)
-        time.sleep(5)
-        print(f"[Companion API] After login, URL: {driver.current_url}")
-        print(f"[Companion API] Page title: {driver.title}")
-        safe_flush()
+    def upsert_rows(self, rows):
+        """Smart Link가 있는 행 저장. 새로 추가된 행 수 반환"""
+        now = time.time()
+        inserted = 0
+        conn = get_companion_db()
+        for row in rows:
+            if not row.get('smart_link'):
+                continue
+            smart_link = urljoin(COMPANION_BASE_URL, row['smart_link'])
+            upc, catalog_no = split_upc_text(row.get('upc'))
+            # lookup과 같은 형태(대문자)로 저장
+            upc, catalog_no = upc and upc.upper(), catalog_no and catalog_no.upper()
+            exists = conn.execute('SELECT 1 FROM catalog_index WHERE smart_link = ?', (smart_link,)).fetchone()
+            if exists:
+                conn.execute('''
+                    UPDATE catalog_index SET catalog_no = ?, upc = ?, title = ?, artist = ?, updated_at = ?
+                    WHERE smart_link = ?
+                ''', (catalog_no, upc, row.get('album'), row.get('artist'), now, smart_link))
+            else:
+                conn.execute('''
+                    INSERT INTO catalog_index (smart_link, catalog_no, upc, title, artist, first_seen_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (smart_link, catalog_no, upc, row.get('album'), row.get('artist'), now, now))
+                inserted += 1
+        conn.commit()
+        conn.close()
+        return inserted
 
-        # 로그인 실패 체크 (error=true가 있거나 여전히 login 페이지면)
-        if 'error=true' in driver.current_url or '/login' in driver.current_url:
-            print("[Companion API] Login failed - still on login page or error detected")
-            safe_flush()
-            # DEBUG: Save error page
-            with open('/tmp/login_error.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
-            print("[Companion API] Saved error page to /tmp/login_error.html")
-            return False
+    def lookup(self, code):
+        """CDMA 코드 또는 UPC로 Smart Link URL 찾기 (없으면 None)"""
+        # album_key와 같이 앞뒤 공백 제거 + 대문자
+        code = (code or '').strip().upper()
+        if not code:
+            return None
+        conn = get_companion_db()
+        row = conn.execute('''
+            SELECT smart_link FROM catalog_index
+            WHERE catalog_no = ? OR upc = ?
+            ORDER BY updated_at DESC LIMIT 1
+        ''', (code, code)).fetchone()
+        conn.close()
+        return row['smart_link'] if row else None
 
-        # Dashboard 페이지 확인
-        if '/dashboard' in driver.current_url:
-            print("[Companion API] Successfully reached dashboard")
-        else:
-            print(f"[Companion API] Unexpected page after login: {driver.current_url}")
+    def high_water(self):
+        """지난 크롤링 첫 페이지의 Smart Link 집합 (증분 크롤링은 이 중 하나가 나오면 멈춘다)"""
+        conn = get_companion_db()
+        row = conn.execute("SELECT value FROM catalog_crawl_state WHERE key = 'high_water'").fetchone()
+        conn.close()
+        return set(json.loads(row['value'])) if row else set()
 
-        # DEBUG: Save page source
-        with open('/tmp/after_login.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print("[Companion API] Saved page source to /tmp/after_login.html")
-        safe_flush()
+    def set_high_water(self, smart_links):
+        conn = get_companion_db()
+        conn.execute("INSERT OR REPLACE INTO catalog_crawl_state (key, value) VALUES ('high_water', ?)",
+                     (json.dumps(smart_links),))
+        conn.commit()
+        conn.close()
 
-        print("[Companion API] Login successful")
-        safe_flush()
-        return True
+    def remember_album(self, artist, album, upc, smart_link_url):
+        """검색 요청(artist/album/upc)으로 찾은 Smart Link 저장"""
+        conn = get_companion_db()
+        conn.execute('''
+            INSERT OR REPLACE INTO album_smart_links (album_key, upc, artist, album, smart_link, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (album_key(artist, album, upc), upc or None, artist, album, smart_link_url, time.time()))
+        conn.commit()
+        conn.close()
 
-    except Exception as e:
-        import traceback
-        print(f"[Companion API] Login failed: {str(e)}")
-        print(traceback.format_exc())
-        safe_flush()
-        return False
+    def lookup_album(self, artist, album, upc=''):
+        """검색 요청에 대해 저장된 Smart Link 조회 (없으면 카탈로그에서 CDMA/UPC로 조회)"""
+        conn = get_companion_db()
+        row = conn.execute('SELECT smart_link FROM album_smart_links WHERE album_key = ?',
+                           (album_key(artist, album, upc),)).fetchone()
+        conn.close()
+        if row:
+            return row['smart_link']
+        return self.lookup(upc) if upc else None
 
-def search_kr_platforms(driver, artist, album):
-    """한국 플랫폼에서 앨범 검색 (Selenium 사용)"""
-    import sys
+    def count(self):
+        conn = get_companion_db()
+        total = conn.execute('SELECT COUNT(*) FROM catalog_index').fetchone()[0]
+        conn.close()
+        return total
 
-    def safe_flush():
-        try:
-            sys.stdout.flush()
-        except (BrokenPipeError, OSError):
-            pass
+    def known_count(self):
+        conn = get_companion_db()
+        total = conn.execute('SELECT COUNT(*) FROM album_smart_links').fetchone()[0]
+        conn.close()
+        return total
 
-    results = {}
-    album_cover_url = None
-    query = f"{artist} {album}"
+    def stats(self):
+        return {
+            'albums': self.count(),
+            'known_smart_links': self.known_count(),
+            'last_crawl': self.last_crawl
+        }
 
-    print(f"[KR Search] Starting KR platform search: {query}")
-    safe_flush()
+catalog_index = None
 
-    # 1. 멜론 (requests로 충분)
-    try:
-        print(f"[KR Search] Searching Melon...")
-        safe_flush()
-        url = f"https://www.melon.com/search/total/index.htm?q={quote(query)}&section=&searchGnbYn=Y&kkoSpl=N&kkoDpType="
-        driver.get(url)
-        time.sleep(2)
-
-        page_source = driver.page_source
-        matches = re.findall(r'goAlbumDetail\(\'(\d+)\'\)', page_source)
-        if matches:
-            results['melon'] = f"https://www.melon.com/album/detail.htm?albumId={matches[0]}"
-            print(f"[KR Search] ✓ Melon: {results['melon']}")
-        else:
-            print(f"[KR Search] ✗ Melon: Not found")
-        safe_flush()
-    except Exception as e:
-        print(f"[KR Search] ✗ Melon error: {str(e)}")
-        safe_flush()
+def crawl_catalog(full=False):
+    """Companion 카탈로그 목록을 페이지 단위로 읽어 catalog_index에 저장
 
-    # 2. 벅스 (+ 앨범 커버)
-    try:
-        print(f"[KR Search] Searching Bugs...")
-        safe_flush()
-        url = f"https://music.bugs.co.kr/search/integrated?q={quote(query)}"
-        driver.get(url)
-        time.sleep(2)
-
-        page_source = driver.page_source
-        matches = re.findall(r'/album/(\d+)', page_source)
-        if matches:
-            album_id = matches[0]
-            results['bugs'] = f"https://music.bugs.co.kr/album/{album_id}"
-            print(f"[KR Search] ✓ Bugs: {results['bugs']}")
-
-            # 앨범 커버 가져오기
-            try:
-                driver.get(f"https://music.bugs.co.kr/album/{album_id}")
-                time.sleep(1)
-                cover_matches = re.findall(r'<meta property="og:image" content="([^"]+)"', driver.page_source)
-                if cover_matches:
-                    album_cover_url = cover_matches[0]
-                    print(f"[KR Search] ✓ Album cover found")
-            except Exception as e:
-                print(f"[KR Search] ⚠ Album cover error: {str(e)}")
-        else:
-            print(f"[KR Search] ✗ Bugs: Not found")
-        safe_flush()
-    except Exception as e:
-        print(f"[KR Search] ✗ Bugs error: {str(e)}")
-        safe_flush()
+    full=False면 최신 페이지부터 읽다가 지난 크롤링의 최신 행(high-water mark)이 있는 페이지가 나오거나
+    CATALOG_INCREMENTAL_MAX_PAGES에 닿으면 멈춘다 (증분 갱신).
+    검색 중에 저장된 행은 새 행 수에 잡히지 않으므로 멈추는 기준으로 쓰지 않는다.
+    """
+    max_pages = CATALOG_CRAWL_MAX_PAGES if full else min(CATALOG_INCREMENTAL_MAX_PAGES, CATALOG_CRAWL_MAX_PAGES)
+    pooled = driver_pool.acquire()
+    if not pooled:
+        log.warning("[Catalog Index] Login failed, skipping crawl")
+        return 0
+    discard = False
+    started = time.time()
+    total_inserted = 0
+    page = 1
+    marks = set() if full else catalog_index.high_water()
+    newest = []
+    reached_mark = False
+    completed = False
 
-    # 3. VIBE
     try:
-        print(f"[KR Search] Searching VIBE...")
-        safe_flush()
-        url = f"https://vibe.naver.com/search?query={quote(query)}"
-        driver.get(url)
-        time.sleep(3)  # JavaScript 렌더링 대기
+        driver = pooled.driver
+        budget = SearchBudget(total=CATALOG_CRAWL_DEADLINE)
+        if not open_catalog(driver, budget):
+            discard = True
+            return 0
 
-        # 앨범 링크 찾기
-        try:
-            album_links = driver.find_elements(By.CSS_SELECTOR, 'a[href*="/album/"]')
-            if album_links:
-                href = album_links[0].get_attribute('href')
-                if href:
-                    results['vibe'] = href
-                    print(f"[KR Search] ✓ VIBE: {results['vibe']}")
-                else:
-                    print(f"[KR Search] ✗ VIBE: Link found but no href")
-            else:
-                print(f"[KR Search] ✗ VIBE: Not found")
-        except Exception as e:
-            print(f"[KR Search] ✗ VIBE element error: {str(e)}")
-        safe_flush()
-    except Exception as e:
-        print(f"[KR Search] ✗ VIBE error: {str(e)}")
-        safe_flush()
+        # 빈 검색어로 전체 목록 (최신순)
+        driver.execute_script(WATCH_RESULTS_JS + """
+            document.getElementById('search_text').value = '';
+            catalog.search();
+        """)
+        budget.wait_until(driver, 'crawl_page', js_condition(RESULTS_RENDERED_JS), SEARCH_RESULTS_TIMEOUT)
 
-    # 4. FLO
-    try:
-        print(f"[KR Search] Searching FLO...")
-        safe_flush()
-        url = f"https://www.music-flo.com/search/all?keyword={quote(query)}"
-        driver.get(url)
-        time.sleep(3)  # JavaScript 렌더링 대기
+        while True:
+            rows = read_catalog_rows(driver)
+            inserted = catalog_index.upsert_rows(rows)
+            total_inserted += inserted
+            log.info(f"[Catalog Index] Page {page}: {len(rows)} rows, {inserted} new")
 
-        # 앨범 링크 찾기
-        try:
-            album_links = driver.find_elements(By.CSS_SELECTOR, 'a[href*="/detail/album/"]')
-            if album_links:
-                href = album_links[0].get_attribute('href')
-                if href:
-                    results['flo'] = href
-                    print(f"[KR Search] ✓ FLO: {results['flo']}")
-                else:
-                    print(f"[KR Search] ✗ FLO: Link found but no href")
-            else:
-                print(f"[KR Search] ✗ FLO: Not found")
-        except Exception as e:
-            print(f"[KR Search] ✗ FLO element error: {str(e)}")
-        safe_flush()
+            smart_links = [urljoin(COMPANION_BASE_URL, row['smart_link']) for row in rows if row.get('smart_link')]
+            if page == 1:
+                newest = smart_links
+            if marks and marks.intersection(smart_links):
+                reached_mark = True
+                break
+            if not rows or page >= max_pages:
+                break
+
+            driver.execute_script(WATCH_RESULTS_JS)
+            if not driver.execute_script(GO_TO_PAGE_JS, page + 1):
+                break
+            if not budget.wait_until(driver, 'crawl_page', js_condition(RESULTS_RENDERED_JS), SEARCH_RESULTS_TIMEOUT):
+                break
+            page += 1
+        completed = True
+
+    except DeadlineExceeded as e:
+        log.error(f"[Catalog Index] {str(e)}")
     except Exception as e:
-        print(f"[KR Search] ✗ FLO error: {str(e)}")
-        safe_flush()
+        log.error(f"[Catalog Index] Crawl error: {str(e)}")
+        discard = True
+    finally:
+        driver_pool.release(pooled, discard=discard)
 
-    # 5. 지니뮤직
-    try:
-        print(f"[KR Search] Searching Genie...")
-        safe_flush()
-        url = f"https://www.genie.co.kr/search/searchMain?query={quote(query)}"
-        driver.get(url)
-        time.sleep(3)  # JavaScript 렌더링 대기
+    # 지난 mark까지 빈틈없이 읽었을 때만 mark를 옮긴다 (중간에 멈춘 증분 크롤링 뒤의 빈 구간은 full 크롤링으로)
+    if newest and (reached_mark or (completed and (full or not marks))):
+        catalog_index.set_high_water(newest)
+
+    catalog_index.last_crawl = {
+        'mode': 'full' if full else 'incremental',
+        'pages': page,
+        'inserted': total_inserted,
+        'reached_high_water': reached_mark,
+        'seconds': round(time.time() - started, 1),
+        'finished_at': time.time()
+    }
+    log.info(f"[Catalog Index] Crawl finished: {catalog_index.last_crawl}")
+    return total_inserted
 
-        # onclick 속성이 있는 앨범 링크 찾기
+def catalog_index_refresher():
+    """주기적으로 카탈로그 인덱스 증분 갱신
+
+    전체 크롤링은 풀의 브라우저를 몇 시간씩 잡으므로 자동으로 하지 않는다 (crawl --full CLI로 따로 실행).
+    갱신 중에는 검색과 같은 수용 제어 슬롯을 잡아 브라우저를 쓰고 있음을 반영한다.
+    """
+    while True:
         try:
-            album_links = driver.find_elements(By.CSS_SELECTOR, 'a[onclick*="fnViewAlbumLayer"]')
-            if album_links:
-                onclick = album_links[0].get_attribute('onclick')
-                if onclick:
-                    # fnViewAlbumLayer('앨범ID') 형식에서 ID 추출
-                    match = re.search(r"fnViewAlbumLayer\('(\d+)'\)", onclick)
-                    if match:
-                        album_id = match.group(1)
-                        results['genie'] = f"https://www.genie.co.kr/detail/albumInfo?axnm={album_id}"
-                        print(f"[KR Search] ✓ Genie: {results['genie']}")
-                    else:
-                        print(f"[KR Search] ✗ Genie: onclick parsing failed")
-                else:
-                    print(f"[KR Search] ✗ Genie: No onclick attribute")
-            else:
-                print(f"[KR Search] ✗ Genie: Not found")
+            if catalog_index.count() == 0:
+                log.warning("[Catalog Index] Index is empty: reading only the newest "
+                            f"{CATALOG_INCREMENTAL_MAX_PAGES} pages, run `python3 companion_api.py crawl --full` to index everything")
+            slots = admission.acquire(slots=max(BROWSER_TABS, 1), background=True)
+            try:
+                crawl_catalog(full=False)
+            finally:
+                admission.release(slots)
         except Exception as e:
-            print(f"[KR Search] ✗ Genie element error: {str(e)}")
-        safe_flush()
-    except Exception as e:
-        print(f"[KR Search] ✗ Genie error: {str(e)}")
-        safe_flush()
+            log.error(f"[Catalog Index] Refresh error: {str(e)}")
+        time.sleep(CATALOG_INDEX_REFRESH_HOURS * 3600)
 
-    print(f"[KR Search] Completed: {len(results)} platforms found")
-    safe_flush()
+def start_catalog_index():
+    """카탈로그 인덱스를 열고 주기적 갱신 시작"""
+    global catalog_index
+    catalog_index = CatalogIndex()
+    if CATALOG_INDEX_REFRESH_HOURS > 0:
+        threading.Thread(target=catalog_index_refresher, name='catalog-index', daemon=True).start()
+    log.info(f"[Catalog Index] {catalog_index.count()} albums indexed")
 
-    return results, album_cover_url
+# ============================================================
+# 검색 결과 캐시
+# ============================================================
 
-def search_album(artist, album, upc=''):
-    """Companion.global에서 앨범 검색"""
-    import sys
+class ResultCache:
+    """/search 응답 캐시 (result_cache 테이블)
 
-    def safe_flush():
+    CDMA/UPC가 있으면 그 코드로만, 없으면 아티스트+앨범명으로 저장하고 (같은 제목의 다른 발매반과 섞이지 않도록)
+    찾은 결과와 못 찾은 결과에 서로 다른 TTL을 적용한다.
+    로그인 실패, 타임아웃 같은 일시적인 오류는 저장하지 않는다.
+    """
+
+    def __init__(self, positive_ttl=RESULT_CACHE_TTL, negative_ttl=RESULT_CACHE_NEGATIVE_TTL,
+                 max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        conn = get_companion_db()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                cache_key TEXT PRIMARY KEY,
+                found INTEGER NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache(last_used_at)')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def keys(artist, album, upc='', part=''):
+        """캐시 키 목록 (CDMA/UPC가 있으면 그 코드만, 없으면 아티스트+앨범명). part('global'/'kr')별로 따로 저장
+
+        코드가 있는 요청은 아티스트+앨범명 키로 대체하지 않는다: 다른 발매반의 응답(Smart Link 포함)이 섞인다.
+        """
+        keys = []
+        if upc and upc.strip():
+            keys.append(album_key(artist, album, upc))
+        elif artist and album:
+            keys.append(album_key(artist, album))
+        return [f"{part}:{key}" for key in keys] if part else keys
+
+    @staticmethod
+    def classify(result):
+        """저장할 결과면 True(찾음)/False(못 찾음), 일시적인 오류면 None"""
+        if result.get('success'):
+            data = result.get('data') or {}
+            return bool(data.get('platforms') or data.get('kr_platforms'))
+        if result.get('not_found'):
+            return False
+        return None
+
+    def get(self, artist, album, upc='', part=''):
+        """유효한 캐시 응답 (없으면 None)"""
+        now = time.time()
+        conn = get_companion_db()
         try:
-            sys.stdout.flush()
-        except (BrokenPipeError, OSError):
-            pass
+            for key in self.keys(artist, album, upc, part):
+                row = conn.execute('SELECT * FROM result_cache WHERE cache_key = ?', (key,)).fetchone()
+                if not row:
+                    continue
+                ttl = self.positive_ttl if row['found'] else self.negative_ttl
+                if now - row['created_at'] > ttl:
+                    continue
+                conn.execute('UPDATE result_cache SET last_used_at = ? WHERE cache_key = ?', (now, key))
+                conn.commit()
+                with self._lock:
+                    self.hits += 1
+                result = json.loads(row['response'])
+                result['cache'] = {'hit': True, 'age': round(now - row['created_at'])}
+                return result
+        finally:
+            conn.close()
 
-    driver = None
+        with self._lock:
+            self.misses += 1
+        return None
 
-    try:
-        driver = get_driver()
+    def put(self, artist, album, upc, result, part=''):
+        """결과 저장 후 최대 개수를 넘으면 오래 안 쓴 항목부터 삭제"""
+        found = self.classify(result)
+        if found is None:
+            return
 
-        # 로그인
-        if not login_to_companion(driver):
+        response = json.dumps({key: value for key, value in result.items() if key not in ('cache', 'waits')},
+                              ensure_ascii=False)
+        now = time.time()
+        conn = get_companion_db()
+        for key in self.keys(artist, album, upc, part):
+            conn.execute('''
+                INSERT OR REPLACE INTO result_cache (cache_key, found, response, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, int(found), response, now, now))
+        total = conn.execute('SELECT COUNT(*) FROM result_cache').fetchone()[0]
+        evicted = 0
+        if total > self.max_entries:
+            evicted = conn.execute('''
+                DELETE FROM result_cache WHERE cache_key IN (
+                    SELECT cache_key FROM result_cache ORDER BY last_used_at LIMIT ?
+                )
+            ''', (total - self.max_entries,)).rowcount
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            self.stores += 1
+            self.evictions += evicted
+
+    def stats(self):
+        conn = get_companion_db()
+        entries = conn.execute('SELECT COUNT(*) FROM result_cache').fetchone()[0]
+        conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses
             return {
-                'success': False,
-                'error': 'Login failed',
-                'data': None
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'stores': self.stores,
+                'evictions': self.evictions
             }
 
-        # Catalog 페이지로 이동 (타임스탬프 추가로 캐시 방지)
-        print(f"[Companion API] Navigating to catalog page...")
-        import random
-        cache_buster = int(time.time() * 1000) + random.randint(0, 9999)
-        driver.get(f'http://companion.global/catalog?init=Y&t={cache_buster}')
-        time.sleep(3)  # 페이지 로딩 대기 시간 증가
-        print(f"[Companion API] Current URL: {driver.current_url}")
-
-        # DEBUG: Save catalog page source
-        with open('/tmp/catalog_page.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print("[Companion API] Saved catalog page to /tmp/catalog_page.html")
-        safe_flush()
-
-        # 검색창 대기 및 입력
-        search_input = WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.ID, 'search_text'))
-        )
-        # 검색창이 입력 가능한 상태가 될 때까지 대기
-        WebDriverWait(driver, 15).until(
-            EC.element_to_be_clickable((By.ID, 'search_text'))
-        )
-        print(f"[Companion API] Found search input")
-        safe_flush()
+result_cache = None
 
-        # 글로벌 플랫폼 검색: CDMA 코드 우선
-        # UPC가 있으면 CDMA 코드로 검색, 없으면 앨범명으로 검색
-        target_row = None
+class SingleFlight:
+    """같은 키의 검색이 이미 진행 중이면 새로 실행하지 않고 그 결과를 함께 받는다
 
-        # 텍스트 정규화 함수 (공백, 특수문자 제거)
-        def normalize_text(text):
-            import re
-            if not text:
-                return ""
-            # 공백과 특수문자 제거, 소문자 변환
-            return re.sub(r'[\s\-_,.()\[\]{}]+', '', text.lower())
-
-        # CDMA 코드로 검색 (UPC 파라미터 사용)
-        search_query = upc if upc else album
-
-        if search_query:
-            print(f"[Companion API] Searching by: {search_query} ({'CDMA' if upc else 'Album'})")
-            safe_flush()
-
-            # JavaScript로 직접 검색 필드 값을 설정하고 검색 실행
-            print(f"[Companion API] Setting search value via JavaScript: {search_query}")
-            safe_flush()
-
-            driver.execute_script("""
-                var searchInput = document.getElementById('search_text');
-                searchInput.value = arguments[0];
-                // input 이벤트 트리거 (JavaScript가 input 변화를 감지하도록)
-                var event = new Event('input', { bubbles: true });
-                searchInput.dispatchEvent(event);
-            """, search_query)
-
-            time.sleep(1)
-
-            # 실제로 입력된 값 확인
-            actual_value = search_input.get_attribute('value')
-            print(f"[Companion API] Value set in search field: {actual_value}")
-            safe_flush()
-
-            # JavaScript로 검색 실행
-            driver.execute_script("catalog.search();")
-            print(f"[Companion API] Executed catalog.search() via JavaScript")
-            safe_flush()
-
-            # 로딩창이 사라질 때까지 대기
-            print(f"[Companion API] Waiting for loading screen to disappear...")
-            safe_flush()
-            try:
-                # 로딩 div가 사라질 때까지 대기 (최대 20초)
-                wait = WebDriverWait(driver, 20)
-                wait.until(EC.invisibility_of_element_located((By.CSS_SELECTOR, 'div.loading')))
-                print(f"[Companion API] Loading screen disappeared")
-                safe_flush()
-            except TimeoutException:
-                print(f"[Companion API] Timeout waiting for loading screen to disappear")
-                safe_flush()
-
-            # 로딩 완료 후 추가 2초 대기 (데이터 렌더링 완료)
-            print(f"[Companion API] Waiting additional 2 seconds for data rendering...")
-            safe_flush()
-            time.sleep(2)
-
-            print(f"[Companion API] Data loading completed, checking for results...")
-            safe_flush()
-
-            # DEBUG: Save search results
-            with open('/tmp/search_results_primary.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
+    타임아웃 후 재시도가 몰려도 브라우저 검색은 키마다 한 번만 돈다.
+    """
 
-            try:
-                album_rows = driver.find_elements(By.CSS_SELECTOR, 'table tbody tr')
-                print(f"[Companion API] Found {len(album_rows)} album rows")
-                safe_flush()
-
-                if len(album_rows) > 0:
-                    # 1차: CDMA/UPC 코드로 검색한 경우 정확히 매칭되는 것 찾기
-                    if upc:
-                        print(f"[Companion API] Searching for exact CDMA match: {upc}")
-                        safe_flush()
-                        for row in album_rows:
-                            try:
-                                tds = row.find_elements(By.TAG_NAME, 'td')
-                                if len(tds) > 3:
-                                    # UPC/Catalog No 컬럼 (index 3)
-                                    upc_cell = tds[3]
-                                    upc_text = upc_cell.text.strip()
-
-                                    print(f"[Companion API] Checking UPC: {upc_text}")
-                                    safe_flush()
-
-                                    # 정확한 CDMA 매칭: 전체가 일치하거나 "/ CDMA코드" 형태
-                                    if upc == upc_text or upc_text.endswith(f" / {upc}") or upc_text.endswith(f"/ {upc}"):
-                                        print(f"[Companion API] Exact match found: {upc_text}")
-                                        safe_flush()
-                                        target_row = row
-                                        break
-                            except:
-                                continue
-
-                    # 2차: 앨범명으로 검색하거나 CDMA 매칭 실패시 앨범명+아티스트명으로 매칭
-                    if not target_row and album:
-                        # 앨범명으로 검색한 경우, 아티스트명 매칭
-                        normalized_artist = normalize_text(artist)
-                        normalized_album = normalize_text(album)
-                        for row in album_rows:
-                            try:
-                                tds = row.find_elements(By.TAG_NAME, 'td')
-                                if len(tds) > 2:
-                                    # TD[2]에서 앨범명과 아티스트명 추출
-                                    album_cell = tds[2]
-
-                                    # <p> 태그에서 앨범명 추출
-                                    try:
-                                        album_p = album_cell.find_element(By.TAG_NAME, 'p')
-                                        row_album_text = album_p.text.strip()
-                                    except:
-                                        row_album_text = ""
-
-                                    # catalog_album_title 내부의 <span>에서 아티스트명 추출
-                                    try:
-                                        title_span = album_cell.find_element(By.CLASS_NAME, 'catalog_album_title')
-                                        artist_span = title_span.find_element(By.TAG_NAME, 'span')
-                                        row_artist_text = artist_span.text.strip()
-                                    except:
-                                        row_artist_text = ""
-
-                                    normalized_row_artist = normalize_text(row_artist_text)
-                                    normalized_row_album = normalize_text(row_album_text)
-
-                                    print(f"[Companion API] Checking: {row_album_text} / {row_artist_text}")
-                                    safe_flush()
-
-                                    # 아티스트와 앨범명 모두 매칭
-                                    artist_match = (normalized_artist and normalized_row_artist and
-                                                   (normalized_artist in normalized_row_artist or normalized_row_artist in normalized_artist))
-                                    album_match = (normalized_album and normalized_row_album and
-                                                  (normalized_album in normalized_row_album or normalized_row_album in normalized_album))
-
-                                    if artist_match and album_match:
-                                        print(f"[Companion API] Matched! Artist: {row_artist_text}, Album: {row_album_text}")
-                                        safe_flush()
-                                        target_row = row
-                                        break
-                            except Exception as e:
-                                continue
-            except:
-                print(f"[Companion API] No results found")
-                safe_flush()
-
-        # Fallback: 앨범명 검색 실패 시 아티스트명으로 검색
-        if not target_row and not upc and artist:
-            print(f"[Companion API] Fallback: Searching by artist name: {artist}")
-            safe_flush()
-
-            search_input = driver.find_element(By.ID, 'search_text')
-            search_input.clear()
-            search_input.send_keys(artist)
-            print(f"[Companion API] Entered search query: {artist}")
-            safe_flush()
-
-            from selenium.webdriver.common.keys import Keys
-            search_input.send_keys(Keys.RETURN)
-            time.sleep(3)
-
-            # DEBUG: Save search results
-            with open('/tmp/search_results_fallback.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> {'done': Event, 'result', 'error', 'waiters'}
+        self.executions = 0
+        self.coalesced = 0
 
-            try:
-                album_rows = driver.find_elements(By.CSS_SELECTOR, 'table tbody tr')
-                print(f"[Companion API] Found {len(album_rows)} album rows")
-                safe_flush()
+    def enter(self, key):
+        """같은 키가 진행 중이면 (call, False), 아니면 새로 등록하고 (call, True). 등록했으면 finish로 끝낸다"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call:
+                call['waiters'] += 1
+                self.coalesced += 1
+                return call, False
+            call = {'done': threading.Event(), 'result': None, 'error': None, 'waiters': 0}
+            self._calls[key] = call
+            self.executions += 1
+            return call, True
 
-                normalized_album = normalize_text(album)
-                for row in album_rows:
-                    try:
-                        tds = row.find_elements(By.TAG_NAME, 'td')
-                        if len(tds) > 2:
-                            album_cell = tds[2]
-
-                            # <p> 태그에서 앨범명 추출
-                            try:
-                                album_p = album_cell.find_element(By.TAG_NAME, 'p')
-                                row_album_text = album_p.text.strip()
-                            except:
-                                row_album_text = ""
-
-                            normalized_row_album = normalize_text(row_album_text)
-
-                            print(f"[Companion API] Checking: {row_album_text} vs {album}")
-                            safe_flush()
-
-                            if not normalized_album or not normalized_row_album:
-                                continue
-
-                            if normalized_album in normalized_row_album or normalized_row_album in normalized_album:
-                                print(f"[Companion API] Matched album: {row_album_text}")
-                                safe_flush()
-                                target_row = row
-                                break
-                    except:
-                        continue
-            except:
-                print(f"[Companion API] No results found in fallback")
-                safe_flush()
+    def wait(self, key, call, timeout=None):
+        """다른 요청이 실행 중인 call의 결과 복사본 반환 ('coalesced': True). timeout(초)이 지나면 Overloaded"""
+        log.info(f"[Single Flight] Joining in-flight search: {key}")
+        if not call['done'].wait(timeout):
+            with self._lock:
+                call['waiters'] -= 1
+            raise Overloaded(f'Waited {timeout:g}s for the same search in progress', admission.retry_after())
+        if call['error']:
+            raise call['error']
+        if call['result'] is None:
+            raise RuntimeError('In-flight search ended without a result')
+        result = copy.deepcopy(call['result'])
+        result['coalesced'] = True
+        return result
 
-        # DEBUG: Final search results
-        with open('/tmp/search_results.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print(f"[Companion API] Current URL after search: {driver.current_url}")
-        safe_flush()
+    def finish(self, key, call, result=None, error=None):
+        """enter로 등록한 검색을 끝내고 기다리던 요청에 결과(또는 예외) 전달"""
+        call['result'] = result
+        call['error'] = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call['done'].set()
 
-        # 결과 확인
-        if not target_row:
-            error_msg = f'Album "{album}" by "{artist}" not found in search results'
-            print(f"[Companion API] {error_msg}")
-            safe_flush()
+    def do(self, key, fn, wait_timeout=None):
+        """fn() 결과 반환. 진행 중인 같은 키가 있으면 그 결과의 복사본 반환 ('coalesced': True)
+
+        wait_timeout: 합류한 경우 최대 대기 시간 (None이면 끝날 때까지)
+        """
+        call, leader = self.enter(key)
+        if not leader:
+            return self.wait(key, call, wait_timeout)
+
+        result = error = None
+        try:
+            result = fn()
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.finish(key, call, result, error)
+
+    def stats(self):
+        with self._lock:
             return {
-                'success': False,
-                'error': error_msg,
-                'data': None
+                'in_flight': len(self._calls),
+                'waiting': sum(call['waiters'] for call in self._calls.values()),
+                'executions': self.executions,
+                'coalesced': self.coalesced
             }
 
-        # Smart Link 컬럼에서 링크 찾기 (/catalog/platform/ URL)
-        print(f"[Companion API] Looking for Smart Link in the row...")
-        safe_flush()
+single_flight = SingleFlight()
 
-        tds = target_row.find_elements(By.TAG_NAME, 'td')
-        smart_link_url = None
+class Overloaded(Exception):
+    """대기열이 가득 찼거나 대기 시간 초과 (429로 응답)"""
 
-        # /catalog/platform/ 링크 찾기
-        for td in tds:
-            try:
-                links = td.find_elements(By.TAG_NAME, 'a')
-                for link in links:
-                    href = link.get_attribute('href')
-                    if href and '/catalog/platform/' in href:
-                        smart_link_url = href
-                        print(f"[Companion API] Found platform link: {href}")
-                        safe_flush()
-                        break
-                if smart_link_url:
-                    break
-            except:
-                continue
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
 
-        if not smart_link_url:
-            print(f"[Companion API] Smart Link not found, trying to click row...")
-            safe_flush()
-            # Smart Link를 못 찾으면 행 자체를 클릭
-            target_row.click()
-            time.sleep(2)
-        else:
-            print(f"[Companion API] Found Smart Link: {smart_link_url}")
-            safe_flush()
-            # 상대 경로를 절대 경로로 변환
-            if smart_link_url.startswith('/'):
-                smart_link_url = f"http://companion.global{smart_link_url}"
-            # Smart Link 페이지로 이동
-            print(f"[Companion API] Navigating to: {smart_link_url}")
-            safe_flush()
-            driver.get(smart_link_url)
-            time.sleep(3)
-
-        # DEBUG: Save smart link page
-        with open('/tmp/smart_link_page.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print(f"[Companion API] Saved smart link page to /tmp/smart_link_page.html")
-        print(f"[Companion API] Current URL: {driver.current_url}")
-        safe_flush()
-
-        # 앨범 커버 추출
-        album_cover_url = None
-        try:
-            cover_img = driver.find_element(By.CSS_SELECTOR, 'img.album-cover, img.cover-image, .album-art img, img[alt*="album"], img[alt*="cover"]')
-            album_cover_url = cover_img.get_attribute('src')
-            print(f"[Companion API] Found album cover: {album_cover_url}")
-        except:
-            print(f"[Companion API] Album cover not found")
-        safe_flush()
+class AdmissionControl:
+    """브라우저 검색 요청 수용 제어
+
+    동시에 ADMISSION_CONCURRENCY건만 실행하고 나머지는 ADMISSION_QUEUE_SIZE건까지 대기시킨다.
+    대기열이 가득 차면 최근 처리 시간으로 계산한 Retry-After와 함께 Overloaded를 던진다.
+    /search/batch는 브라우저 하나를 통째로 쓰므로 탭 수만큼 슬롯을 잡고,
+    /jobs 워커는 background로 대기열 제한 없이 슬롯이 빌 때까지 기다린다 (드라이버를 쓰는 모든 경로가 running에 포함).
+    """
+
+    def __init__(self, concurrency=ADMISSION_CONCURRENCY, queue_size=ADMISSION_QUEUE_SIZE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.concurrency = max(concurrency, 1)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.running = 0
+        self.queued = 0
+        self.background_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.service_times = deque(maxlen=50)  # 최근 처리 시간 (초)
+        self.wait_times = deque(maxlen=50)  # 최근 대기열 대기 시간 (초)
+
+    def retry_after(self):
+        """대기열이 한 칸 빌 때까지 예상 시간 (초, 최소 1)"""
+        service = (sum(self.service_times) / len(self.service_times)) if self.service_times else ALBUM_DEADLINE
+        return max(int(service * (self.queued + 1) / self.concurrency + 0.999), 1)
+
+    def acquire(self, slots=1, background=False):
+        """실행 슬롯 slots개 확보 후 확보한 수 반환 (release로 반납)
 
-        # 플랫폼 링크 추출 - onclick 속성에서 파싱
-        platforms = []
+        대기열이 가득 차거나 대기 시간이 지나면 Overloaded. background면 제한 없이 기다린다.
+        """
+        arrived = time.time()
+        with self._cond:
+            slots = min(slots, self.concurrency)
+            if self.running + slots > self.concurrency:
+                if background:
+                    self.background_waiting += 1
+                    try:
+                        while self.running + slots > self.concurrency:
+                            self._cond.wait()
+                    finally:
+                        self.background_waiting -= 1
+                else:
+                    if self.queued >= self.queue_size:
+                        self.rejected += 1
+                        raise Overloaded(f'Server busy: {self.running} running, {self.queued} queued',
+                                         self.retry_after())
+
+                    self.queued += 1
+                    try:
+                        deadline = arrived + self.queue_timeout
+                        while self.running + slots > self.concurrency:
+                            remaining = deadline - time.time()
+                            if remaining <= 0:
+                                self.queue_timeouts += 1
+                                raise Overloaded(f'Queued for {self.queue_timeout:g}s without a free slot',
+                                                 self.retry_after())
+                            self._cond.wait(remaining)
+                    finally:
+                        self.queued -= 1
 
-        # platList 내의 li 요소들을 찾음
+            self.running += slots
+            self.admitted += 1
+            self.wait_times.append(time.time() - arrived)
+        return slots
+
+    def release(self, slots=1, service_time=None):
+        with self._cond:
+            self.running -= slots
+            if service_time is not None:
+                self.service_times.append(service_time)
+            self._cond.notify_all()
+
+    def run(self, fn, background=False):
+        """실행 슬롯을 얻어 fn() 실행"""
+        slots = self.acquire(background=background)
+        started = time.time()
         try:
-            platform_items = driver.find_elements(By.CSS_SELECTOR, '#platList li')
-            print(f"[Companion API] Found {len(platform_items)} platform items in #platList")
-            safe_flush()
-        except:
-            platform_items = []
-            print(f"[Companion API] No #platList found, trying alternative selectors")
-            safe_flush()
-
-        # 중복 제거를 위한 set
-        seen_urls = set()
-
-        for item in platform_items:
-            try:
-                # li 안의 a 태그 찾기
-                link = item.find_element(By.TAG_NAME, 'a')
-                onclick_attr = link.get_attribute('onclick')
+            return fn()
+        finally:
+            self.release(slots, time.time() - started)
 
-                if not onclick_attr:
-                    continue
+    def stats(self):
+        with self._cond:
+            return {
+                'concurrency': self.concurrency,
+                'queue_size': self.queue_size,
+                'running': self.running,
+                'queued': self.queued,
+                'background_waiting': self.background_waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'queue_timeouts': self.queue_timeouts,
+                'avg_wait': round(sum(self.wait_times) / len(self.wait_times), 3) if self.wait_times else 0,
+                'max_wait': round(max(self.wait_times), 3) if self.wait_times else 0,
+                'avg_service': round(sum(self.service_times) / len(self.service_times), 3) if self.service_times else None,
+                'retry_after': self.retry_after()
+            }
 
-                # onclick="javascript:click_platform("http://music.apple.com/...", "itm", "...")"
-                # 정규식으로 URL과 platform code 추출
-                import re
-                match = re.search(r'click_platform\(["\']([^"\']+)["\'],\s*["\']([^"\']+)["\']', onclick_attr)
-                if not match:
-                    continue
+admission = AdmissionControl()
 
-                url = match.group(1).replace('\\/', '/')  # 이스케이프된 슬래시 복원
-                platform_code = match.group(2)
+def overloaded_response(e):
+    """Overloaded → 429 + Retry-After"""
+    log.warning(f"[Admission] Rejected: {e} (retry after {e.retry_after}s)")
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        'retry_after': e.retry_after
+    }), 429, {'Retry-After': str(e.retry_after)}
 
-                if url in seen_urls:
-                    continue
-                seen_urls.add(url)
+def single_flight_key(part, artist, album, upc):
+    """같은 검색으로 보는 키 (/search, 스트리밍, /search/batch가 같은 키를 쓴다)"""
+    return f"{part or 'album'}:{album_key(artist, album, upc)}"
 
-                # span 태그에서 플랫폼 이름 추출
-                try:
-                    span = link.find_element(By.TAG_NAME, 'span')
-                    span_class = span.get_attribute('class')
-                    # class="logo_itm" -> platform_name from class
-                except:
-                    span_class = None
-
-                # 플랫폼 이름 매핑
-                platform_name = None
-                if platform_code == 'spo':
-                    platform_name = 'Spotify'
-                elif platform_code == 'itm':
-                    platform_name = 'Apple Music'
-                elif platform_code == 'yat':
-                    platform_name = 'YouTube Music'
-                elif platform_code == 'ama':
-                    platform_name = 'Amazon Music'
-                elif platform_code == 'dee':
-                    platform_name = 'Deezer'
-                elif platform_code == 'asp':
-                    platform_name = 'Tidal'
-                elif platform_code == 'pdx':
-                    platform_name = 'Pandora'
-                elif platform_code == 'soc':
-                    platform_name = 'SoundCloud'
-                elif platform_code == 'awm':
-                    platform_name = 'AWA'
-                elif platform_code == 'kkb':
-                    platform_name = 'KKBOX'
-                elif platform_code == 'ang':
-                    platform_name = 'Anghami'
-                elif platform_code == 'lmj':
-                    platform_name = 'LINE MUSIC'
-                elif platform_code == 'mov':
-                    platform_name = 'MOOV'
-                elif platform_code == 'tct':
-                    platform_name = 'QQ Music'
-                else:
-                    platform_name = platform_code.upper()  # Fallback
-
-                platforms.append({
-                    'platform': platform_name,
-                    'code': platform_code,
-                    'url': url,
-                    'upc': None  # UPC는 페이지에서 추출 가능하면 추가
-                })
-                print(f"[Companion API] Added platform: {platform_name} ({platform_code}) - {url}")
-                safe_flush()
-            except Exception as e:
-                print(f"[Companion API] Error parsing platform element: {str(e)}")
-                safe_flush()
-                continue
+def cached_result(part, artist, album, upc, force_refresh, search, wait_timeout=None):
+    """캐시를 거쳐 search() 실행 (force_refresh면 캐시를 건너뛰고 새로 검색해 덮어씀)
 
-        print(f"[Companion API] Total platforms extracted: {len(platforms)}")
-        safe_flush()
+    캐시에 없으면 같은 앨범(CDMA 또는 아티스트+앨범명)으로 진행 중인 검색에 합류한다 (최대 wait_timeout초).
+    """
+    if result_cache and not force_refresh:
+        cached = result_cache.get(artist, album, upc, part)
+        if cached:
+            log.debug(f"[Cache] Hit{f' ({part})' if part else ''}: {upc or f'{artist} - {album}'}")
+            return cached
 
-        # KR 플랫폼 검색 추가
-        kr_platforms = {}
-        kr_album_cover = album_cover_url  # 기본값은 Global에서 가져온 커버
+    def search_and_store():
+        result = search()
+        if result_cache:
+            result_cache.put(artist, album, upc, result, part)
+        return result
 
-        try:
-            print(f"[Companion API] Starting KR platform search...")
-            safe_flush()
-            kr_platforms, kr_cover = search_kr_platforms(driver, artist, album)
+    return single_flight.do(single_flight_key(part, artist, album, upc), search_and_store, wait_timeout)
 
-            # 벅스에서 앨범 커버를 찾았으면 우선 사용
-            if kr_cover:
-                kr_album_cover = kr_cover
+def cached_search_album(artist, album, upc='', smart_link_url=None, force_refresh=False, admit=False,
+                        background=False):
+    """캐시를 거쳐 앨범 검색 (글로벌 + KR). admit이면 실제 검색은 수용 제어를 거침 (background면 거절 없이 대기)
 
-            print(f"[Companion API] KR search completed: {len(kr_platforms)} platforms")
-            safe_flush()
-        except Exception as e:
-            print(f"[Companion API] KR search error: {str(e)}")
-            safe_flush()
+    admit이고 background가 아니면 진행 중인 같은 검색에는 SINGLE_FLIGHT_WAIT초까지만 합류 (넘으면 Overloaded)
+    """
+    search = lambda: search_album(artist, album, upc, smart_link_url)
+    return cached_result('', artist, album, upc, force_refresh,
+                         (lambda: admission.run(search, background=background)) if admit else search,
+                         SINGLE_FLIGHT_WAIT if admit and not background else None)
 
-        return {
-            'success': True,
-            'data': {
-                'album_cover_url': kr_album_cover,
-                'platform_count': len(platforms),
-                'platforms': platforms,
-                'kr_platforms': kr_platforms
-            },
-            'request': {
-                'artist': artist,
-                'album': album
-            }
-        }
+def cached_search_global(artist, album, upc='', smart_link_url=None, force_refresh=False, admit=False):
+    """캐시를 거쳐 글로벌 플랫폼만 검색. admit이면 실제 검색은 수용 제어를 거침"""
+    search = lambda: search_album(artist, album, upc, smart_link_url, include_kr=False)
+    return cached_result('global', artist, album, upc, force_refresh,
+                         (lambda: admission.run(search)) if admit else search,
+                         SINGLE_FLIGHT_WAIT if admit else None)
 
-    except Exception as e:
-        import traceback
-        error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"[Companion API] Error: {error_msg}")
-        return {
-            'success': False,
-            'error': error_msg,
-            'data': None
-        }
+def search_kr_album(artist, album):
+    """KR 플랫폼만 검색"""
+    budget = SearchBudget()
+    kr_platforms, kr_cover = kr_search.search(artist, album, budget)
+    result = kr_album_result(artist, album, kr_platforms, kr_cover)
+    finish_timings(result, budget, 'kr')
+    return result
+
+def cached_search_kr(artist, album, force_refresh=False):
+    """캐시를 거쳐 KR 플랫폼만 검색 (아티스트+앨범명 키)"""
+    return cached_result('kr', artist, album, '', force_refresh, lambda: search_kr_album(artist, album))
+
+def split_album_result(result):
+    """/search 결과를 스트리밍 응답 줄(global, kr)로 나눔"""
+    if not result.get('success'):
+        return [dict(result, part='global')]
 
+    data = dict(result['data'])
+    kr_platforms = data.pop('kr_platforms', {})
+    kr_line = kr_album_result(result['request']['artist'], result['request']['album'],
+                              kr_platforms, data.get('album_cover_url'))
+    return [dict(result, part='global', data=data), dict(kr_line, part='kr')]
+
+def stream_search_album(artist, album, upc='', smart_link_url=None, force_refresh=False):
+    """글로벌 결과가 나오면 바로 한 줄, KR 결과가 나오면 한 줄 더 yield
+
+    글로벌 검색이 실패하면 KR 줄은 보내지 않는다. 글로벌 검색은 수용 제어를 거친다 (Overloaded).
+    /search와 같은 키로 진행 중인 검색이 있으면 합류해 그 결과를 두 줄로 나눠 보낸다.
+    """
+    cached = result_cache.get(artist, album, upc) if result_cache and not force_refresh else None
+    if cached:
+        yield from split_album_result(cached)
+        return
+
+    key = single_flight_key('', artist, album, upc)
+    call, leader = single_flight.enter(key)
+    if not leader:
+        yield from split_album_result(single_flight.wait(key, call, SINGLE_FLIGHT_WAIT))
+        return
+
+    result = error = None
+    try:
+        budget = SearchBudget()
+        kr_pending = kr_search.start(artist, album)
+        try:
+            global_result = admission.run(lambda: search_global(artist, album, upc, smart_link_url, budget))
+        except Overloaded:
+            kr_search.cancel(kr_pending)
+            raise
+        global_result['waits'] = dict(budget.waits)
+        global_result['timings'] = dict(budget.timings, total=round(time.time() - budget.started, 3))
+        global_result['request_id'] = budget.request_id
+        yield dict(global_result, part='global')
+
+        album_result = finish_album_result(global_result, kr_pending, budget)
+        if album_result.get('success'):
+            kr_line = kr_album_result(artist, album, album_result['data']['kr_platforms'],
+                                      album_result['data']['album_cover_url'])
+            kr_line['waits'] = {'kr_search': budget.waits.get('kr_search')}
+            kr_line['timings'] = {phase: seconds for phase, seconds in budget.timings.items() if phase.startswith('kr_')}
+            yield dict(kr_line, part='kr')
+
+        finish_timings(album_result, budget, 'album')
+        if result_cache:
+            result_cache.put(artist, album, upc, album_result)
+        result = album_result
+    except Exception as e:
+        error = e
+        raise
     finally:
-        if driver:
-            driver.quit()
+        # 클라이언트가 중간에 끊으면 result 없이 끝남 (합류한 요청은 오류로 받음)
+        single_flight.finish(key, call, result, error)
+
+def start_result_cache():
+    """검색 결과 캐시 열기"""
+    global result_cache
+    result_cache = ResultCache()
+    log.info(f"[Cache] {result_cache.stats()['entries']} cached responses")
+
+@app.before_request
+def set_request_id():
+    """요청마다 로그용 id 지정 (X-Request-Id 헤더가 있으면 그 값)"""
+    log_context.request_id = (request.headers.get('X-Request-Id') or uuid.uuid4().hex)[:12]
+
+@app.teardown_request
+def clear_request_id(error=None):
+    log_context.request_id = None
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -760,12 +3952,55 @@ def health():
     return jsonify({
         'status': 'ok',
         'service': 'companion-api',
-        'selenium_hub': SELENIUM_HUB
+        'selenium_hub': SELENIUM_HUB,
+        'driver_pool': driver_pool.stats(),
+        'accounts': account_pool.stats(),
+        'browser_tabs': tab_scheduler.stats() if BROWSER_TABS > 1 else None,
+        'http_client': companion_http.stats(),
+        'jobs': job_store.counts() if job_store else None,
+        'catalog_index': catalog_index.stats() if catalog_index else None,
+        'result_cache': result_cache.stats() if result_cache else None,
+        'single_flight': single_flight.stats(),
+        'admission': admission.stats(),
+        'debug_capture': debug_capture.stats(),
+        'logging': log_stats(),
+        'browser_profile': resource_blocker.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 지표 (단계별 소요 시간 히스토그램, 결과 카운터, 풀 사용률)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def parse_search_params(data):
+    """요청 JSON에서 (artist, album, upc) 추출. 필수값이 없으면 None"""
+    # 다양한 파라미터 형식 지원
+    artist = data.get('artist') or data.get('artist_en') or data.get('artist_ko', '')
+    album = data.get('album') or data.get('album_en') or data.get('album_ko', '')
+    upc = data.get('upc', '')  # UPC 또는 Catalog No
+    cdma_code = data.get('cdma_code', data.get('cdmaCode', ''))
+
+    # CDMA 코드가 있으면 UPC로 사용
+    if cdma_code and not upc:
+        upc = cdma_code
+
+    # artist + album 또는 upc 중 하나는 있어야 함
+    if not ((artist and album) or upc):
+        return None
+
+    return artist, album, upc
+
+def wants_stream(data):
+    """NDJSON 스트리밍 응답 요청 여부"""
+    return bool(data.get('stream')) or request.accept_mimetypes.best == 'application/x-ndjson'
+
 @app.route('/search', methods=['POST'])
 def search():
-    """앨범 검색 API"""
+    """앨범 검색 API (이전 응답의 data.smart_link_url을 다시 보내면 Catalog 검색 생략)
+
+    "stream": true 이거나 Accept: application/x-ndjson이면 NDJSON으로 글로벌 결과 한 줄
+    ({"part": "global", ...})을 먼저 보내고, KR 결과 한 줄({"part": "kr", ...})을 이어서 보낸다.
+    """
     try:
         data = request.get_json()
 
@@ -775,44 +4010,306 @@ def search():
                 'error': 'No JSON data provided'
             }), 400
 
-        # 다양한 파라미터 형식 지원
-        artist = data.get('artist') or data.get('artist_en') or data.get('artist_ko', '')
-        album = data.get('album') or data.get('album_en') or data.get('album_ko', '')
-        upc = data.get('upc', '')  # UPC 또는 Catalog No
-        cdma_code = data.get('cdma_code', data.get('cdmaCode', ''))
-
-        # CDMA 코드가 있으면 UPC로 사용
-        if cdma_code and not upc:
-            upc = cdma_code
-
-        # artist + album 또는 upc 중 하나는 있어야 함
-        if not ((artist and album) or upc):
+        params = parse_search_params(data)
+        if not params:
             return jsonify({
                 'success': False,
                 'error': 'Missing required parameters: (artist + album) or upc'
             }), 400
+        artist, album, upc = params
 
         if upc:
-            print(f"[Companion API] Searching by UPC/CDMA: {upc}")
+            log.info(f"[Companion API] Searching by UPC/CDMA: {upc}")
         else:
-            print(f"[Companion API] Searching: {artist} - {album}")
+            log.info(f"[Companion API] Searching: {artist} - {album}")
+
+        if wants_stream(data):
+            lines = stream_search_album(artist, album, upc, data.get('smart_link_url'),
+                                        force_refresh=bool(data.get('force_refresh')))
+            # 첫 줄(글로벌 결과)까지 여기서 진행해야 수용 거절을 429로 응답할 수 있음
+            first = next(lines)
+
+            def generate():
+                yield first
+                yield from lines
 
-        result = search_album(artist, album, upc)
+            return Response(stream_with_context(json.dumps(line, ensure_ascii=False) + '\n' for line in generate()),
+                            mimetype='application/x-ndjson')
+
+        result = cached_search_album(artist, album, upc, data.get('smart_link_url'),
+                                     force_refresh=bool(data.get('force_refresh')), admit=True)
 
         if result['success']:
-            print(f"[Companion API] Found {result['data']['platform_count']} platforms")
+            log.info(f"[Companion API] Found {result['data']['platform_count']} platforms")
         else:
-            print(f"[Companion API] Failed: {result.get('error')}")
+            log.warning(f"[Companion API] Failed: {result.get('error')}")
+
+        return jsonify(result)
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/search/global', methods=['POST'])
+def search_global_only():
+    """글로벌 플랫폼만 검색 API (KR 검색 없음)"""
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+
+    params = parse_search_params(data)
+    if not params:
+        return jsonify({
+            'success': False,
+            'error': 'Missing required parameters: (artist + album) or upc'
+        }), 400
+    artist, album, upc = params
 
+    try:
+        result = cached_search_global(artist, album, upc, data.get('smart_link_url'),
+                                      force_refresh=bool(data.get('force_refresh')), admit=True)
         return jsonify(result)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/search/kr', methods=['POST'])
+def search_kr_only():
+    """KR 플랫폼(멜론/벅스/VIBE/FLO/지니)만 검색 API"""
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+
+    params = parse_search_params(data)
+    if not params or not (params[0] and params[1]):
+        return jsonify({
+            'success': False,
+            'error': 'Missing required parameters: artist + album'
+        }), 400
+    artist, album, _ = params
 
+    try:
+        result = cached_search_kr(artist, album, force_refresh=bool(data.get('force_refresh')))
+        return jsonify(result)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """여러 앨범 일괄 검색 API
+
+    요청: {"items": [{"artist": ..., "album": ..., "cdma_code": ..., "smart_link_url": (선택)}, ...],
+           "force_refresh": (선택)}
+    응답: NDJSON 스트림, 항목마다 한 줄씩 끝나는 대로 전송
+          {"index": 0, "cdma_code": ..., "success": ..., "data": ..., ...}
+    """
+    data = request.get_json(silent=True)
+    raw_items = data.get('items') if isinstance(data, dict) else None
+
+    if not raw_items or not isinstance(raw_items, list):
+        return jsonify({
+            'success': False,
+            'error': 'Missing required parameter: items'
+        }), 400
+
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            'success': False,
+            'error': f'Too many items: {len(raw_items)} (max {BATCH_MAX_ITEMS})'
+        }), 400
+
+    items = []
+    invalid = []
+    for index, raw in enumerate(raw_items):
+        params = parse_search_params(raw) if isinstance(raw, dict) else None
+        if params:
+            artist, album, upc = params
+            items.append({'index': index, 'artist': artist, 'album': album, 'upc': upc,
+                          'smart_link_url': raw.get('smart_link_url')})
+        else:
+            invalid.append(index)
+
+    force_refresh = bool(data.get('force_refresh'))
+    log.info(f"[Companion API] Batch search: {len(items)} items ({len(invalid)} invalid)")
+
+    # 캐시에 있는 항목은 바로 보내고 나머지만 브라우저로 검색
+    cached_lines = []
+    pending = []
+    for item in items:
+        cached = None
+        if result_cache and not force_refresh:
+            cached = result_cache.get(item['artist'], item['album'], item['upc'])
+        if cached:
+            line = {'index': item['index'], 'cdma_code': item['upc'] or None}
+            line.update(cached)
+            cached_lines.append(line)
+        else:
+            pending.append(item)
+
+    # 배치는 브라우저 하나를 끝까지 쓰므로 그 브라우저의 탭 수만큼 슬롯을 잡는다 (빈 슬롯이 없으면 429)
+    held = []
+    if pending:
+        try:
+            held.append(admission.acquire(slots=max(BROWSER_TABS, 1)))
+        except Overloaded as e:
+            return overloaded_response(e)
+
+    def release_slots():
+        # 스트림이 끝나거나 클라이언트가 끊으면 한 번만 반납
+        try:
+            admission.release(held.pop())
+        except IndexError:
+            pass
+
+    def generate():
+        for index in invalid:
+            yield json.dumps({
+                'index': index,
+                'cdma_code': None,
+                'success': False,
+                'error': 'Missing required parameters: (artist + album) or upc',
+                'data': None
+            }, ensure_ascii=False) + '\n'
+
+        for line in cached_lines:
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+
+        # /search와 같은 키로 진행 중인 검색이 있는 항목은 배치에서 빼고, 끝난 뒤 그 결과를 받는다
+        leading = {}
+        joined = []
+
+        def claim(item):
+            key = single_flight_key('', item['artist'], item['album'], item['upc'])
+            call, leader = single_flight.enter(key)
+            if leader:
+                leading[item['index']] = (key, call)
+            else:
+                joined.append((item, key, call))
+            return leader
+
+        def item_line(item, result):
+            line = {'index': item['index'], 'cdma_code': item['upc'] or None}
+            line.update(result)
+            return json.dumps(line, ensure_ascii=False) + '\n'
+
+        try:
+            for item, result in search_album_batch(pending, claim):
+                if result_cache:
+                    result_cache.put(item['artist'], item['album'], item['upc'], result)
+                if item['index'] in leading:
+                    single_flight.finish(*leading.pop(item['index']), result)
+                yield item_line(item, result)
+        finally:
+            release_slots()
+            # 배치가 중간에 끝나 결과를 내지 못한 항목에 합류한 요청도 풀어준다
+            for key, call in leading.values():
+                single_flight.finish(key, call, error=RuntimeError('Batch search ended before this item'))
+
+        for item, key, call in joined:
+            try:
+                result = single_flight.wait(key, call, SINGLE_FLIGHT_WAIT)
+            except Exception as e:
+                result = {'success': False, 'error': str(e), 'data': None}
+            yield item_line(item, result)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(release_slots)
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """검색 작업 등록 API (즉시 id 반환)"""
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+
+    params = parse_search_params(data)
+    if not params:
+        return jsonify({
+            'success': False,
+            'error': 'Missing required parameters: (artist + album) or upc'
+        }), 400
+
+    if not job_store:
+        return jsonify({
+            'success': False,
+            'error': 'Job workers are not running'
+        }), 503
+
+    job_id = job_store.enqueue(*params)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued'
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """검색 작업 조회 API (?wait=초 로 완료까지 long-poll)"""
+    if not job_store:
+        return jsonify({
+            'success': False,
+            'error': 'Job workers are not running'
+        }), 503
+
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT)
+    except ValueError:
+        wait = 0
+
+    job = job_store.wait_for(job_id, wait) if wait else job_store.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': f'Job not found: {job_id}'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
 if __name__ == '__main__':
-    print("Starting Companion API...")
-    print(f"Selenium Hub: {SELENIUM_HUB}")
+    # 카탈로그 인덱스 크롤링만 실행: python3 companion_api.py crawl [--full]
+    if len(sys.argv) > 1 and sys.argv[1] == 'crawl':
+        catalog_index = CatalogIndex()
+        crawl_catalog(full='--full' in sys.argv[2:])
+        sys.exit(0)
+
+    # 브라우저 프로필 비교: python3 companion_api.py benchmark [반복 횟수] [Smart Link URL]
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        args = sys.argv[2:]
+        runs = next((int(arg) for arg in args if arg.isdigit()), 3)
+        url = next((arg for arg in args if arg.startswith('http')), None)
+        sys.exit(0 if benchmark_browser_profile(runs, url) else 1)
+
+    log.info("Starting Companion API...")
+    log.info(f"Selenium Hub: {SELENIUM_HUB}")
+    log.info(f"Driver pool size: {DRIVER_POOL_SIZE}")
+    start_catalog_index()
+    start_result_cache()
+    start_job_workers()
     app.run(host='0.0.0.0', port=5001, debug=False)
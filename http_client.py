@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+수집기 공용 HTTP 클라이언트
+- 호스트마다 requests.Session 하나 (keep-alive 커넥션 풀 재사용)
+- 플랫폼별 기본 헤더 (VIBE Referer/Origin은 apis.naver.com에만)
+- 호스트별 요청 수 / 새 커넥션 수 / 재사용 통계
+- 요청 전 호스트별 rate_limiter 대기 (수집기에서 sleep 대신 사용)
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limiter
+
+# 호스트 하나당 유지할 커넥션 수 (동시에 요청하는 스레드 수보다 작으면 새 커넥션이 생김)
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+
+BASE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+    'Accept': 'application/json, text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8',
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+# 호스트별 추가 헤더
+HOST_HEADERS = {
+    'apis.naver.com': {
+        'Referer': 'https://vibe.naver.com/',
+        'Origin': 'https://vibe.naver.com'
+    }
+}
+
+
+class HostClient:
+    """호스트 하나의 Session + 커넥션 풀"""
+
+    def __init__(self, host):
+        self.host = host
+        self.session = requests.Session()
+        self.session.headers.update(BASE_HEADERS)
+        self.session.headers.update(HOST_HEADERS.get(host, {}))
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.limiter = rate_limiter.limiter_for(host)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def request(self, method, url, track_latency=True, **kwargs):
+        """track_latency=False: 응답 시간이 원래 들쭉날쭉한 API (Companion 등)는 느려짐 판단에서 제외"""
+        self.limiter.acquire()
+        with self.lock:
+            self.requests += 1
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self.lock:
+                self.errors += 1
+            self.limiter.observe()
+            raise
+        # stream=True면 헤더를 받은 시점까지의 시간
+        self.limiter.observe(
+            response.status_code,
+            time.monotonic() - started if track_latency else None,
+            response.headers.get('Retry-After')
+        )
+        return response
+
+    def connections(self):
+        """urllib3 풀에서 지금까지 연 커넥션 수"""
+        pools = self.adapter.poolmanager.pools
+        total = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+        return total
+
+    def stats(self):
+        with self.lock:
+            requests_count = self.requests
+            errors = self.errors
+        connections = self.connections()
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(requests_count - connections, 0),
+            'errors': errors,
+            'rate_limit': self.limiter.stats()
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_for(url):
+    """URL의 호스트에 해당하는 HostClient (없으면 생성)"""
+    host = urlparse(url).netloc.lower()
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = HostClient(host)
+            _clients[host] = client
+        return client
+
+
+def get(url, **kwargs):
+    return client_for(url).request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return client_for(url).request('POST', url, **kwargs)
+
+
+def stats():
+    """호스트별 커넥션 재사용 통계"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.host: client.stats() for client in clients}
+
+
+def format_stats():
+    """수집 종료 시 출력용 한 줄 요약 (호스트별)"""
+    lines = []
+    for host, s in sorted(stats().items()):
+        ratio = s['reused'] / s['requests'] * 100 if s['requests'] else 0
+        limit = s['rate_limit']
+        lines.append(
+            f"{host}: {s['requests']} requests, {s['connections']} connections, "
+            f"{ratio:.0f}% reused, {s['errors']} errors, "
+            f"{limit['rate']} req/s (waited {limit['waited']}s, backoff x{limit['decreases']})"
+        )
+    return lines
+
+
+def close_all():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.session.close()
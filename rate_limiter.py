@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+호스트별 적응형 요청 속도 제한 (토큰 버킷 + AIMD)
+- 정상 응답: 초당 요청 수를 조금씩 올림 (additive increase)
+- 429 / 5xx / 연결 오류 / 평소보다 느린 응답: 절반으로 줄임 (multiplicative decrease)
+- 429 + Retry-After: 그 시간 동안 요청 중지
+"""
+
+import os
+import threading
+import time
+
+# 초당 요청 수 (호스트별): 시작값 / 최소 / 최대
+RATE_LIMIT_START = float(os.environ.get('RATE_LIMIT_START', '1'))
+RATE_LIMIT_MIN = float(os.environ.get('RATE_LIMIT_MIN', '0.1'))
+RATE_LIMIT_MAX = float(os.environ.get('RATE_LIMIT_MAX', '5'))
+# 정상 응답 하나당 늘릴 양, 실패 시 곱할 값
+RATE_LIMIT_INCREASE = float(os.environ.get('RATE_LIMIT_INCREASE', '0.1'))
+RATE_LIMIT_DECREASE = float(os.environ.get('RATE_LIMIT_DECREASE', '0.5'))
+# 응답 시간이 평균의 몇 배를 넘으면 느려진 것으로 보고 줄일지
+RATE_LIMIT_LATENCY_FACTOR = float(os.environ.get('RATE_LIMIT_LATENCY_FACTOR', '2'))
+# 평균보다 이만큼(초) 이상 늦어야 느려진 것으로 봄 (빠른 응답의 작은 흔들림 무시)
+RATE_LIMIT_LATENCY_MIN_DELTA = float(os.environ.get('RATE_LIMIT_LATENCY_MIN_DELTA', '0.5'))
+
+# 평균 응답 시간 (EWMA) 계산에 쓰는 값, 판단에 필요한 최소 응답 수
+LATENCY_ALPHA = 0.1
+LATENCY_MIN_SAMPLES = 5
+# 동시에 실패한 응답들로 여러 번 줄이지 않도록 감소 사이 최소 간격 (초)
+DECREASE_INTERVAL = 1.0
+# Retry-After 최대 대기 (초)
+MAX_RETRY_AFTER = 120
+
+
+class AdaptiveRateLimiter:
+    """호스트 하나의 토큰 버킷"""
+
+    def __init__(self, host, rate=None):
+        self.host = host
+        self.rate = rate or RATE_LIMIT_START
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.latency_avg = None
+        self.samples = 0
+        self.lock = threading.Lock()
+        # 통계
+        self.waited = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    def _refill(self, now):
+        self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """토큰이 생길 때까지 대기, 기다린 시간(초) 반환"""
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    waited = now - started
+                    self.waited += waited
+                    return waited
+                wait = max(self.paused_until - now, (1.0 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def _decrease(self, now):
+        if now - self.last_decrease < DECREASE_INTERVAL:
+            return
+        self.last_decrease = now
+        self.rate = max(RATE_LIMIT_MIN, self.rate * RATE_LIMIT_DECREASE)
+        self.decreases += 1
+
+    def observe(self, status=None, latency=None, retry_after=None):
+        """응답 결과 반영 (status=None이면 연결 오류/타임아웃)"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if status is None or status == 429 or status >= 500:
+                self._decrease(now)
+                if status == 429 and retry_after:
+                    try:
+                        pause = min(float(retry_after), MAX_RETRY_AFTER)
+                        self.paused_until = max(self.paused_until, now + pause)
+                    except ValueError:
+                        pass
+                return
+
+            if latency is None:
+                return
+
+            slow = (
+                self.samples >= LATENCY_MIN_SAMPLES
+                and latency > self.latency_avg * RATE_LIMIT_LATENCY_FACTOR
+                and latency - self.latency_avg > RATE_LIMIT_LATENCY_MIN_DELTA
+            )
+            if self.latency_avg is None:
+                self.latency_avg = latency
+            else:
+                self.latency_avg += (latency - self.latency_avg) * LATENCY_ALPHA
+            self.samples += 1
+
+            if slow:
+                self._decrease(now)
+            elif self.rate < RATE_LIMIT_MAX:
+                self.rate = min(RATE_LIMIT_MAX, self.rate + RATE_LIMIT_INCREASE)
+                self.increases += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rate': round(self.rate, 2),
+                'latency_avg': round(self.latency_avg, 3) if self.latency_avg is not None else None,
+                'waited': round(self.waited, 1),
+                'increases': self.increases,
+                'decreases': self.decreases
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(host):
+    """호스트의 AdaptiveRateLimiter (없으면 생성)"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(host)
+            _limiters[host] = limiter
+        return limiter
+
+
+def stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.stats() for limiter in limiters}
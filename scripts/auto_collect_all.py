@@ -13,6 +13,10 @@ import os
 from datetime import datetime
 import libsql_experimental as libsql
 
+# 루트의 공용 모듈 (http_client, rate_limiter)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+
 # Turso 설정
 TURSO_DATABASE_URL = os.environ.get('TURSO_DATABASE_URL', '')
 TURSO_AUTH_TOKEN = os.environ.get('TURSO_AUTH_TOKEN', '')
@@ -20,6 +24,9 @@ TURSO_AUTH_TOKEN = os.environ.get('TURSO_AUTH_TOKEN', '')
 # n8n 웹훅 URL (Docker 내부 네트워크 or 로컬)
 WEBHOOK_URL = os.environ.get('N8N_WEBHOOK_URL', 'http://localhost:5678/webhook/album-links')
 
+# 타임아웃 재시도 전 대기 (초): 재시도마다 두 배 (5초 → 10초)
+RETRY_BACKOFF = float(os.environ.get('RETRY_BACKOFF', '5'))
+
 # 색상 출력
 class Colors:
     HEADER = '\033[95m'
@@ -79,7 +86,8 @@ def process_album(artist_ko, artist_en, album_ko, album_en, retry=0):
     }
 
     try:
-        response = requests.post(WEBHOOK_URL, json=payload, timeout=180)
+        # rate_limiter는 n8n 웹훅 호스트의 요청 간격만 조절 (n8n이 호출하는 각 플랫폼은 제한하지 않음)
+        response = http_client.post(WEBHOOK_URL, json=payload, timeout=180, track_latency=False)
 
         if response.status_code == 200:
             result = response.json()
@@ -91,8 +99,9 @@ def process_album(artist_ko, artist_en, album_ko, album_en, retry=0):
 
     except requests.exceptions.Timeout:
         if retry < 2:  # 최대 2번 재시도
-            print(f"{Colors.WARNING}  ⚠ Timeout, retrying ({retry + 1}/2)...{Colors.ENDC}")
-            time.sleep(5)
+            wait_time = RETRY_BACKOFF * (2 ** retry)
+            print(f"{Colors.WARNING}  ⚠ Timeout, retrying in {wait_time:.0f}s ({retry + 1}/2)...{Colors.ENDC}")
+            time.sleep(wait_time)
             return process_album(artist_ko, artist_en, album_ko, album_en, retry + 1)
         return False, 0, "Timeout (3 attempts)"
 
@@ -195,11 +204,6 @@ def main():
             print(f"Rate: {rate*60:.1f} albums/min")
             print(f"ETA: {remaining/3600:.1f} hours{Colors.ENDC}\n")
 
-        # 다음 요청 전 대기
-        if idx < total:
-            wait_time = 3  # 3초 대기
-            time.sleep(wait_time)
-
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
 
@@ -213,6 +217,10 @@ def main():
     print(f"Duration: {duration/3600:.1f} hours")
     print(f"Average: {duration/total:.1f}s per album\n")
 
+    for line in http_client.format_stats():
+        print(f"  {line}")
+    print()
+
     # 진행 상황 파일 삭제
     if os.path.exists('.collection_progress.txt'):
         os.remove('.collection_progress.txt')